@@ -0,0 +1,338 @@
+import asyncio
+import gzip
+import hashlib
+import io
+import random
+import tarfile
+import time
+from collections import Counter, OrderedDict
+from aiohttp import web
+
+SOURCE_EXTENSIONS = [".py", ".js", ".ts", ".go", ".rs", ".java", ".md"]
+SKIPPED_FILES = ["assets/logo.png", "node_modules/left-pad/index.js", "dist/app.min.js"]
+BODY_LINES = [
+    f"    value_{i} = compute_{i % 13}(items[{i % 7}], offset={i})  # step {i}\n"
+    for i in range(64)
+]
+PULL_REQUEST_FILES = 5
+
+
+def blob_sha(data):
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+class SyntheticRepository:
+    """A deterministic repository named ``<files>-<seed>``.
+
+    The same name always yields the same paths, contents and commit, so
+    runs are comparable. Contents differ between seeds, so distinct
+    repositories never share blobs.
+    """
+
+    def __init__(self, name, min_file_bytes, max_file_bytes):
+        files, _, seed = name.partition("-")
+        self.name = name
+        self.full_name = f"bench/r{name}"
+        self.files = int(files)
+        self.seed = seed or "0"
+        self.min_file_bytes = min_file_bytes
+        self.max_file_bytes = max_file_bytes
+        self.commit_sha = hashlib.sha1(self.full_name.encode()).hexdigest()
+        self.paths = self._make_paths()
+        self._tree = None
+        self._directories = None
+        self._archive = None
+
+    def _make_paths(self):
+        rng = random.Random(f"paths:{self.name}")
+        paths = list(SKIPPED_FILES[: max(self.files // 10, 1)])
+        for index in range(self.files - len(paths)):
+            directory = f"pkg{index // 50}/sub{index % 5}"
+            extension = rng.choice(SOURCE_EXTENSIONS)
+            paths.append(f"{directory}/module_{index}{extension}")
+        return paths
+
+    def content(self, path):
+        rng = random.Random(f"{self.name}:{path}")
+        if path.endswith(".png"):
+            return bytes(rng.getrandbits(8) for _ in range(512))
+        size = rng.randint(self.min_file_bytes, self.max_file_bytes)
+        sibling = rng.randrange(self.files)
+        lines = [
+            f"# {self.full_name} {path} seed {self.seed}\n",
+            f"import module_{sibling}\n",
+            f"def handler_{rng.randrange(10**6)}(items):\n",
+        ]
+        written = sum(len(line) for line in lines)
+        while written < size:
+            line = rng.choice(BODY_LINES)
+            lines.append(line)
+            written += len(line)
+        return "".join(lines).encode()
+
+    def tree(self):
+        if self._tree is None:
+            entries = []
+            for path in self.paths:
+                data = self.content(path)
+                entries.append(
+                    {
+                        "path": path,
+                        "mode": "100644",
+                        "type": "blob",
+                        "sha": blob_sha(data),
+                        "size": len(data),
+                    }
+                )
+            self._tree = entries
+        return self._tree
+
+    def directory(self, path, raw_url):
+        """Lists the direct children of ``path`` as contents items, files
+        with a ``download_url`` under ``raw_url``."""
+        if self._directories is None:
+            directories = {}
+            for entry in self.tree():
+                parts = entry["path"].split("/")
+                for depth in range(len(parts) - 1):
+                    parent = "/".join(parts[:depth])
+                    child = "/".join(parts[: depth + 1])
+                    directories.setdefault(parent, {})[child] = {
+                        "type": "dir",
+                        "path": child,
+                        "sha": "",
+                        "size": 0,
+                    }
+                directories.setdefault("/".join(parts[:-1]), {})[entry["path"]] = {
+                    "type": "file",
+                    "path": entry["path"],
+                    "sha": entry["sha"],
+                    "size": entry["size"],
+                }
+            self._directories = directories
+        return [
+            (
+                {**item, "download_url": f"{raw_url}/{item['path']}"}
+                if item["type"] == "file"
+                else item
+            )
+            for item in self._directories.get(path, {}).values()
+        ]
+
+    def archive(self):
+        if self._archive is None:
+            buffer = io.BytesIO()
+            prefix = f"{self.full_name.replace('/', '-')}-{self.commit_sha[:7]}"
+            with gzip.GzipFile(fileobj=buffer, mode="wb", compresslevel=1) as stream:
+                with tarfile.open(
+                    fileobj=stream, mode="w", format=tarfile.PAX_FORMAT
+                ) as tar:
+                    tar.pax_headers = {"comment": self.commit_sha}
+                    for path in self.paths:
+                        data = self.content(path)
+                        info = tarfile.TarInfo(f"{prefix}/{path}")
+                        info.size = len(data)
+                        tar.addfile(info, io.BytesIO(data))
+            self._archive = buffer.getvalue()
+        return self._archive
+
+    def pull_request_files(self, number):
+        rng = random.Random(f"pull:{self.name}:{number}")
+        changed = rng.sample(
+            [path for path in self.paths if path not in SKIPPED_FILES],
+            min(PULL_REQUEST_FILES, self.files - len(SKIPPED_FILES)),
+        )
+        return [
+            {
+                "filename": path,
+                "status": "modified",
+                "additions": 2,
+                "deletions": 1,
+                "sha": blob_sha(self.content(path) + b"\n"),
+                "patch": (
+                    "@@ -1,3 +1,4 @@\n"
+                    f" # {self.full_name} {path}\n"
+                    f"-import module_{number}\n"
+                    f"+import module_{number + 1}\n"
+                    f"+VERSION = {number}\n"
+                ),
+            }
+            for path in changed
+        ]
+
+
+class FakeGitHub:
+    """Serves synthetic repositories with the GitHub REST API shapes the
+    service uses, plus raw files under ``/raw``.
+
+    Every request waits ``latency`` seconds. When ``rate_limit`` is set,
+    each token may send that many API requests per ``rate_limit_window``
+    seconds, after which GitHub's 403 rate limit response is returned.
+    Listings of more than ``tree_limit`` files are truncated, as GitHub
+    does, so the dump falls back to walking the contents endpoint.
+    """
+
+    def __init__(
+        self,
+        latency=0.0,
+        rate_limit=0,
+        rate_limit_window=3600,
+        tree_limit=100000,
+        min_file_bytes=200,
+        max_file_bytes=4000,
+        cached_repositories=8,
+    ):
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.rate_limit_window = rate_limit_window
+        self.tree_limit = tree_limit
+        self.min_file_bytes = min_file_bytes
+        self.max_file_bytes = max_file_bytes
+        self.cached_repositories = cached_repositories
+        self.repositories = OrderedDict()
+        self.quotas = {}
+        self.counts = Counter()
+
+    def repository(self, name):
+        repository = self.repositories.pop(name, None)
+        if repository is None:
+            repository = SyntheticRepository(
+                name, self.min_file_bytes, self.max_file_bytes
+            )
+        self.repositories[name] = repository
+        while len(self.repositories) > self.cached_repositories:
+            self.repositories.popitem(last=False)
+        return repository
+
+    def app(self):
+        app = web.Application(middlewares=[self.middleware])
+        app.router.add_get("/repositories/{name}", self.get_repository)
+        app.router.add_get("/repos/bench/r{name}/branches/{branch}", self.get_branch)
+        app.router.add_get("/repos/bench/r{name}/git/trees/{sha}", self.get_tree)
+        app.router.add_get("/repos/bench/r{name}/contents/{path:.*}", self.get_contents)
+        app.router.add_get("/repos/bench/r{name}/tarball/{ref}", self.get_tarball)
+        app.router.add_get("/repos/bench/r{name}/pulls/{number}", self.get_pull)
+        app.router.add_get(
+            "/repos/bench/r{name}/pulls/{number}/files", self.get_pull_files
+        )
+        app.router.add_get("/raw/bench/r{name}/{ref}/{path:.*}", self.get_raw)
+        app.router.add_get("/_bench/stats", self.get_stats)
+        app.router.add_post("/_bench/reset", self.reset)
+        return app
+
+    @web.middleware
+    async def middleware(self, request, handler):
+        if request.path.startswith("/_bench/"):
+            return await handler(request)
+        self.counts[request.match_info.route.handler.__name__] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if request.path.startswith("/raw/") or not self.rate_limit:
+            return await handler(request)
+
+        token = request.headers.get("Authorization", "")
+        window = int(time.time() // self.rate_limit_window)
+        reset_at = (window + 1) * self.rate_limit_window
+        quota = self.quotas.get(token)
+        if quota is None or quota[0] != window:
+            quota = self.quotas[token] = [window, self.rate_limit]
+        headers = {
+            "X-RateLimit-Limit": str(self.rate_limit),
+            "X-RateLimit-Remaining": str(max(quota[1] - 1, 0)),
+            "X-RateLimit-Reset": str(reset_at),
+        }
+        if quota[1] <= 0:
+            self.counts["rate_limited"] += 1
+            return web.json_response(
+                {"message": "API rate limit exceeded"}, status=403, headers=headers
+            )
+        quota[1] -= 1
+        response = await handler(request)
+        response.headers.update(headers)
+        return response
+
+    async def get_repository(self, request):
+        repository = self.repository(request.match_info["name"])
+        return web.json_response(
+            {
+                "id": repository.name,
+                "full_name": repository.full_name,
+                "default_branch": "main",
+            }
+        )
+
+    async def get_branch(self, request):
+        repository = self.repository(request.match_info["name"])
+        return web.json_response({"commit": {"sha": repository.commit_sha}})
+
+    async def get_tree(self, request):
+        repository = self.repository(request.match_info["name"])
+        entries = await asyncio.to_thread(repository.tree)
+        return web.json_response(
+            {
+                "sha": repository.commit_sha,
+                "tree": entries[: self.tree_limit],
+                "truncated": len(entries) > self.tree_limit,
+            }
+        )
+
+    async def get_contents(self, request):
+        repository = self.repository(request.match_info["name"])
+        directory = request.match_info["path"].strip("/")
+        raw_url = (
+            f"{request.scheme}://{request.host}/raw/{repository.full_name}"
+            f"/{repository.commit_sha}"
+        )
+        items = await asyncio.to_thread(repository.directory, directory, raw_url)
+        return web.json_response(items)
+
+    async def get_tarball(self, request):
+        repository = self.repository(request.match_info["name"])
+        archive = await asyncio.to_thread(repository.archive)
+        return web.Response(body=archive, content_type="application/x-gzip")
+
+    async def get_raw(self, request):
+        repository = self.repository(request.match_info["name"])
+        path = request.match_info["path"]
+        if path not in repository.paths:
+            return web.Response(status=404)
+        return web.Response(body=repository.content(path))
+
+    async def get_pull(self, request):
+        number = int(request.match_info["number"])
+        return web.json_response(
+            {
+                "number": number,
+                "title": f"Benchmark change {number}",
+                "body": "Bumps the imported module and adds a version.",
+                "head": {"sha": hashlib.sha1(b"%d" % number).hexdigest()},
+            }
+        )
+
+    async def get_pull_files(self, request):
+        repository = self.repository(request.match_info["name"])
+        files = repository.pull_request_files(int(request.match_info["number"]))
+        per_page = int(request.query.get("per_page", "30"))
+        page = int(request.query.get("page", "1"))
+        return web.json_response(files[(page - 1) * per_page : page * per_page])
+
+    async def get_stats(self, request):
+        return web.json_response(dict(self.counts))
+
+    async def reset(self, request):
+        self.counts.clear()
+        self.quotas.clear()
+        return web.json_response({})
+
+
+def run(port, options, ready):
+    """Serves a FakeGitHub built from ``options`` until the process ends."""
+
+    async def main():
+        runner = web.AppRunner(FakeGitHub(**options).app(), access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", port).start()
+        ready.set()
+        await asyncio.Event().wait()
+
+    asyncio.run(main())
@@ -0,0 +1,61 @@
+import asyncio
+import time
+from collections import Counter
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+# Shared by every FakeChatModel of the process, read by the benchmark.
+usage = Counter()
+
+
+class FakeChatModel(BaseChatModel):
+    """A chat model that answers after ``first_token_latency`` seconds and
+    then emits ``output_tokens`` tokens at ``tokens_per_second``."""
+
+    tokens_per_second: float = 200.0
+    first_token_latency: float = 0.2
+    output_tokens: int = 200
+
+    @property
+    def _llm_type(self):
+        return "fake"
+
+    @property
+    def _identifying_params(self):
+        return {
+            "model": "fake",
+            "tokens_per_second": self.tokens_per_second,
+            "output_tokens": self.output_tokens,
+        }
+
+    def _tokens(self, messages):
+        prompt = "".join(str(message.content) for message in messages)
+        usage["calls"] += 1
+        usage["prompt_chars"] += len(prompt)
+        usage["output_tokens"] += self.output_tokens
+        return [f"token{index} " for index in range(self.output_tokens)]
+
+    def _result(self, tokens):
+        return ChatResult(
+            generations=[ChatGeneration(message=AIMessage(content="".join(tokens)))]
+        )
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        tokens = self._tokens(messages)
+        time.sleep(self.first_token_latency + len(tokens) / self.tokens_per_second)
+        return self._result(tokens)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        tokens = self._tokens(messages)
+        await asyncio.sleep(
+            self.first_token_latency + len(tokens) / self.tokens_per_second
+        )
+        return self._result(tokens)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        tokens = self._tokens(messages)
+        await asyncio.sleep(self.first_token_latency)
+        for token in tokens:
+            await asyncio.sleep(1 / self.tokens_per_second)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
@@ -0,0 +1,454 @@
+"""Benchmarks the AuditService end to end, without touching GitHub or an LLM.
+
+A fake GitHub serving synthetic repositories runs in one process and the
+real gRPC server, with a fake chat model, in another. Each case gets a fresh
+server and empty caches, and the synthetic repositories are deterministic,
+so results can be compared across runs:
+
+    python bench/run.py --files 10,1000,10000 --output bench.json
+    python bench/run.py --files 10,1000,10000 --baseline bench.json
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import aiohttp
+import grpc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+SRC_DIR = os.path.join(ROOT_DIR, "src")
+sys.path[:0] = [BENCH_DIR, SRC_DIR, os.path.join(SRC_DIR, "core")]
+
+import fake_github
+from core import audit_pb2, audit_pb2_grpc
+
+SCENARIOS = ["dump", "dump-warm", "analyze", "pull-request"]
+GITHUB_TOKEN = "bench-token"
+PULL_REQUEST_NUMBER = 1
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+def run_server(port, github_url, cache_dir, llm_options, connection):
+    """Serves the real AuditService with the fake chat model.
+
+    Answers "stats" and "stop" commands sent over ``connection``.
+    """
+    os.environ.update(
+        {
+            "GITHUB_API_URL": github_url,
+            "GITHUB_RAW_URL": f"{github_url}/raw",
+            "DUMP_CACHE_DIR": os.path.join(cache_dir, "dumps"),
+            "ANALYSIS_CACHE_DIR": os.path.join(cache_dir, "analyses"),
+            "SUMMARY_CACHE_DIR": os.path.join(cache_dir, "summaries"),
+            "LLM_API_KEY": "bench",
+        }
+    )
+    import fake_llm
+    from common.http_pool import close_session
+    from core.server import AuditServicer, serve
+
+    async def main():
+        servicer = AuditServicer()
+        chat_model = fake_llm.FakeChatModel(**llm_options)
+        servicer.analyze_source_code_service.chat_model = chat_model
+        servicer.analyze_source_pull_request_service.chat_model = chat_model
+        servicer.watch_service.chat_model = chat_model
+        server = await serve("127.0.0.1", port, servicer)
+
+        loop = asyncio.get_running_loop()
+        stopped = asyncio.Event()
+
+        def answer_commands():
+            while True:
+                command = connection.recv()
+                if command == "stats":
+                    connection.send(
+                        {"peak_rss_mb": peak_rss_mb(), "llm": dict(fake_llm.usage)}
+                    )
+                elif command == "stop":
+                    loop.call_soon_threadsafe(stopped.set)
+                    return
+
+        connection.send("ready")
+        threading.Thread(target=answer_commands, daemon=True).start()
+        await stopped.wait()
+        await server.stop(0)
+        await close_session()
+
+    asyncio.run(main())
+
+
+class ServerProcess:
+    def __init__(self, context, github_url, llm_options):
+        self.port = free_port()
+        self.cache_dir = tempfile.mkdtemp(prefix="hypnos-bench-")
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(
+            target=run_server,
+            args=(
+                self.port,
+                github_url,
+                self.cache_dir,
+                llm_options,
+                child_connection,
+            ),
+            name="bench-server",
+        )
+
+    def __enter__(self):
+        self.process.start()
+        if self.connection.recv() != "ready":
+            raise RuntimeError("benchmark server failed to start")
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.process.is_alive():
+            self.connection.send("stop")
+            self.process.join(30)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def stats(self):
+        self.connection.send("stats")
+        return self.connection.recv()
+
+
+class Client:
+    def __init__(self, stub):
+        self.stub = stub
+
+    async def call(self, method, request):
+        """Returns the last message of a streaming call, raising on errors."""
+        last = None
+        async for response in method(request):
+            last = response
+            if response.process_status in ("error", "pull_request_error"):
+                raise RuntimeError(response.error_message)
+        if last is None or last.process_status != "completed":
+            raise RuntimeError(f"call ended with {last and last.process_status}")
+        return last
+
+    async def dump(self, repository):
+        response = await self.call(
+            self.stub.DumpSourceCode,
+            audit_pb2.DumpSourceCodeRequest(
+                id_work=uuid.uuid4().hex,
+                id_repository=repository,
+                github_token=GITHUB_TOKEN,
+                store_only=True,
+            ),
+        )
+        if not response.dump_id:
+            raise RuntimeError(f"dump of {repository} was not stored")
+        return response.dump_id
+
+    async def analyze(self, repository, dump_id):
+        await self.call(
+            self.stub.AnalyzeSourceCode,
+            audit_pb2.AnalyzeSourceCodeRequest(
+                id_work=uuid.uuid4().hex, id_repository=repository, dump_id=dump_id
+            ),
+        )
+
+    async def analyze_pull_request(self, repository, dump_id):
+        await self.call(
+            self.stub.AnalyzePullRequest,
+            audit_pb2.AnalyzePullRequestRequest(
+                id_work=uuid.uuid4().hex,
+                id_repository=repository,
+                id_pull_request=str(PULL_REQUEST_NUMBER),
+                dump_id=dump_id,
+                github_token=GITHUB_TOKEN,
+            ),
+        )
+
+
+async def run_calls(calls, concurrency):
+    """Runs the ``calls`` coroutine functions, ``concurrency`` at a time.
+
+    Returns ``(latencies, errors, wall_time)``.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = []
+
+    async def timed(call):
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await call()
+            except Exception as e:
+                errors.append(str(e))
+            else:
+                latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(timed(call) for call in calls))
+    return latencies, errors, time.perf_counter() - started
+
+
+async def run_case(args, context, github_url, scenario, files):
+    repositories = [f"{files}-{index}" for index in range(args.repos)]
+    llm_options = {
+        "tokens_per_second": args.llm_tokens_per_second,
+        "first_token_latency": args.llm_first_token_latency,
+        "output_tokens": args.llm_output_tokens,
+    }
+    async with aiohttp.ClientSession() as http:
+        # The fake builds listings and archives on first use, which must
+        # not count against the service.
+        for repository in repositories:
+            full_name = f"bench/r{repository}"
+            for path in ("git/trees/main?recursive=1", "tarball/main"):
+                async with http.get(f"{github_url}/repos/{full_name}/{path}") as r:
+                    await r.read()
+
+        with ServerProcess(context, github_url, llm_options) as server:
+            async with grpc.aio.insecure_channel(
+                f"127.0.0.1:{server.port}",
+                options=[("grpc.max_receive_message_length", -1)],
+            ) as channel:
+                client = Client(audit_pb2_grpc.AuditServiceStub(channel))
+                dump_ids = {}
+                if scenario != "dump":
+                    for repository in repositories:
+                        dump_ids[repository] = await client.dump(repository)
+
+                if scenario in ("dump", "dump-warm"):
+                    calls = [
+                        lambda repository=repository: client.dump(repository)
+                        for repository in repositories
+                    ]
+                elif scenario == "analyze":
+                    calls = [
+                        lambda repository=repository: client.analyze(
+                            repository, dump_ids[repository]
+                        )
+                        for repository in repositories
+                    ]
+                else:
+                    calls = [
+                        lambda repository=repository: client.analyze_pull_request(
+                            repository, dump_ids[repository]
+                        )
+                        for repository in repositories
+                    ]
+
+                async with http.post(f"{github_url}/_bench/reset") as r:
+                    await r.read()
+                llm_before = server.stats()["llm"]
+                latencies, errors, wall_time = await run_calls(calls, args.concurrency)
+                async with http.get(f"{github_url}/_bench/stats") as r:
+                    github_requests = await r.json()
+                server_stats = server.stats()
+
+    llm_calls = server_stats["llm"].get("calls", 0) - llm_before.get("calls", 0)
+    return {
+        "scenario": scenario,
+        "files": files,
+        "calls": len(calls),
+        "errors": len(errors),
+        "error_samples": errors[:3],
+        "calls_per_second": len(latencies) / wall_time if wall_time else None,
+        "p50_seconds": percentile(latencies, 0.5),
+        "p99_seconds": percentile(latencies, 0.99),
+        "peak_rss_mb": server_stats["peak_rss_mb"],
+        "github_requests": github_requests,
+        "llm_calls": llm_calls,
+    }
+
+
+def describe_environment(args):
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT_DIR,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "options": vars(args),
+    }
+
+
+def format_table(results):
+    lines = [
+        f"{'scenario':<14}{'files':>7}{'calls':>7}{'errors':>8}{'ops/s':>9}"
+        f"{'p50 s':>9}{'p99 s':>9}{'rss MB':>9}{'github':>8}{'llm':>6}"
+    ]
+    for result in results:
+        lines.append(
+            f"{result['scenario']:<14}{result['files']:>7}{result['calls']:>7}"
+            f"{result['errors']:>8}{result['calls_per_second'] or 0:>9.2f}"
+            f"{result['p50_seconds'] or 0:>9.3f}{result['p99_seconds'] or 0:>9.3f}"
+            f"{result['peak_rss_mb']:>9.1f}"
+            f"{sum(result['github_requests'].values()):>8}{result['llm_calls']:>6}"
+        )
+        for error in result["error_samples"]:
+            lines.append(f"    error: {error}")
+    return "\n".join(lines)
+
+
+def compare(results, baseline, tolerance):
+    """Returns a line per case that got slower than ``baseline`` by more
+    than ``tolerance``, as a fraction."""
+    previous = {(r["scenario"], r["files"]): r for r in baseline["results"]}
+    regressions = []
+    for result in results:
+        before = previous.get((result["scenario"], result["files"]))
+        if before is None:
+            continue
+        name = f"{result['scenario']} with {result['files']} files"
+        if before["calls_per_second"] and result["calls_per_second"] is not None:
+            change = result["calls_per_second"] / before["calls_per_second"] - 1
+            if change < -tolerance:
+                regressions.append(f"{name}: throughput {change:+.0%}")
+        if before["p99_seconds"] and result["p99_seconds"] is not None:
+            change = result["p99_seconds"] / before["p99_seconds"] - 1
+            if change > tolerance:
+                regressions.append(f"{name}: p99 latency {change:+.0%}")
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--scenarios",
+        default=",".join(SCENARIOS),
+        help=f"comma separated, among {', '.join(SCENARIOS)}",
+    )
+    parser.add_argument(
+        "--files",
+        default="10,1000,10000",
+        help="comma separated repository sizes, up to 50000 files",
+    )
+    parser.add_argument("--repos", type=int, default=8, help="calls per case")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument(
+        "--latency", type=float, default=0.005, help="fake GitHub latency, seconds"
+    )
+    parser.add_argument(
+        "--rate-limit",
+        type=int,
+        default=0,
+        help="fake GitHub API requests per token and window, 0 for none",
+    )
+    parser.add_argument("--rate-limit-window", type=int, default=3600)
+    parser.add_argument("--tree-limit", type=int, default=100000)
+    parser.add_argument("--min-file-bytes", type=int, default=200)
+    parser.add_argument("--max-file-bytes", type=int, default=4000)
+    parser.add_argument("--llm-tokens-per-second", type=float, default=200)
+    parser.add_argument("--llm-first-token-latency", type=float, default=0.2)
+    parser.add_argument("--llm-output-tokens", type=int, default=200)
+    parser.add_argument("--output", help="writes the results as JSON")
+    parser.add_argument("--baseline", help="results JSON to compare against")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.1,
+        help="slowdown over the baseline reported as a regression",
+    )
+    return parser.parse_args()
+
+
+async def main(args):
+    context = multiprocessing.get_context("spawn")
+    github_port = free_port()
+    github_url = f"http://127.0.0.1:{github_port}"
+    ready = context.Event()
+    github = context.Process(
+        target=fake_github.run,
+        args=(
+            github_port,
+            {
+                "latency": args.latency,
+                "rate_limit": args.rate_limit,
+                "rate_limit_window": args.rate_limit_window,
+                "tree_limit": args.tree_limit,
+                "min_file_bytes": args.min_file_bytes,
+                "max_file_bytes": args.max_file_bytes,
+                "cached_repositories": max(args.repos, 8),
+            },
+            ready,
+        ),
+        name="fake-github",
+        daemon=True,
+    )
+    github.start()
+    try:
+        if not ready.wait(30):
+            raise RuntimeError("fake GitHub failed to start")
+        results = []
+        for files in [int(files) for files in args.files.split(",")]:
+            for scenario in args.scenarios.split(","):
+                print(f"running {scenario} with {files} files...", file=sys.stderr)
+                results.append(
+                    await run_case(args, context, github_url, scenario, files)
+                )
+    finally:
+        github.terminate()
+        github.join()
+    return results
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    unknown = set(args.scenarios.split(",")) - set(SCENARIOS)
+    if unknown:
+        sys.exit(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    results = asyncio.run(main(args))
+    print(format_table(results))
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(
+                {"environment": describe_environment(args), "results": results},
+                output,
+                indent=2,
+            )
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            regressions = compare(results, json.load(baseline), args.tolerance)
+        for regression in regressions:
+            print(f"regression: {regression}")
+        if regressions:
+            sys.exit(1)
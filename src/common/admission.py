@@ -0,0 +1,121 @@
+import asyncio
+import heapq
+import itertools
+import os
+from dotenv import load_dotenv
+from . import metrics
+from .exceptions import AdmissionRejectedError
+
+load_dotenv()
+
+ADMISSION_LIMITS = {
+    "DumpSourceCode": int(os.getenv("ADMISSION_DUMP_JOBS", "8")),
+    "AnalyzeSourceCode": int(os.getenv("ADMISSION_ANALYSIS_JOBS", "4")),
+    "AnalyzePullRequest": int(os.getenv("ADMISSION_PULL_REQUEST_JOBS", "4")),
+    "WatchPullRequests": int(os.getenv("ADMISSION_WATCH_JOBS", "1000")),
+}
+ADMISSION_MAX_QUEUED = int(os.getenv("ADMISSION_MAX_QUEUED", "100"))
+
+ACTIVE_JOBS = metrics.registry.gauge(
+    "hypnos_admission_active_jobs", "Jobs admitted and running.", ["rpc"]
+)
+QUEUED_JOBS = metrics.registry.gauge(
+    "hypnos_admission_queued_jobs", "Jobs waiting for admission.", ["rpc"]
+)
+REJECTED_JOBS = metrics.registry.counter(
+    "hypnos_admission_rejected_total", "Jobs rejected at capacity.", ["rpc"]
+)
+
+
+class Ticket:
+    def __init__(self, queue, priority, sequence):
+        self.queue = queue
+        self.order = (priority, sequence)
+        self.admitted = False
+        self.released = False
+
+    def __lt__(self, other):
+        return self.order < other.order
+
+    async def wait(self):
+        """Yields the position of the ticket in its queue each time it
+        changes, and returns once the ticket is admitted."""
+        position = None
+        while not self.admitted:
+            changed = self.queue.changed
+            if self.queue.position(self) != position:
+                position = self.queue.position(self)
+                yield position
+            await changed.wait()
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.queue.release(self)
+
+
+class AdmissionQueue:
+    def __init__(self, name, max_concurrency, max_queued):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queued = max_queued
+        self.active = 0
+        self.waiting = []
+        self.sequence = itertools.count()
+        # Created on first use, so the event binds to the running loop.
+        self.changed = None
+
+    def enqueue(self, priority):
+        if len(self.waiting) >= self.max_queued:
+            REJECTED_JOBS.inc(rpc=self.name)
+            raise AdmissionRejectedError(
+                f"{self.name} is at capacity: {self.active} running, "
+                f"{len(self.waiting)} queued"
+            )
+        ticket = Ticket(self, priority, next(self.sequence))
+        heapq.heappush(self.waiting, ticket)
+        self._admit()
+        return ticket
+
+    def position(self, ticket):
+        return 1 + sum(1 for other in self.waiting if other < ticket)
+
+    def release(self, ticket):
+        if ticket.admitted:
+            self.active -= 1
+        else:
+            self.waiting.remove(ticket)
+            heapq.heapify(self.waiting)
+        self._admit()
+
+    def _admit(self):
+        while self.waiting and self.active < self.max_concurrency:
+            ticket = heapq.heappop(self.waiting)
+            ticket.admitted = True
+            self.active += 1
+        if self.changed is not None:
+            self.changed.set()
+        self.changed = asyncio.Event()
+        ACTIVE_JOBS.set(self.active, rpc=self.name)
+        QUEUED_JOBS.set(len(self.waiting), rpc=self.name)
+
+
+class AdmissionController:
+    """Bounds the jobs each RPC runs at once and queues the rest.
+
+    Queued jobs are admitted by priority, lower values first, then in
+    arrival order. Once ``max_queued`` jobs wait for an RPC, new ones are
+    rejected with AdmissionRejectedError instead of piling up.
+    """
+
+    def __init__(self, limits, max_queued):
+        self.queues = {
+            name: AdmissionQueue(name, limit, max_queued)
+            for name, limit in limits.items()
+        }
+
+    def enqueue(self, rpc, priority=0):
+        return self.queues[rpc].enqueue(priority)
+
+
+admission_controller = AdmissionController(ADMISSION_LIMITS, ADMISSION_MAX_QUEUED)
@@ -0,0 +1,588 @@
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from dotenv import load_dotenv
+from langchain.prompts import ChatPromptTemplate
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import RunnablePassthrough
+from . import metrics
+from .dump_format import FILE_SEPARATOR, format_file, parse_dump
+from .jobs import current_rpc
+from .reference_index import ReferenceIndex
+from .result_cache import summary_cache
+
+load_dotenv()
+
+ANALYSIS_MAX_PROMPT_TOKENS = int(os.getenv("ANALYSIS_MAX_PROMPT_TOKENS", "150000"))
+ANALYSIS_SHARD_TOKENS = int(os.getenv("ANALYSIS_SHARD_TOKENS", "60000"))
+ANALYSIS_PARALLELISM = int(os.getenv("ANALYSIS_PARALLELISM", "4"))
+PULL_REQUEST_DIFF_TOKENS = int(os.getenv("PULL_REQUEST_DIFF_TOKENS", "60000"))
+PULL_REQUEST_CONTEXT_TOKENS = int(os.getenv("PULL_REQUEST_CONTEXT_TOKENS", "40000"))
+PULL_REQUEST_CONTEXT_FILES = int(os.getenv("PULL_REQUEST_CONTEXT_FILES", "20"))
+CHARS_PER_TOKEN = 4
+
+LLM_REQUESTS = metrics.registry.counter(
+    "hypnos_llm_requests_total", "Model calls by RPC and outcome.", ["rpc", "status"]
+)
+LLM_DURATION = metrics.registry.histogram(
+    "hypnos_llm_request_duration_seconds", "Duration of model calls.", ["rpc"]
+)
+LLM_TOKENS = metrics.registry.counter(
+    "hypnos_llm_tokens_total",
+    "Prompt and completion tokens, estimated when the model reports no usage.",
+    ["rpc", "kind"],
+)
+
+ANALYSIS_SECTIONS = """            1. Overall Architecture and Structure:
+               - Describe the high-level architecture of the codebase.
+               - Identify design patterns used and evaluate their appropriateness.
+               - Assess the modularity and organization of the code.
+
+            2. Main Components and Modules:
+               - List and describe the primary components or modules.
+               - Explain the responsibilities and interactions of each component.
+               - Evaluate the separation of concerns and cohesion within the codebase.
+
+            3. Key Functionalities:
+               - Identify and explain the main features or functionalities implemented.
+               - Analyze the implementation approach for each key functionality.
+               - Assess the efficiency and effectiveness of the implementations.
+
+            4. Code Quality and Best Practices:
+               - Evaluate adherence to coding standards and best practices.
+               - Identify areas where SOLID principles are followed or violated.
+               - Assess the readability, maintainability, and scalability of the code.
+
+            5. Security Analysis:
+               - Identify potential security vulnerabilities or risks.
+               - Suggest security best practices that should be implemented.
+               - Evaluate handling of sensitive data, if applicable.
+
+            6. Programmer Profile Analysis:
+                - Guess the programmer's potential background or specialization areas.
+                - Guess the programmer favorite IDE.
+                - Guess the programmer favorite linux or unix distro.
+                - Guess the programmer favorite clothe's colors and sci-fi movie.
+
+"""
+
+ANALYSIS_TEMPLATE = (
+    """
+            You are an expert software engineer and code analyst. Your task is to provide a comprehensive and in-depth analysis of the following source code and the author. Be thorough, detailed, and insightful in your analysis.
+
+            Source Code:
+            {code}
+
+            Please provide a detailed analysis covering the following aspects:
+
+"""
+    + ANALYSIS_SECTIONS
+    + """            Please provide your analysis in a clear, structured format.
+
+                """
+)
+
+SHARD_TEMPLATE = (
+    """
+            You are an expert software engineer and code analyst. The following source code is one part of a larger codebase that is being analyzed in several parts. Write thorough notes about this part covering the aspects below, so they can later be merged with the notes on the other parts into one report. Refer to files by path where it matters.
+
+            Source Code:
+            {code}
+
+            Aspects to cover:
+
+"""
+    + ANALYSIS_SECTIONS
+    + """
+            Write only the notes, grouped under the six aspects.
+
+                """
+)
+
+MERGE_TEMPLATE = (
+    """
+            You are an expert software engineer and code analyst. A codebase too large to read at once was analyzed in several parts. The notes on each part follow. Merge them into a comprehensive and in-depth analysis of the whole codebase and the author. Be thorough, detailed, and insightful, and resolve overlaps between the notes instead of repeating them.
+
+            Partial Notes:
+            {code}
+
+            Please provide a detailed analysis covering the following aspects:
+
+"""
+    + ANALYSIS_SECTIONS
+    + """
+            Please provide your analysis in a clear, structured format.
+
+                """
+)
+
+FILE_SUMMARY_TEMPLATE = (
+    """
+            You are an expert software engineer and code analyst. Summarize the following source file so that the summary can later stand in for the file in an analysis of the whole codebase. Cover its purpose, its main components and their interactions, notable implementation choices, code quality issues and security risks. Be concise but keep every detail that matters for the aspects below.
+
+            Source File:
+            {code}
+
+            Aspects the analysis will cover:
+
+"""
+    + ANALYSIS_SECTIONS
+    + """
+            Write only the summary.
+
+                """
+)
+
+PULL_REQUEST_TEMPLATE = """
+            You are an expert software engineer and code reviewer. Your task is to review the following pull request. Be thorough, detailed, and insightful in your review, and refer to files and lines of the diff where it matters.
+
+            Pull Request: {title}
+
+            Description:
+            {description}
+
+            Changes:
+            {diff}
+
+            Related Source Files (as of the base of the pull request):
+            {context}
+
+            Please provide a detailed review covering the following aspects:
+
+            1. Summary of Changes:
+               - Describe what the pull request changes and why.
+               - Identify the components and modules affected.
+
+            2. Design and Architecture:
+               - Evaluate how the changes fit the existing architecture.
+               - Identify design issues or inconsistencies with the surrounding code.
+
+            3. Correctness:
+               - Identify bugs, regressions and unhandled edge cases.
+               - Point out callers or dependents that the changes may break.
+
+            4. Code Quality and Best Practices:
+               - Evaluate adherence to coding standards and best practices.
+               - Assess the readability, maintainability, and test coverage of the changes.
+
+            5. Security Analysis:
+               - Identify potential security vulnerabilities or risks introduced.
+               - Evaluate handling of sensitive data, if applicable.
+
+            6. Suggested Improvements:
+               - List concrete changes the author should make before merging.
+
+            Please provide your review in a clear, structured format.
+
+                """
+
+NOTES_SEPARATOR = "\n\n---\n\n"
+NOTE_TRUNCATED = "\n(notes truncated)"
+REPLAY_CHUNK_SIZE = 2048
+
+PROMPT_VERSION = hashlib.sha256(
+    repr(
+        (
+            ANALYSIS_TEMPLATE,
+            SHARD_TEMPLATE,
+            MERGE_TEMPLATE,
+            ANALYSIS_MAX_PROMPT_TOKENS,
+            ANALYSIS_SHARD_TOKENS,
+        )
+    ).encode()
+).hexdigest()[:16]
+
+
+SUMMARY_PROMPT_VERSION = hashlib.sha256(
+    repr(
+        (
+            FILE_SUMMARY_TEMPLATE,
+            MERGE_TEMPLATE,
+            ANALYSIS_MAX_PROMPT_TOKENS,
+            ANALYSIS_SHARD_TOKENS,
+        )
+    ).encode()
+).hexdigest()[:16]
+
+
+class LLMMetrics(BaseCallbackHandler):
+    """Records the model calls of analysis chains under the calling job's RPC."""
+
+    # Runs in the caller's context, where the current job is visible.
+    run_inline = True
+
+    def __init__(self):
+        self.calls = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        prompt_chars = sum(
+            len(str(message.content)) for batch in messages for message in batch
+        )
+        self.calls[run_id] = (time.monotonic(), prompt_chars, current_rpc())
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        call = self.calls.pop(run_id, None)
+        if call is None:
+            return
+        started, prompt_chars, rpc = call
+        prompt_tokens = completion_tokens = 0
+        completion_chars = 0
+        for generations in response.generations:
+            for generation in generations:
+                completion_chars += len(generation.text)
+                message = getattr(generation, "message", None)
+                usage = getattr(message, "usage_metadata", None) or {}
+                prompt_tokens += usage.get("input_tokens", 0)
+                completion_tokens += usage.get("output_tokens", 0)
+        if not prompt_tokens and not completion_tokens:
+            prompt_tokens = prompt_chars // CHARS_PER_TOKEN
+            completion_tokens = completion_chars // CHARS_PER_TOKEN
+        LLM_REQUESTS.inc(rpc=rpc, status="completed")
+        LLM_DURATION.observe(time.monotonic() - started, rpc=rpc)
+        LLM_TOKENS.inc(prompt_tokens, rpc=rpc, kind="prompt")
+        LLM_TOKENS.inc(completion_tokens, rpc=rpc, kind="completion")
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        call = self.calls.pop(run_id, None)
+        if call is None:
+            return
+        started, _, rpc = call
+        LLM_REQUESTS.inc(rpc=rpc, status="error")
+        LLM_DURATION.observe(time.monotonic() - started, rpc=rpc)
+
+
+llm_metrics = LLMMetrics()
+
+
+def build_chain(chat_model, template):
+    prompt = ChatPromptTemplate.from_template(template)
+    chain = {"code": RunnablePassthrough()} | prompt | chat_model | StrOutputParser()
+    return chain.with_config(callbacks=[llm_metrics])
+
+
+def describe_model(chat_model):
+    return repr(sorted(chat_model._identifying_params.items()))
+
+
+async def stream_cached_analysis(chat_model, code_dump, cache, analysis_mode=""):
+    """Runs the analysis selected by ``analysis_mode``, replaying results
+    stored in ``cache``.
+
+    A result is only stored once the whole analysis has been generated.
+    """
+    if analysis_mode not in ANALYSIS_MODES:
+        raise ValueError(f"Unknown analysis mode: {analysis_mode}")
+    analyze, prompt_version = ANALYSIS_MODES[analysis_mode]
+    key = await asyncio.to_thread(
+        cache.make_key, code_dump, prompt_version, describe_model(chat_model)
+    )
+    entry = await asyncio.to_thread(cache.get, key)
+    if entry is not None:
+        logging.info(f"Analysis cache hit: {cache.stats()}")
+        result = entry["result"]
+        for start in range(0, len(result), REPLAY_CHUNK_SIZE):
+            yield result[start : start + REPLAY_CHUNK_SIZE]
+        return
+
+    started = time.monotonic()
+    parts = []
+    async for delta in analyze(chat_model, code_dump):
+        parts.append(delta)
+        yield delta
+    await asyncio.to_thread(cache.put, key, "".join(parts), time.monotonic() - started)
+    logging.info(f"Analysis cache miss: {cache.stats()}")
+
+
+async def stream_analysis(chat_model, code_dump):
+    """Yields the analysis of ``code_dump`` as it is generated.
+
+    Dumps that fit in ANALYSIS_MAX_PROMPT_TOKENS go through a single prompt.
+    Larger ones are split into shards that are analyzed concurrently, and
+    the streamed result is the merge of the notes on every shard.
+    """
+    if estimate_tokens(code_dump) <= ANALYSIS_MAX_PROMPT_TOKENS:
+        async for delta in build_chain(chat_model, ANALYSIS_TEMPLATE).astream(
+            code_dump
+        ):
+            yield delta
+        return
+
+    shards = split_into_shards(code_dump, ANALYSIS_SHARD_TOKENS)
+    notes = await run_chain_concurrently(
+        build_chain(chat_model, SHARD_TEMPLATE), shards, ANALYSIS_PARALLELISM
+    )
+    merged_notes = await condense_notes(chat_model, notes)
+    async for delta in build_chain(chat_model, MERGE_TEMPLATE).astream(merged_notes):
+        yield delta
+
+
+async def stream_summarized_analysis(chat_model, code_dump):
+    """Yields an analysis synthesized from per-file summaries.
+
+    Summaries are memoized in ``summary_cache`` by file content, so on
+    re-analysis only files whose content changed go through the model.
+    """
+    model_params = describe_model(chat_model)
+    shard_chars = ANALYSIS_SHARD_TOKENS * CHARS_PER_TOKEN
+    sections = [
+        (path, section)
+        for path, text in parse_dump(code_dump)
+        for section in _split_file(path, text, shard_chars)
+    ]
+    keys = await asyncio.to_thread(
+        lambda: [
+            summary_cache.make_key(section, SUMMARY_PROMPT_VERSION, model_params)
+            for _, section in sections
+        ]
+    )
+    summaries = await asyncio.to_thread(
+        lambda: [summary_cache.get(key) for key in keys]
+    )
+
+    pending = [index for index, summary in enumerate(summaries) if summary is None]
+    logging.info(
+        f"Summarizing {len(pending)} of {len(sections)} files, "
+        f"summary cache: {summary_cache.stats()}"
+    )
+    chain = build_chain(chat_model, FILE_SUMMARY_TEMPLATE)
+
+    async def summarize(index):
+        started = time.monotonic()
+        summary = await chain.ainvoke(sections[index][1])
+        await asyncio.to_thread(
+            summary_cache.put, keys[index], summary, time.monotonic() - started
+        )
+        return {"result": summary}
+
+    generated = await run_concurrently(
+        [summarize(index) for index in pending], ANALYSIS_PARALLELISM
+    )
+    for index, summary in zip(pending, generated):
+        summaries[index] = summary
+
+    notes = [
+        f"[SUMMARY: {path}]\n\n{summary['result']}"
+        for (path, _), summary in zip(sections, summaries)
+    ]
+    merged_notes = await condense_notes(chat_model, notes)
+    async for delta in build_chain(chat_model, MERGE_TEMPLATE).astream(merged_notes):
+        yield delta
+
+
+async def stream_pull_request_analysis(chat_model, pull_request, files, code_dump):
+    """Yields the review of a pull request as it is generated.
+
+    The prompt holds the diff of the changed ``files`` and a bounded set of
+    related files from ``code_dump``, so its size follows the size of the
+    pull request rather than the size of the repository.
+    """
+    diff = format_diff(files, PULL_REQUEST_DIFF_TOKENS * CHARS_PER_TOKEN)
+    context = await asyncio.to_thread(
+        select_context,
+        code_dump,
+        [file["filename"] for file in files],
+        PULL_REQUEST_CONTEXT_FILES,
+        PULL_REQUEST_CONTEXT_TOKENS * CHARS_PER_TOKEN,
+    )
+    logging.info(
+        f"Reviewing pull request with {len(files)} changed files, "
+        f"~{estimate_tokens(diff)} diff tokens and {len(context)} context files"
+    )
+
+    prompt = ChatPromptTemplate.from_template(PULL_REQUEST_TEMPLATE)
+    chain = (prompt | chat_model | StrOutputParser()).with_config(
+        callbacks=[llm_metrics]
+    )
+    async for delta in chain.astream(
+        {
+            "title": pull_request.get("title") or "",
+            "description": pull_request.get("body") or "(no description)",
+            "diff": diff,
+            "context": FILE_SEPARATOR.join(
+                format_file(path, text) for path, text in context
+            )
+            or "(none)",
+        }
+    ):
+        yield delta
+
+
+def format_diff(files, max_chars):
+    """Formats the patches of the changed files of a pull request.
+
+    Once ``max_chars`` is used up, the remaining files are listed without
+    their patch.
+    """
+    sections = []
+    remaining = max_chars
+    for file in files:
+        path = file["filename"]
+        header = (
+            f"{file.get('status', 'modified')}, "
+            f"+{file.get('additions', 0)} -{file.get('deletions', 0)}"
+        )
+        if file.get("previous_filename"):
+            header += f", renamed from {file['previous_filename']}"
+        patch = file.get("patch")
+        if patch is None:
+            patch = "(no textual diff available)"
+        elif len(patch) > remaining:
+            patch = (
+                f"{patch[:remaining]}\n(patch truncated)"
+                if remaining
+                else "(patch omitted)"
+            )
+        remaining = max(remaining - len(patch), 0)
+        sections.append(
+            f"[DIFF: {path} ({header})]\n\n{patch}\n\n[END OF DIFF: {path}]"
+        )
+    return FILE_SEPARATOR.join(sections)
+
+
+def select_context(code_dump, paths, max_files, max_chars):
+    index = ReferenceIndex(parse_dump(code_dump))
+    return index.related_files(paths, max_files, max_chars)
+
+
+async def condense_notes(chat_model, notes):
+    """Merges notes in groups until they fit into a single prompt.
+
+    Once grouping no longer shrinks them, each note is truncated to its
+    share of ANALYSIS_MAX_PROMPT_TOKENS instead.
+    """
+    chain = build_chain(chat_model, MERGE_TEMPLATE)
+    max_chars = ANALYSIS_MAX_PROMPT_TOKENS * CHARS_PER_TOKEN
+    while len(NOTES_SEPARATOR.join(notes)) > max_chars:
+        groups = _group_notes(notes, ANALYSIS_SHARD_TOKENS * CHARS_PER_TOKEN)
+        if len(groups) < len(notes):
+            merged = await run_chain_concurrently(chain, groups, ANALYSIS_PARALLELISM)
+            if sum(map(len, merged)) < sum(map(len, notes)):
+                notes = merged
+                continue
+        logging.warning(
+            f"Truncating {len(notes)} analysis notes to fit the merge prompt"
+        )
+        notes = _truncate_notes(notes, max_chars)
+        break
+    return NOTES_SEPARATOR.join(notes)
+
+
+async def run_chain_concurrently(chain, inputs, parallelism):
+    return await run_concurrently(
+        [chain.ainvoke(chain_input) for chain_input in inputs], parallelism
+    )
+
+
+async def run_concurrently(coroutines, parallelism):
+    semaphore = asyncio.Semaphore(parallelism)
+
+    async def run(coroutine):
+        async with semaphore:
+            return await coroutine
+
+    tasks = [asyncio.ensure_future(run(coroutine)) for coroutine in coroutines]
+    try:
+        return await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN
+
+
+def split_into_shards(code_dump, shard_tokens):
+    """Packs the files of a dump into shards of at most ``shard_tokens``.
+
+    Shards are cut on ``[FILE: ...]`` boundaries. A single file larger than
+    the budget is split on line boundaries into numbered parts.
+    """
+    shard_chars = shard_tokens * CHARS_PER_TOKEN
+    shards = []
+    current = []
+    current_size = 0
+    for path, text in parse_dump(code_dump):
+        for section in _split_file(path, text, shard_chars):
+            if current and current_size + len(section) > shard_chars:
+                shards.append(FILE_SEPARATOR.join(current))
+                current = []
+                current_size = 0
+            current.append(section)
+            current_size += len(section) + len(FILE_SEPARATOR)
+    if current:
+        shards.append(FILE_SEPARATOR.join(current))
+    return shards
+
+
+def _split_file(path, text, max_chars):
+    section = format_file(path, text)
+    if len(section) <= max_chars:
+        return [section]
+
+    max_chars = max(max_chars - len(section) + len(text) - 40, 1)
+    parts = []
+    current = []
+    current_size = 0
+    for line in text.splitlines(keepends=True):
+        if current and current_size + len(line) > max_chars:
+            parts.append("".join(current))
+            current = []
+            current_size = 0
+        while len(line) > max_chars:
+            parts.append(line[:max_chars])
+            line = line[max_chars:]
+        current.append(line)
+        current_size += len(line)
+    if current:
+        parts.append("".join(current))
+    return [
+        format_file(f"{path} (part {index} of {len(parts)})", part)
+        for index, part in enumerate(parts, start=1)
+    ]
+
+
+def _group_notes(notes, max_chars):
+    groups = []
+    current = []
+    current_size = 0
+    for note in notes:
+        if current and current_size + len(note) > max_chars:
+            groups.append(NOTES_SEPARATOR.join(current))
+            current = []
+            current_size = 0
+        current.append(note)
+        current_size += len(note) + len(NOTES_SEPARATOR)
+    if current:
+        groups.append(NOTES_SEPARATOR.join(current))
+    return groups
+
+
+def _truncate_notes(notes, max_chars):
+    """Cuts the longest notes so that they join into at most ``max_chars``.
+
+    Notes shorter than an even share are kept whole and what they leave
+    unused is shared among the others.
+    """
+    budget = max_chars - len(NOTES_SEPARATOR) * (len(notes) - 1)
+    budget -= len(NOTE_TRUNCATED) * len(notes)
+    share = 0
+    remaining = len(notes)
+    for size in sorted(map(len, notes)):
+        share = max(budget, 0) // remaining
+        if size > share:
+            break
+        budget -= size
+        remaining -= 1
+    return [
+        note if len(note) <= share else note[:share] + NOTE_TRUNCATED for note in notes
+    ]
+
+
+ANALYSIS_MODES = {
+    "": (stream_analysis, PROMPT_VERSION),
+    "summaries": (stream_summarized_analysis, SUMMARY_PROMPT_VERSION),
+}
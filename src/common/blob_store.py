@@ -0,0 +1,83 @@
+import hashlib
+import os
+from collections import OrderedDict
+from dotenv import load_dotenv
+from . import metrics
+
+load_dotenv()
+
+BLOB_STORE_BYTES = int(os.getenv("BLOB_STORE_BYTES", str(512 * 1024 * 1024)))
+
+BLOB_LOOKUPS = metrics.registry.counter(
+    "hypnos_blob_store_lookups_total",
+    "Blob store lookups by result: hit or miss.",
+    ["result"],
+)
+BLOB_BYTES_SAVED = metrics.registry.counter(
+    "hypnos_blob_store_bytes_saved_total",
+    "Bytes of file contents served by the blob store instead of downloaded.",
+)
+
+
+class BlobStore:
+    """Decoded file contents keyed by git blob SHA.
+
+    Identical content has the same blob SHA in every repository and
+    commit, so each distinct file is stored once. The store is bounded by
+    ``max_bytes`` and evicts the least recently used blobs first.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._blobs = OrderedDict()
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+
+    @staticmethod
+    def blob_sha(content):
+        return hashlib.sha1(b"blob %d\0" % len(content) + content).hexdigest()
+
+    def __contains__(self, sha):
+        return sha in self._blobs
+
+    def get(self, sha):
+        text = self._blobs.get(sha)
+        if text is None:
+            self.misses += 1
+            BLOB_LOOKUPS.inc(result="miss")
+            return None
+        self._blobs.move_to_end(sha)
+        self.hits += 1
+        self.bytes_saved += len(text)
+        BLOB_LOOKUPS.inc(result="hit")
+        BLOB_BYTES_SAVED.inc(len(text))
+        return text
+
+    def put(self, sha, text):
+        size = len(text)
+        if size > self.max_bytes:
+            return
+        previous = self._blobs.pop(sha, None)
+        if previous is not None:
+            self._size -= len(previous)
+        self._blobs[sha] = text
+        self._size += size
+        while self._size > self.max_bytes:
+            _, evicted = self._blobs.popitem(last=False)
+            self._size -= len(evicted)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "blobs": len(self._blobs),
+            "bytes": self._size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "bytes_saved": self.bytes_saved,
+        }
+
+
+blob_store = BlobStore(BLOB_STORE_BYTES)
@@ -0,0 +1,67 @@
+import re
+
+SNIFF_BYTES = 8192
+
+# Bumped whenever the checks change, so dumps filtered by them are rebuilt.
+SNIFF_VERSION = 3
+
+# Header conventions of generated files: Go's, the @generated tag and
+# protoc's, only looked for in the comments a file starts with.
+GENERATED_HEADER = re.compile(
+    r"Code generated .* DO NOT EDIT\.$"
+    r"|@generated\b"
+    r"|Generated by the protocol buffer compiler\.\s+DO NOT EDIT!"
+)
+COMMENT_LINE = re.compile(r"\s*(#|//|/\*|\*|--|;|<!--)")
+GENERATED_HEAD_CHARS = 2000
+GENERATED_HEAD_LINES = 30
+MINIFIED_LINE_LENGTH = 1000
+MINIFIED_WHITESPACE_RATIO = 0.08
+BINARY_CONTROL_RATIO = 0.1
+TEXT_CONTROL_BYTES = {ord(c) for c in "\t\n\r\f\b\x1b"}
+
+
+def is_binary(head):
+    if b"\0" in head:
+        return True
+    control = sum(1 for byte in head if byte < 32 and byte not in TEXT_CONTROL_BYTES)
+    return control > len(head) * BINARY_CONTROL_RATIO
+
+
+def is_generated(text):
+    lines = text[:GENERATED_HEAD_CHARS].splitlines()[:GENERATED_HEAD_LINES]
+    for line in lines:
+        if not line.strip():
+            continue
+        if not COMMENT_LINE.match(line):
+            return False
+        if GENERATED_HEADER.search(line.rstrip()):
+            return True
+    return False
+
+
+def is_minified(text):
+    """Minified code packs its tokens on very long lines with hardly any
+    whitespace. Unwrapped prose paragraphs are long lines too, but about
+    one character in six is a space."""
+    long_lines = [
+        line for line in text.splitlines() if len(line) >= MINIFIED_LINE_LENGTH
+    ]
+    if not long_lines:
+        return False
+    size = sum(len(line) for line in long_lines)
+    blanks = sum(line.count(" ") + line.count("\t") for line in long_lines)
+    return blanks < size * MINIFIED_WHITESPACE_RATIO
+
+
+def sniff(head):
+    """Returns why a file whose first bytes are ``head`` is left out of
+    dumps, "binary", "generated" or "minified", or None to keep it."""
+    if is_binary(head):
+        return "binary"
+    text = head.decode("utf-8", errors="replace")
+    if is_generated(text):
+        return "generated"
+    if is_minified(text):
+        return "minified"
+    return None
@@ -0,0 +1,118 @@
+import os
+import tempfile
+import threading
+import time
+
+# Seconds after which a directory is rescanned even when under budget, to
+# pick up what other workers wrote and expire old entries.
+DISK_RESCAN_INTERVAL = 300
+# Eviction frees a directory down to this fraction of its budget, so that
+# the next scan is only due after a number of new entries.
+DISK_EVICT_TARGET = 0.9
+
+
+class DiskTier:
+    """Cache entries stored as one file each under ``directory``.
+
+    Entries are written to a temporary file and moved into place by
+    ``install``. An entry's modification time is when it was stored and its
+    access time when it was last used, as set by ``touch``.
+
+    The total size is tracked as entries are installed, and the directory
+    is only scanned when that goes over ``max_bytes`` or
+    DISK_RESCAN_INTERVAL has passed. A scan removes the entries stored more
+    than ``ttl`` seconds ago and the temporary files of killed workers, then
+    the least recently used entries down to DISK_EVICT_TARGET of the budget.
+    One thread scans at a time, and entries installed meanwhile are added
+    to the size it finds.
+    """
+
+    def __init__(self, directory, suffix, max_bytes, ttl):
+        self.directory = directory
+        self.suffix = suffix
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._size = None
+        self._added = 0
+        self._scanning = False
+        self._scanned_at = 0.0
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}{self.suffix}")
+
+    def create_temp(self):
+        """Returns ``(fd, temp_path)`` of a new file to write an entry to."""
+        os.makedirs(self.directory, exist_ok=True)
+        return tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+
+    def install(self, temp_path, key):
+        path = self.path(key)
+        added = os.path.getsize(temp_path)
+        try:
+            added -= os.path.getsize(path)
+        except FileNotFoundError:
+            pass
+        os.replace(temp_path, path)
+        with self._lock:
+            self._added += added
+            if self._size is not None:
+                self._size += added
+            if self._scanning or (
+                self._size is not None
+                and self._size <= self.max_bytes
+                and time.monotonic() - self._scanned_at < DISK_RESCAN_INTERVAL
+            ):
+                return
+            self._scanning = True
+        try:
+            self._evict()
+        finally:
+            with self._lock:
+                self._scanning = False
+
+    def touch(self, path, stored_at):
+        """Marks the entry at ``path`` used, keeping when it was stored."""
+        try:
+            os.utime(path, (time.time(), stored_at))
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        with self._lock:
+            added_before = self._added
+        scanned_at = time.monotonic()
+        now = time.time()
+        entries = []
+        total_size = 0
+        with os.scandir(self.directory) as scan:
+            for entry in scan:
+                if not entry.name.endswith((".tmp", self.suffix)):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                if now - stat.st_mtime >= self.ttl:
+                    remove(entry.path)
+                elif not entry.name.endswith(".tmp"):
+                    entries.append((stat.st_atime, stat.st_size, entry.path))
+                    total_size += stat.st_size
+        if total_size > self.max_bytes:
+            for _, size, path in sorted(entries):
+                if total_size <= self.max_bytes * DISK_EVICT_TARGET:
+                    break
+                remove(path)
+                total_size -= size
+        with self._lock:
+            # Entries the scan already saw may be counted twice, which only
+            # brings the next scan forward.
+            self._size = total_size + self._added - added_before
+            self._scanned_at = scanned_at
+
+
+def remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,105 @@
+import asyncio
+import os
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DOWNLOAD_MAX_CONCURRENCY = int(os.getenv("DOWNLOAD_MAX_CONCURRENCY", "64"))
+DOWNLOAD_MAX_CONCURRENCY_PER_JOB = int(
+    os.getenv("DOWNLOAD_MAX_CONCURRENCY_PER_JOB", "16")
+)
+
+
+class DownloadScheduler:
+    """Fair semaphore shared by every download in the process.
+
+    At most ``max_concurrency`` slots are handed out in total and at most
+    ``max_concurrency_per_job`` to a single job. When slots are contended,
+    waiting jobs are served round-robin so a large job cannot starve the
+    others.
+    """
+
+    def __init__(self, max_concurrency, max_concurrency_per_job):
+        self.max_concurrency = max_concurrency
+        self.max_concurrency_per_job = max_concurrency_per_job
+        self._active = 0
+        self._active_per_job = {}
+        self._waiters = OrderedDict()
+
+    @asynccontextmanager
+    async def slot(self, job_id):
+        await self._acquire(job_id)
+        try:
+            yield
+        finally:
+            self._release(job_id)
+
+    async def _acquire(self, job_id):
+        if self._can_start(job_id):
+            self._start(job_id)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(job_id, deque()).append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._release(job_id)
+            else:
+                self._discard_waiter(job_id, future)
+            raise
+
+    def _can_start(self, job_id):
+        return (
+            self._active < self.max_concurrency
+            and self._active_per_job.get(job_id, 0) < self.max_concurrency_per_job
+        )
+
+    def _start(self, job_id):
+        self._active += 1
+        self._active_per_job[job_id] = self._active_per_job.get(job_id, 0) + 1
+
+    def _release(self, job_id):
+        self._active -= 1
+        self._active_per_job[job_id] -= 1
+        if not self._active_per_job[job_id]:
+            del self._active_per_job[job_id]
+        self._dispatch()
+
+    def _discard_waiter(self, job_id, future):
+        waiters = self._waiters.get(job_id)
+        if waiters is None:
+            return
+        try:
+            waiters.remove(future)
+        except ValueError:
+            pass
+        if not waiters:
+            del self._waiters[job_id]
+
+    def _dispatch(self):
+        while self._active < self.max_concurrency and self._waiters:
+            for job_id in list(self._waiters):
+                if self._can_start(job_id):
+                    break
+            else:
+                return
+
+            waiters = self._waiters[job_id]
+            future = waiters.popleft()
+            if not waiters:
+                del self._waiters[job_id]
+            else:
+                self._waiters.move_to_end(job_id)
+            if future.done():
+                continue
+            self._start(job_id)
+            future.set_result(None)
+
+
+download_scheduler = DownloadScheduler(
+    DOWNLOAD_MAX_CONCURRENCY, DOWNLOAD_MAX_CONCURRENCY_PER_JOB
+)
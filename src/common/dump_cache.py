@@ -0,0 +1,160 @@
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from dotenv import load_dotenv
+from .disk_tier import DiskTier, remove
+
+load_dotenv()
+
+DUMP_CACHE_DIR = os.getenv(
+    "DUMP_CACHE_DIR", os.path.join(tempfile.gettempdir(), "hypnos", "dumps")
+)
+DUMP_CACHE_MEMORY_BYTES = int(
+    os.getenv("DUMP_CACHE_MEMORY_BYTES", str(256 * 1024 * 1024))
+)
+DUMP_CACHE_DISK_BYTES = int(
+    os.getenv("DUMP_CACHE_DISK_BYTES", str(4 * 1024 * 1024 * 1024))
+)
+DUMP_CACHE_TTL = float(os.getenv("DUMP_CACHE_TTL", "86400"))
+
+KEY_PATTERN = re.compile(r"[0-9a-f]{40,64}-[0-9a-f]{16}")
+
+
+class DumpCache:
+    """Finished code dumps keyed by commit SHA and filter configuration.
+
+    Entries live on disk under ``directory`` and the most recently used
+    ones are also kept in memory. Both tiers are bounded by size and
+    entries older than ``ttl`` seconds are treated as missing. The methods
+    do blocking file I/O and are called from several threads through
+    ``asyncio.to_thread``, hence the lock around the memory tier.
+    """
+
+    def __init__(self, directory, memory_bytes, disk_bytes, ttl):
+        self.memory_bytes = memory_bytes
+        self.ttl = ttl
+        self.disk = DiskTier(directory, ".dump", disk_bytes, ttl)
+        self._memory = OrderedDict()
+        self._memory_size = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(commit_sha, filter_hash):
+        return f"{commit_sha}-{filter_hash[:16]}"
+
+    @staticmethod
+    def is_valid_key(key):
+        return bool(KEY_PATTERN.fullmatch(key))
+
+    @staticmethod
+    def commit_of(key):
+        return key.split("-", 1)[0]
+
+    def get(self, key):
+        if not self.is_valid_key(key):
+            return None
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                code_dump, stored_at = entry
+                if time.time() - stored_at < self.ttl:
+                    self._memory.move_to_end(key)
+                    return code_dump
+                self._forget(key)
+
+        path = self.disk.path(key)
+        try:
+            stored_at = os.path.getmtime(path)
+            if time.time() - stored_at >= self.ttl:
+                remove(path)
+                return None
+            with open(path, encoding="utf-8") as file:
+                code_dump = file.read()
+            self.disk.touch(path, stored_at)
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            self._remember(key, code_dump, stored_at)
+        return code_dump
+
+    def put(self, key, code_dump):
+        stored_at = time.time()
+        with self._lock:
+            self._remember(key, code_dump, stored_at)
+        try:
+            fd, temp_path = self.disk.create_temp()
+            with os.fdopen(fd, "w", encoding="utf-8") as file:
+                file.write(code_dump)
+            self.disk.install(temp_path, key)
+        except OSError as e:
+            logging.warning(f"Failed to write dump cache entry {key}: {str(e)}")
+
+    def open_writer(self, key):
+        """Returns a writer that stores a dump piece by piece without keeping
+        it in memory, or ``None`` if the cache directory is not writable."""
+        try:
+            return DumpCacheWriter(self, key)
+        except OSError as e:
+            logging.warning(f"Failed to open dump cache entry {key}: {str(e)}")
+            return None
+
+    def _remember(self, key, code_dump, stored_at):
+        """Called with the lock held, as is ``_forget``."""
+        size = len(code_dump)
+        if size > self.memory_bytes:
+            return
+        self._forget(key)
+        self._memory[key] = (code_dump, stored_at)
+        self._memory_size += size
+        while self._memory_size > self.memory_bytes:
+            self._forget(next(iter(self._memory)))
+
+    def _forget(self, key):
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self._memory_size -= len(entry[0])
+
+
+class DumpCacheWriter:
+    def __init__(self, cache, key):
+        self.cache = cache
+        self.key = key
+        fd, self.temp_path = cache.disk.create_temp()
+        self._file = os.fdopen(fd, "w", encoding="utf-8")
+        self.failed = False
+
+    def write(self, text):
+        if self.failed:
+            return
+        try:
+            self._file.write(text)
+        except OSError as e:
+            logging.warning(f"Failed to write dump cache entry {self.key}: {str(e)}")
+            self.abort()
+
+    def commit(self):
+        """Stores the dump written so far. Returns whether it was stored."""
+        if self.failed:
+            return False
+        try:
+            self._file.close()
+            self.cache.disk.install(self.temp_path, self.key)
+        except OSError as e:
+            logging.warning(f"Failed to write dump cache entry {self.key}: {str(e)}")
+            self.abort()
+            return False
+        return True
+
+    def abort(self):
+        self.failed = True
+        self._file.close()
+        remove(self.temp_path)
+
+
+dump_cache = DumpCache(
+    DUMP_CACHE_DIR, DUMP_CACHE_MEMORY_BYTES, DUMP_CACHE_DISK_BYTES, DUMP_CACHE_TTL
+)
@@ -0,0 +1,105 @@
+import hashlib
+
+FILE_SEPARATOR = "\n\n"
+
+
+def format_file(path, text):
+    return f"[FILE: {path}]\n\n{text}\n\n[END OF FILE: {path}]"
+
+
+def encoded_size(text):
+    """UTF-8 size of ``text``, counted without encoding ASCII text."""
+    if text.isascii():
+        return len(text)
+    return len(text.encode("utf-8", errors="surrogatepass"))
+
+
+def describe_dump(code_dump):
+    encoded = code_dump.encode("utf-8", errors="surrogatepass")
+    return {
+        "dump_size": len(encoded),
+        "dump_sha256": hashlib.sha256(encoded).hexdigest(),
+    }
+
+
+def parse_dump(code_dump):
+    """Splits a code dump back into ``(path, text)`` pairs in dump order."""
+    files = []
+    position = 0
+    while True:
+        start = code_dump.find("[FILE: ", position)
+        if start == -1:
+            break
+        header_end = code_dump.find("]\n\n", start)
+        if header_end == -1:
+            break
+        path = code_dump[start + len("[FILE: ") : header_end]
+        footer = f"\n\n[END OF FILE: {path}]"
+        end = code_dump.find(footer, header_end + 3)
+        if end == -1:
+            break
+        files.append((path, code_dump[header_end + 3 : end]))
+        position = end + len(footer)
+    return files
+
+
+class DumpChunker:
+    """Cuts a dump into fixed-size chunks as file sections are added.
+
+    Concatenating the chunks gives the same text as a non-streamed dump,
+    and a running SHA-256 over their UTF-8 encoding is kept for the final
+    manifest.
+    """
+
+    def __init__(self, chunk_size):
+        self.chunk_size = chunk_size
+        self.files = []
+        self.sequence = 0
+        self.total_bytes = 0
+        self._digest = hashlib.sha256()
+        self._buffer = []
+        self._buffered = 0
+
+    def add(self, path, section):
+        if self.files:
+            self._buffer.append(FILE_SEPARATOR)
+            self._buffered += len(FILE_SEPARATOR)
+        self.files.append(path)
+        self._buffer.append(section)
+        self._buffered += len(section)
+        if self._buffered < self.chunk_size:
+            return []
+
+        text = "".join(self._buffer)
+        chunks = []
+        start = 0
+        while len(text) - start >= self.chunk_size:
+            chunks.append(self._emit(text[start : start + self.chunk_size]))
+            start += self.chunk_size
+        self._buffer = [text[start:]]
+        self._buffered = len(text) - start
+        return chunks
+
+    def flush(self):
+        if not self._buffered:
+            return []
+        text = "".join(self._buffer)
+        self._buffer = []
+        self._buffered = 0
+        return [self._emit(text)]
+
+    def manifest(self):
+        return {
+            "files": self.files,
+            "total_bytes": self.total_bytes,
+            "chunk_count": self.sequence,
+            "sha256": self._digest.hexdigest(),
+        }
+
+    def _emit(self, chunk):
+        encoded = chunk.encode("utf-8", errors="surrogatepass")
+        self._digest.update(encoded)
+        self.total_bytes += len(encoded)
+        sequence = self.sequence
+        self.sequence += 1
+        return sequence, chunk
@@ -0,0 +1,97 @@
+import hashlib
+import math
+import re
+from .analysis import estimate_tokens
+from .content_sniff import is_generated, is_minified
+from .dump_format import FILE_SEPARATOR, format_file, parse_dump
+from .reference_index import ReferenceIndex
+
+# Bumped whenever the scoring changes, so shaped dumps are rebuilt.
+SHAPING_VERSION = 3
+
+PATH_WEIGHTS = [
+    (re.compile(r"\.min\.(js|css)$|[.-]bundle\.js$"), 0.05),
+    (re.compile(r"_pb2(_grpc)?\.pyi?$|\.pb\.go$|\.g\.dart$|\.generated\.\w+$"), 0.1),
+    (
+        re.compile(
+            r"(^|/)(changelog|changes|history|news|license|licence|authors|"
+            r"contributors|code_of_conduct|security)(\.\w+)?$",
+            re.IGNORECASE,
+        ),
+        0.1,
+    ),
+    (re.compile(r"(^|/)migrations/"), 0.4),
+    (
+        re.compile(
+            r"(^|/)(tests?|specs?|__tests__|testdata|fixtures|__snapshots__|e2e)/"
+            r"|(^|/)test_[^/]+$|_test\.\w+$|\.(test|spec)\.\w+$"
+        ),
+        0.5,
+    ),
+    (re.compile(r"(^|/)(docs?|examples?|samples?|benchmarks?)/"), 0.6),
+    (re.compile(r"^readme(\.\w+)?$", re.IGNORECASE), 3.0),
+    (
+        re.compile(r"(^|/)(main|app|server|index|cli|__main__|manage|setup)\.\w+$"),
+        1.5,
+    ),
+]
+
+
+def shaping_hash(dump_id, token_budget, part="dump"):
+    """Cache key component of the dump ``dump_id`` shaped to ``token_budget``."""
+    return hashlib.sha256(
+        f"{dump_id}:{SHAPING_VERSION}:{token_budget}:{part}".encode()
+    ).hexdigest()
+
+
+def score_file(path, text, referenced_by):
+    """Relevance of a file, higher is better, before its size is considered."""
+    score = 1.0
+    for pattern, weight in PATH_WEIGHTS:
+        if pattern.search(path):
+            score *= weight
+    score /= 1 + 0.1 * path.count("/")
+
+    if is_generated(text):
+        score *= 0.1
+    if is_minified(text):
+        score *= 0.05
+    return score * (1 + math.log2(1 + referenced_by))
+
+
+def shape_dump(code_dump, token_budget):
+    """Fits a dump into ``token_budget`` estimated tokens.
+
+    Files are ranked by ``score_file``, favouring smaller files among
+    equally relevant ones, and taken while they fit. Exact duplicates keep
+    only their best ranked copy. Kept files stay in dump order. Returns
+    ``(shaped_dump, omitted_paths)``.
+    """
+    files = parse_dump(code_dump)
+    index = ReferenceIndex(files)
+    costs = {
+        path: estimate_tokens(format_file(path, text) + FILE_SEPARATOR)
+        for path, text in files
+    }
+    priorities = {
+        path: score_file(path, text, len(index.referenced_by[path]))
+        / (1 + math.log2(1 + costs[path] / 1000))
+        for path, text in files
+    }
+
+    kept = set()
+    seen = set()
+    remaining = token_budget
+    for path, text in sorted(files, key=lambda file: (-priorities[file[0]], file[0])):
+        digest = hashlib.sha1(text.encode("utf-8", errors="surrogatepass")).digest()
+        if digest in seen or costs[path] > remaining:
+            continue
+        seen.add(digest)
+        kept.add(path)
+        remaining -= costs[path]
+
+    shaped = FILE_SEPARATOR.join(
+        format_file(path, text) for path, text in files if path in kept
+    )
+    omitted = [path for path, _ in files if path not in kept]
+    return shaped, omitted
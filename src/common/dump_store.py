@@ -0,0 +1,47 @@
+import asyncio
+from contextlib import asynccontextmanager
+from .dump_cache import dump_cache
+from .exceptions import DumpNotFoundError
+
+
+class DumpStore:
+    """Resolves dump IDs returned by DumpSourceCode to the dump text.
+
+    Dumps are read from the dump cache and decoded once. Sharing happens
+    within a worker: concurrent analyses of the same dump hold a reference
+    to that copy, which is dropped when the last one releases it. Workers
+    of the multi-process mode each read their own copy.
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+        self._open = {}
+
+    @asynccontextmanager
+    async def resolve(self, dump_id, code_dump=""):
+        if not dump_id:
+            yield code_dump
+            return
+
+        entry = self._open.get(dump_id)
+        if entry is None:
+            entry = {
+                "text": asyncio.ensure_future(
+                    asyncio.to_thread(self.cache.get, dump_id)
+                ),
+                "refs": 0,
+            }
+            self._open[dump_id] = entry
+        entry["refs"] += 1
+        try:
+            text = await asyncio.shield(entry["text"])
+            if text is None:
+                raise DumpNotFoundError(f"Dump {dump_id} not found")
+            yield text
+        finally:
+            entry["refs"] -= 1
+            if not entry["refs"]:
+                del self._open[dump_id]
+
+
+dump_store = DumpStore(dump_cache)
@@ -24,3 +24,19 @@ class GitHubNetworkError(GitHubError):
 
 class GitHubUnexpectedError(GitHubError):
     """Raised for unexpected errors"""
+
+
+class DumpNotFoundError(Exception):
+    """Raised when a referenced code dump is not in the dump store"""
+
+
+class AdmissionRejectedError(Exception):
+    """Raised when a job is rejected because its RPC queue is full"""
+
+
+class DeadlineReachedError(Exception):
+    """Raised when a job runs out of time before its deadline"""
+
+
+class ContentRejectedError(Exception):
+    """Raised when a file is left out of a dump because of its size or content"""
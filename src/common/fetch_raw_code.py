@@ -1,10 +1,45 @@
 import logging
+from .content_sniff import SNIFF_BYTES, sniff
+from .exceptions import ContentRejectedError
+from .github_client import GITHUB_REQUESTS
+from .jobs import current_rpc
 
+READ_CHUNK_BYTES = 64 * 1024
 
-async def fetch_raw_code(session, url):
-    async with session.get(url) as response:
-        if response.status == 200:
-            return await response.read()
-        else:
+
+async def fetch_raw_code(session, url, headers=None, max_bytes=0, missing_ok=False):
+    """Streams the file at ``url``, or returns None when it cannot be fetched,
+    logging why unless ``missing_ok`` and the file does not exist.
+
+    Raises ContentRejectedError once the file is known to exceed
+    ``max_bytes``, or when its first block fails ``sniff``, without reading
+    the rest of it.
+    """
+    async with session.get(url, headers=headers) as response:
+        GITHUB_REQUESTS.inc(rpc=current_rpc(), endpoint="raw", status=response.status)
+        if response.status == 404 and missing_ok:
+            return None
+        if response.status != 200:
             logging.error(f"Failed to fetch {url}. Status: {response.status}")
             return None
+        if max_bytes and (response.content_length or 0) > max_bytes:
+            raise ContentRejectedError("too_large")
+
+        content = bytearray()
+        sniffed = False
+        async for chunk in response.content.iter_chunked(READ_CHUNK_BYTES):
+            content += chunk
+            if max_bytes and len(content) > max_bytes:
+                raise ContentRejectedError("too_large")
+            if not sniffed and len(content) >= SNIFF_BYTES:
+                _check(content[:SNIFF_BYTES])
+                sniffed = True
+        if not sniffed:
+            _check(content)
+        return bytes(content)
+
+
+def _check(head):
+    reason = sniff(bytes(head))
+    if reason:
+        raise ContentRejectedError(reason)
@@ -1,6 +1,15 @@
 import aiohttp
 import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from urllib.parse import quote, urlsplit
+from . import metrics
+from .http_pool import get_session
+from .jobs import current_rpc
+from .rate_limit import GITHUB_RATE_LIMIT_RETRIES, rate_limit_governor
 from .exceptions import (
+    GitHubError,
     GitHubAuthenticationError,
     GitHubRateLimitError,
     GitHubNotFoundError,
@@ -8,13 +17,31 @@ from .exceptions import (
     GitHubNetworkError,
     GitHubUnexpectedError,
 )
+from dotenv import load_dotenv
+
+load_dotenv()
+
+GITHUB_API_URL = os.getenv("GITHUB_API_URL", "https://api.github.com")
+GITHUB_RAW_URL = os.getenv("GITHUB_RAW_URL", "https://raw.githubusercontent.com")
+
+GITHUB_REQUESTS = metrics.registry.counter(
+    "hypnos_github_requests_total",
+    "GitHub requests by RPC, endpoint and response status.",
+    ["rpc", "endpoint", "status"],
+)
+GITHUB_REQUEST_DURATION = metrics.registry.histogram(
+    "hypnos_github_request_duration_seconds",
+    "Time until GitHub responds, by endpoint.",
+    ["endpoint"],
+)
 
 
 class GitHubClient:
-    def __init__(self, token):
+    def __init__(self, token, session=None):
         self.token = token
-        self.base_url = "https://api.github.com"
-        self.session = None
+        self.base_url = GITHUB_API_URL.rstrip("/")
+        self.raw_base_url = GITHUB_RAW_URL.rstrip("/")
+        self.session = session
 
     async def __aenter__(self):
         await self.open()
@@ -25,41 +52,108 @@ class GitHubClient:
 
     async def open(self):
         if self.session is None:
-            self.session = aiohttp.ClientSession()
+            self.session = get_session()
 
     async def close(self):
-        if self.session:
-            await self.session.close()
-            self.session = None
+        self.session = None
 
     async def get_repository(self, repo_id):
         return await self._make_request(f"{self.base_url}/repositories/{repo_id}")
 
-    async def get_repository_contents(self, repo_full_name, path=""):
+    async def get_repository_contents(self, repo_full_name, path="", ref=None):
+        url = f"{self.base_url}/repos/{repo_full_name}/contents/{path}"
+        if ref:
+            url += f"?ref={ref}"
+        return await self._make_request(url)
+
+    async def get_branch(self, repo_full_name, branch):
+        return await self._make_request(
+            f"{self.base_url}/repos/{repo_full_name}/branches/{quote(branch)}"
+        )
+
+    async def get_tree(self, repo_full_name, tree_sha, recursive=False):
+        url = f"{self.base_url}/repos/{repo_full_name}/git/trees/{tree_sha}"
+        if recursive:
+            url += "?recursive=1"
+        return await self._make_request(url)
+
+    async def compare_commits(self, repo_full_name, base, head):
+        return await self._make_request(
+            f"{self.base_url}/repos/{repo_full_name}/compare/{base}...{head}"
+        )
+
+    async def get_pull_request(self, repo_full_name, number):
         return await self._make_request(
-            f"{self.base_url}/repos/{repo_full_name}/contents/{path}"
+            f"{self.base_url}/repos/{repo_full_name}/pulls/{number}"
         )
 
+    async def get_pull_request_files(self, repo_full_name, number, per_page=100):
+        """Lists every file changed by a pull request, following pagination."""
+        files = []
+        page = 1
+        while True:
+            batch = await self._make_request(
+                f"{self.base_url}/repos/{repo_full_name}/pulls/{number}/files"
+                f"?per_page={per_page}&page={page}"
+            )
+            files.extend(batch)
+            if len(batch) < per_page:
+                return files
+            page += 1
+
+    async def list_pull_requests(self, repo_full_name, etag=None):
+        """Lists open pull requests, most recently updated first.
+
+        Sends ``etag`` as If-None-Match, so an unchanged listing costs no
+        rate limit. Returns ``(pulls, etag, poll_interval)`` where ``pulls``
+        is None when the listing did not change.
+        """
+        data, headers = await self._fetch(
+            f"{self.base_url}/repos/{repo_full_name}/pulls"
+            "?state=open&sort=updated&direction=desc&per_page=100",
+            {"If-None-Match": etag} if etag else None,
+        )
+        poll_interval = int(headers.get("X-Poll-Interval", "0"))
+        return data, headers.get("ETag", etag), poll_interval
+
+    def get_raw_url(self, repo_full_name, ref, path):
+        return f"{self.raw_base_url}/{repo_full_name}/{ref}/{quote(path)}"
+
+    def get_raw_headers(self):
+        return {"Authorization": f"token {self.token}"}
+
+    async def stream_repository_tarball(self, repo_full_name, ref, chunk_size=65536):
+        if not self.session:
+            await self.open()
+
+        url = f"{self.base_url}/repos/{repo_full_name}/tarball/{ref}"
+        try:
+            async with self._request(url) as response:
+                self._check_status(response)
+                async for chunk in response.content.iter_chunked(chunk_size):
+                    yield chunk
+        except aiohttp.ClientError as e:
+            logging.error(
+                f"Network error while streaming tarball: {str(e)}", exc_info=True
+            )
+            raise GitHubNetworkError(f"Network error: {str(e)}")
+
     async def _make_request(self, url):
+        data, _ = await self._fetch(url)
+        return data
+
+    async def _fetch(self, url, headers=None):
         if not self.session:
             await self.open()
 
-        headers = {
-            "Authorization": f"token {self.token}",
-            "Accept": "application/vnd.github.v3+json",
-        }
         try:
-            async with self.session.get(url, headers=headers) as response:
-                if response.status == 200:
-                    return await response.json()
-                elif response.status == 401:
-                    raise GitHubAuthenticationError("Invalid GitHub token")
-                elif response.status == 403:
-                    raise GitHubRateLimitError("GitHub API rate limit exceeded")
-                elif response.status == 404:
-                    raise GitHubNotFoundError("Resource not found")
-                else:
-                    raise GitHubAPIError(f"GitHub API error: {response.status}")
+            async with self._request(url, headers) as response:
+                if response.status == 304:
+                    return None, response.headers
+                self._check_status(response)
+                return await response.json(), response.headers
+        except GitHubError:
+            raise
         except aiohttp.ClientError as e:
             logging.error(
                 f"Network error while accessing GitHub API: {str(e)}", exc_info=True
@@ -70,3 +164,82 @@ class GitHubClient:
                 f"Unexpected error while accessing GitHub API: {str(e)}", exc_info=True
             )
             raise GitHubUnexpectedError(f"Unexpected error: {str(e)}")
+
+    @asynccontextmanager
+    async def _request(self, url, headers=None):
+        """Sends a GET through the rate limit governor.
+
+        Rate limited responses are retried once the governor allows it, up
+        to GITHUB_RATE_LIMIT_RETRIES times.
+        """
+        attempt = 0
+        endpoint = self._endpoint(url)
+        while True:
+            await rate_limit_governor.acquire(self.token)
+            started = time.monotonic()
+            responded = False
+            try:
+                async with self.session.get(
+                    url, headers={**self._headers(), **(headers or {})}
+                ) as response:
+                    responded = True
+                    GITHUB_REQUEST_DURATION.observe(
+                        time.monotonic() - started, endpoint=endpoint
+                    )
+                    GITHUB_REQUESTS.inc(
+                        rpc=current_rpc(), endpoint=endpoint, status=response.status
+                    )
+                    body = (
+                        await response.text() if response.status in (403, 429) else ""
+                    )
+                    retry_delay = rate_limit_governor.observe(
+                        self.token, response.status, response.headers, body
+                    )
+                    if retry_delay is None or attempt >= GITHUB_RATE_LIMIT_RETRIES:
+                        yield response
+                        return
+            except aiohttp.ClientError:
+                if not responded:
+                    GITHUB_REQUESTS.inc(
+                        rpc=current_rpc(), endpoint=endpoint, status="network_error"
+                    )
+                raise
+            attempt += 1
+            logging.warning(
+                f"GitHub rate limit hit, retrying in {retry_delay:.1f}s "
+                f"(attempt {attempt} of {GITHUB_RATE_LIMIT_RETRIES})"
+            )
+
+    def _endpoint(self, url):
+        """Names the API endpoint of ``url`` for metrics, e.g. "tree"."""
+        path = urlsplit(url).path[len(urlsplit(self.base_url).path) :]
+        parts = path.strip("/").split("/")
+        if parts[0] == "repositories":
+            return "repository"
+        if parts[0] != "repos" or len(parts) < 4:
+            return "other"
+        kind = parts[3:]
+        if kind[0] == "git" and len(kind) > 1:
+            return kind[1]
+        if kind[0] == "pulls":
+            return ("pulls", "pull", "pull_files")[min(len(kind), 3) - 1]
+        return kind[0]
+
+    def _headers(self):
+        return {
+            "Authorization": f"token {self.token}",
+            "Accept": "application/vnd.github.v3+json",
+        }
+
+    @staticmethod
+    def _check_status(response):
+        if response.status == 200:
+            return
+        elif response.status == 401:
+            raise GitHubAuthenticationError("Invalid GitHub token")
+        elif response.status in (403, 429):
+            raise GitHubRateLimitError("GitHub API rate limit exceeded")
+        elif response.status == 404:
+            raise GitHubNotFoundError("Resource not found")
+        else:
+            raise GitHubAPIError(f"GitHub API error: {response.status}")
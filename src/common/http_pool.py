@@ -0,0 +1,36 @@
+import aiohttp
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+HTTP_POOL_MAX_CONNECTIONS = int(os.getenv("HTTP_POOL_MAX_CONNECTIONS", "100"))
+HTTP_POOL_MAX_CONNECTIONS_PER_HOST = int(
+    os.getenv("HTTP_POOL_MAX_CONNECTIONS_PER_HOST", "32")
+)
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "30"))
+
+_session = None
+
+
+def get_session():
+    """Returns the process-wide keep-alive session, creating it on first use."""
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=HTTP_POOL_MAX_CONNECTIONS,
+            limit_per_host=HTTP_POOL_MAX_CONNECTIONS_PER_HOST,
+            keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+        )
+        _session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=60),
+        )
+    return _session
+
+
+async def close_session():
+    global _session
+    if _session is not None:
+        await _session.close()
+        _session = None
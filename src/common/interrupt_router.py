@@ -0,0 +1,95 @@
+import asyncio
+import logging
+import os
+import threading
+import uuid
+from dotenv import load_dotenv
+from .jobs import job_registry
+
+load_dotenv()
+
+WORKER_INTERRUPT_TIMEOUT = float(os.getenv("WORKER_INTERRUPT_TIMEOUT", "2"))
+
+
+class InterruptRouter:
+    """Forwards interrupts between the workers of the multi-process mode.
+
+    Jobs are registered in the worker that runs them, while an
+    InterruptProcess call may reach any worker. Each worker reads its own
+    inbox, a queue created by the supervisor, from a thread. An interrupt
+    for a job a worker does not know is sent to every other inbox, and the
+    call succeeds as soon as one worker replies that it interrupted the
+    job. Workers that do not reply within WORKER_INTERRUPT_TIMEOUT, such as
+    one being restarted, count as not running it.
+    """
+
+    def __init__(self, timeout):
+        self.timeout = timeout
+        self.worker_index = None
+        self.inboxes = None
+        self.loop = None
+        self.reader = None
+        self.pending = {}
+
+    def start(self, worker_index, inboxes):
+        self.worker_index = worker_index
+        self.inboxes = inboxes
+        self.loop = asyncio.get_running_loop()
+        self.reader = threading.Thread(
+            target=self._read, name="interrupt-router", daemon=True
+        )
+        self.reader.start()
+
+    async def stop(self):
+        if self.reader is None:
+            return
+        self.inboxes[self.worker_index].put(None)
+        await asyncio.to_thread(self.reader.join)
+        self.reader = None
+
+    async def interrupt(self, id_work):
+        """Interrupts ``id_work`` in another worker. Returns whether one of
+        them was running it, always False outside the multi-process mode."""
+        if self.reader is None or len(self.inboxes) < 2:
+            return False
+        request_id = uuid.uuid4().hex
+        future = self.loop.create_future()
+        self.pending[request_id] = [future, len(self.inboxes) - 1]
+        try:
+            for worker_index, inbox in enumerate(self.inboxes):
+                if worker_index != self.worker_index:
+                    inbox.put(("interrupt", request_id, self.worker_index, id_work))
+            return await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            del self.pending[request_id]
+
+    def _read(self):
+        inbox = self.inboxes[self.worker_index]
+        while True:
+            message = inbox.get()
+            if message is None:
+                return
+            self.loop.call_soon_threadsafe(self._handle, message)
+
+    def _handle(self, message):
+        if message[0] == "interrupt":
+            _, request_id, sender, id_work = message
+            job = job_registry.get(id_work)
+            if job is not None:
+                logging.info(f"Interrupting {id_work} for worker-{sender}")
+                job.interrupt()
+            self.inboxes[sender].put(("reply", request_id, job is not None))
+            return
+
+        _, request_id, found = message
+        entry = self.pending.get(request_id)
+        if entry is None or entry[0].done():
+            return
+        entry[1] -= 1
+        if found or not entry[1]:
+            entry[0].set_result(found)
+
+
+interrupt_router = InterruptRouter(WORKER_INTERRUPT_TIMEOUT)
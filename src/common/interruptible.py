@@ -1,16 +1,77 @@
 import asyncio
+from .exceptions import DeadlineReachedError
+from .jobs import current_job, time_remaining
 
 
 class Interruptible:
-    def __init__(self):
-        self._interrupt_event = asyncio.Event()
+    """Interrupt checkpoints for services, scoped to the job being run.
 
-    def interrupt(self):
-        self._interrupt_event.set()
+    A service instance is shared by every job of its kind, so the interrupt
+    state lives in the ``JobContext`` of the calling task instead of the
+    service. Code running outside a job is never interrupted.
+    """
 
     async def is_interrupted(self):
-        return self._interrupt_event.is_set()
+        job = current_job.get()
+        return job is not None and job.interrupted.is_set()
 
     async def check_interruption(self):
         if await self.is_interrupted():
             raise InterruptedError("process interrupted")
+
+    async def iterate_interruptible(self, iterator):
+        """Yields from an async iterator until it ends or the job is interrupted.
+
+        The pending step is cancelled as soon as the interrupt arrives, so a
+        streaming upstream request is abandoned immediately rather than at
+        the next checkpoint.
+        """
+        iterator = iterator.__aiter__()
+        job = current_job.get()
+        interrupted = asyncio.ensure_future(
+            job.interrupted.wait() if job is not None else asyncio.Future()
+        )
+        step = None
+        try:
+            while True:
+                step = asyncio.ensure_future(iterator.__anext__())
+                done, _ = await asyncio.wait(
+                    {step, interrupted}, return_when=asyncio.FIRST_COMPLETED
+                )
+                if step not in done:
+                    raise InterruptedError("process interrupted")
+                try:
+                    item = step.result()
+                except StopAsyncIteration:
+                    return
+                yield item
+        finally:
+            interrupted.cancel()
+            if step is not None and not step.done():
+                step.cancel()
+                await asyncio.gather(step, return_exceptions=True)
+            if hasattr(iterator, "aclose"):
+                await iterator.aclose()
+
+    async def iterate_until_deadline(self, iterator):
+        """Yields from an async iterator until it ends or the job's deadline.
+
+        Raises DeadlineReachedError once the time is up, after closing the
+        iterator, so callers can wrap up with what they got so far.
+        """
+        iterator = iterator.__aiter__()
+        try:
+            while True:
+                remaining = time_remaining()
+                if remaining is not None and remaining <= 0:
+                    raise DeadlineReachedError("deadline reached")
+                try:
+                    item = await asyncio.wait_for(iterator.__anext__(), remaining)
+                except StopAsyncIteration:
+                    return
+                except asyncio.TimeoutError:
+                    raise DeadlineReachedError("deadline reached")
+                yield item
+        finally:
+            if hasattr(iterator, "aclose"):
+                await iterator.aclose()
@@ -0,0 +1,212 @@
+import asyncio
+import contextvars
+import logging
+import os
+import time
+from contextlib import contextmanager
+from dotenv import load_dotenv
+from . import metrics
+
+load_dotenv()
+
+JOB_QUEUE_SIZE = 16
+DEADLINE_RESERVE = float(os.getenv("DEADLINE_RESERVE", "1"))
+
+current_job = contextvars.ContextVar("current_job", default=None)
+
+JOBS = metrics.registry.counter(
+    "hypnos_jobs_total",
+    "Jobs by RPC and outcome: completed, error, interrupted or cancelled.",
+    ["rpc", "status"],
+)
+JOB_DURATION = metrics.registry.histogram(
+    "hypnos_job_duration_seconds",
+    "Duration of jobs by RPC and outcome, queueing included.",
+    ["rpc", "status"],
+)
+QUEUE_WAIT = metrics.registry.histogram(
+    "hypnos_queue_wait_seconds",
+    "Time jobs waited for admission.",
+    ["rpc"],
+)
+STAGE_DURATION = metrics.registry.histogram(
+    "hypnos_stage_duration_seconds",
+    "Duration of the stages of jobs.",
+    ["rpc", "stage"],
+)
+
+
+class JobContext:
+    """State of one ``id_work``, visible to the code it runs via ``current_job``."""
+
+    def __init__(self, id_work, rpc, timeout=None):
+        self.id_work = id_work
+        self.rpc = rpc
+        self.interrupted = asyncio.Event()
+        self.started_at = time.monotonic()
+        self.deadline = None if timeout is None else self.started_at + timeout
+        self.task = None
+        self.stages = {}
+
+    def interrupt(self):
+        self.interrupted.set()
+        if self.task is not None:
+            self.task.cancel()
+
+    def extend_deadline(self, deadline):
+        """Pushes the deadline back to ``deadline``, None meaning none."""
+        if self.deadline is not None:
+            self.deadline = None if deadline is None else max(self.deadline, deadline)
+
+
+def current_rpc():
+    """The RPC of the current job, "none" outside jobs."""
+    job = current_job.get()
+    return job.rpc if job is not None else "none"
+
+
+@contextmanager
+def stage(name):
+    """Times a stage of the current job.
+
+    The duration is added to the job's ``stages``, observed in
+    hypnos_stage_duration_seconds and recorded as a trace span.
+    """
+    job = current_job.get()
+    rpc = current_rpc()
+    current = metrics.start_span(
+        name, rpc=rpc, id_work=job.id_work if job is not None else None
+    )
+    started = time.monotonic()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        duration = time.monotonic() - started
+        STAGE_DURATION.observe(duration, rpc=rpc, stage=name)
+        if job is not None:
+            job.stages[name] = job.stages.get(name, 0) + duration
+        metrics.end_span(current, error if isinstance(error, Exception) else None)
+
+
+def time_remaining():
+    """Seconds left until the deadline of the current job, minus the
+    DEADLINE_RESERVE kept for sending the final response. None when the
+    job has no deadline."""
+    job = current_job.get()
+    if job is None or job.deadline is None:
+        return None
+    return job.deadline - DEADLINE_RESERVE - time.monotonic()
+
+
+class JobRegistry:
+    """Runs every job in its own task, registered under its ``id_work``.
+
+    Interrupting a job cancels its task, so downloads and model calls in
+    flight are abandoned at once and their connections released. Other jobs,
+    including later ones of the same kind, are unaffected.
+    """
+
+    def __init__(self):
+        self.jobs = {}
+
+    def get(self, id_work):
+        return self.jobs.get(id_work)
+
+    async def run(self, id_work, rpc, messages, fields, ticket=None, timeout=None):
+        """Yields the messages of ``messages`` produced by the job's task.
+
+        While the admission ``ticket`` waits, "queued" messages carry the
+        job's position. An "interrupted" message is yielded last when the
+        job is interrupted. Both are built from ``fields``. Leaving before
+        the job ends cancels it. ``timeout`` is the time left before the
+        deadline of the RPC, if it has one.
+        """
+        job = JobContext(id_work, rpc, timeout)
+        queue = asyncio.Queue(JOB_QUEUE_SIZE)
+
+        async def produce():
+            current_job.set(job)
+            with metrics.span(rpc, rpc=rpc, id_work=id_work):
+                try:
+                    if ticket is not None:
+                        async for position in ticket.wait():
+                            await queue.put(
+                                {
+                                    **fields,
+                                    "process_status": "queued",
+                                    "queue_position": position,
+                                }
+                            )
+                    QUEUE_WAIT.observe(time.monotonic() - job.started_at, rpc=rpc)
+                    async for message in messages:
+                        await queue.put(message)
+                finally:
+                    if ticket is not None:
+                        ticket.release()
+
+        job.task = asyncio.create_task(produce())
+        if id_work in self.jobs:
+            logging.warning(f"Job {id_work} is already running, replacing its entry")
+        self.jobs[id_work] = job
+        getter = None
+        status = "cancelled"
+        failed = False
+        try:
+            while True:
+                getter = asyncio.ensure_future(queue.get())
+                await asyncio.wait(
+                    {getter, job.task}, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not getter.done():
+                    break
+                message = getter.result()
+                failed = failed or message.get("process_status") == "error"
+                yield message
+
+            while not queue.empty():
+                message = queue.get_nowait()
+                failed = failed or message.get("process_status") == "error"
+                yield message
+            if job.task.cancelled():
+                if job.interrupted.is_set():
+                    status = "interrupted"
+                    yield {**fields, "process_status": "interrupted"}
+                    return
+                raise asyncio.CancelledError()
+            job.task.result()
+            status = "error" if failed else "completed"
+        except Exception:
+            status = "error"
+            raise
+        finally:
+            if getter is not None:
+                getter.cancel()
+            if not job.task.done():
+                job.task.cancel()
+                await asyncio.gather(job.task, return_exceptions=True)
+            # The task may have been cancelled before it ever ran.
+            if ticket is not None:
+                ticket.release()
+            if self.jobs.get(id_work) is job:
+                del self.jobs[id_work]
+            self._record(job, status)
+
+    @staticmethod
+    def _record(job, status):
+        duration = time.monotonic() - job.started_at
+        JOBS.inc(rpc=job.rpc, status=status)
+        JOB_DURATION.observe(duration, rpc=job.rpc, status=status)
+        stages = ", ".join(
+            f"{name} {seconds:.2f}s" for name, seconds in job.stages.items()
+        )
+        logging.info(
+            f"{job.rpc} job {job.id_work} {status} in {duration:.2f}s"
+            + (f" ({stages})" if stages else "")
+        )
+
+
+job_registry = JobRegistry()
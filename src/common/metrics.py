@@ -0,0 +1,219 @@
+import bisect
+import logging
+import os
+from contextlib import contextmanager
+from aiohttp import web
+from dotenv import load_dotenv
+
+try:
+    from opentelemetry import trace
+except ImportError:
+    trace = None
+
+load_dotenv()
+
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+DURATION_BUCKETS = (
+    0.005,
+    0.01,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+    60,
+    120,
+    300,
+    600,
+)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Metric:
+    def __init__(self, name, description, labels=()):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self.values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels.get(label, "")) for label in self.labels)
+
+    def _format_labels(self, key, extra=()):
+        pairs = list(zip(self.labels, key)) + list(extra)
+        if not pairs:
+            return ""
+        return (
+            "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+        )
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        for key, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{self._format_labels(key)} {value}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        self.values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, description, labels=(), buckets=DURATION_BUCKETS):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        series = self.values.get(key)
+        if series is None:
+            series = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        for key, (counts, total, count) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                labels = self._format_labels(key, [("le", bound)])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = self._format_labels(key)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Process-wide metrics, rendered in the Prometheus text format.
+
+    Labels are kept to bounded values such as the RPC or the stage. Per-job
+    identifiers like ``id_work`` go to trace spans and logs instead.
+    """
+
+    def __init__(self):
+        self.metrics = {}
+
+    def counter(self, name, description, labels=()):
+        return self._register(Counter(name, description, labels))
+
+    def gauge(self, name, description, labels=()):
+        return self._register(Gauge(name, description, labels))
+
+    def histogram(self, name, description, labels=(), buckets=DURATION_BUCKETS):
+        return self._register(Histogram(name, description, labels, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def _register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+
+class MetricsServer:
+    """Serves the registry on ``/metrics`` when a port is configured."""
+
+    def __init__(self, registry, host, port):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.runner = None
+
+    async def start(self, port_offset=0):
+        if not self.port:
+            return
+        app = web.Application()
+        app.router.add_get("/metrics", self.handle_metrics)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        port = self.port + port_offset
+        await web.TCPSite(self.runner, self.host, port).start()
+        logging.info(f"metrics listening at http://{self.host}:{port}/metrics")
+
+    async def stop(self):
+        if self.runner:
+            await self.runner.cleanup()
+            self.runner = None
+
+    async def handle_metrics(self, request):
+        return web.Response(
+            body=self.registry.render().encode(),
+            headers={"Content-Type": CONTENT_TYPE},
+        )
+
+
+@contextmanager
+def span(name, **attributes):
+    """Makes a trace span current for the block, when OpenTelemetry is
+    installed. Spans are only exported once an SDK is configured."""
+    if trace is None:
+        yield None
+        return
+    with trace.get_tracer(__name__).start_as_current_span(
+        name, attributes=_span_attributes(attributes)
+    ) as current:
+        yield current
+
+
+def start_span(name, **attributes):
+    """Starts a child span of the current one without making it current,
+    so it may be ended from another task. Returns None without OpenTelemetry."""
+    if trace is None:
+        return None
+    return trace.get_tracer(__name__).start_span(
+        name, attributes=_span_attributes(attributes)
+    )
+
+
+def end_span(current, error=None):
+    if current is None:
+        return
+    if error is not None:
+        current.record_exception(error)
+        current.set_status(trace.Status(trace.StatusCode.ERROR, str(error)))
+    current.end()
+
+
+def _span_attributes(attributes):
+    return {name: value for name, value in attributes.items() if value is not None}
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+registry = MetricsRegistry()
+metrics_server = MetricsServer(registry, METRICS_HOST, METRICS_PORT)
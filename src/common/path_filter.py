@@ -0,0 +1,169 @@
+import re
+
+LINGUIST_ATTRIBUTES = ("linguist-generated", "linguist-vendored")
+
+
+def compile_glob(pattern):
+    """Compiles a gitignore-style pattern into ``(regex, directory_only)``.
+
+    Patterns without a slash match names at any depth, others are anchored
+    at the root. ``**`` matches across directories and a trailing slash
+    restricts the pattern to directories.
+    """
+    directory_only = pattern.endswith("/")
+    pattern = pattern.rstrip("/")
+    anchored = "/" in pattern
+    pattern = pattern.lstrip("/")
+
+    parts = []
+    index = 0
+    while index < len(pattern):
+        if pattern.startswith("**/", index):
+            parts.append("(?:.*/)?")
+            index += 3
+        elif pattern.startswith("**", index):
+            parts.append(".*")
+            index += 2
+        elif pattern[index] == "*":
+            parts.append("[^/]*")
+            index += 1
+        elif pattern[index] == "?":
+            parts.append("[^/]")
+            index += 1
+        elif pattern[index] == "[" and "]" in pattern[index + 2 :]:
+            end = pattern.index("]", index + 2)
+            members = pattern[index + 1 : end]
+            if members.startswith("!"):
+                members = "^" + members[1:]
+            members = members.replace("\\", "\\\\")
+            parts.append(f"[{members}]")
+            index = end + 1
+        elif pattern[index] == "\\" and index + 1 < len(pattern):
+            parts.append(re.escape(pattern[index + 1]))
+            index += 2
+        else:
+            parts.append(re.escape(pattern[index]))
+            index += 1
+    prefix = "" if anchored else "(?:.*/)?"
+    return re.compile(prefix + "".join(parts)), directory_only
+
+
+def parse_rules(lines):
+    """Compiles gitignore-style lines into ``(regex, include, directory_only)``
+    rules. A pattern excludes the paths it matches, ``!pattern`` includes
+    them. Blank lines and ``#`` comments are ignored."""
+    rules = []
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        include = line.startswith("!")
+        if include:
+            line = line[1:]
+        regex, directory_only = compile_glob(line)
+        rules.append((regex, include, directory_only))
+    return rules
+
+
+def parse_gitattributes(text):
+    """Returns ``(regex, attributes)`` pairs for the lines of a
+    ``.gitattributes`` file that set or unset the linguist attributes."""
+    rules = []
+    for line in text.splitlines():
+        fields = line.split()
+        if not fields or fields[0].startswith(("#", "[attr]", '"')):
+            continue
+        attributes = {}
+        for field in fields[1:]:
+            name, _, value = field.lstrip("-!").partition("=")
+            if name in LINGUIST_ATTRIBUTES:
+                attributes[name] = not field.startswith(("-", "!")) and (
+                    value.lower() not in ("false", "0")
+                )
+        if attributes:
+            regex, _ = compile_glob(fields[0])
+            rules.append((regex, attributes))
+    return rules
+
+
+class PathFilter:
+    """Decides which files of a repository go into its dumps.
+
+    Files are kept by extension, looked up in a set, unless one of their
+    directories is skipped. ``rules`` are gitignore-style lines evaluated
+    before those defaults, the last matching one deciding, so ``!docs/``
+    brings back a skipped directory and ``*.md`` drops Markdown. With
+    ``use_gitattributes``, files the repository marks ``linguist-generated``
+    or ``linguist-vendored`` are dropped once ``load_gitattributes`` is
+    given its ``.gitattributes``.
+
+    Directory verdicts are cached, as every file of a directory shares them.
+    """
+
+    def __init__(self, extensions, skip_directories, rules=(), use_gitattributes=False):
+        self.extensions = frozenset(extension.lower() for extension in extensions)
+        self.skip_directories = frozenset(skip_directories)
+        self.rule_lines = tuple(rules)
+        self.rules = parse_rules(self.rule_lines)
+        self.use_gitattributes = use_gitattributes
+        self.attributes = []
+        self._directories = {}
+
+    @property
+    def key(self):
+        """Identifies the selection, for cache keys."""
+        return (
+            sorted(self.extensions),
+            sorted(self.skip_directories),
+            self.rule_lines,
+            self.use_gitattributes,
+        )
+
+    def load_gitattributes(self, text):
+        if self.use_gitattributes:
+            self.attributes = parse_gitattributes(text)
+
+    def include_file(self, path):
+        directory, _, name = path.rpartition("/")
+        if directory and self.skip_directory(directory):
+            return False
+        verdict = self._match(path, directory=False)
+        if verdict is not None:
+            return verdict
+        if self.attributes and self._is_linguist_excluded(path):
+            return False
+        return self.has_code_extension(name)
+
+    def skip_directory(self, directory):
+        skipped = self._directories.get(directory)
+        if skipped is None:
+            parent, _, name = directory.rpartition("/")
+            skipped = bool(parent) and self.skip_directory(parent)
+            if not skipped:
+                verdict = self._match(directory, directory=True)
+                skipped = (
+                    not verdict
+                    if verdict is not None
+                    else name in self.skip_directories
+                )
+            self._directories[directory] = skipped
+        return skipped
+
+    def has_code_extension(self, name):
+        dot = name.rfind(".")
+        return dot >= 0 and name[dot:].lower() in self.extensions
+
+    def _match(self, path, directory):
+        for regex, include, directory_only in reversed(self.rules):
+            if directory_only and not directory:
+                continue
+            if regex.fullmatch(path):
+                return include
+        return None
+
+    def _is_linguist_excluded(self, path):
+        state = {}
+        for regex, attributes in self.attributes:
+            if regex.fullmatch(path):
+                state.update(attributes)
+        return any(state.values())
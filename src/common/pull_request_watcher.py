@@ -0,0 +1,300 @@
+import asyncio
+import hashlib
+import heapq
+import hmac
+import itertools
+import json
+import logging
+import os
+import time
+from aiohttp import web
+from dotenv import load_dotenv
+from .exceptions import GitHubError, GitHubAuthenticationError, GitHubNotFoundError
+from .github_client import GitHubClient
+
+load_dotenv()
+
+WATCH_MIN_INTERVAL = float(os.getenv("WATCH_MIN_INTERVAL", "60"))
+WATCH_MAX_INTERVAL = float(os.getenv("WATCH_MAX_INTERVAL", "600"))
+WATCH_BACKOFF_FACTOR = float(os.getenv("WATCH_BACKOFF_FACTOR", "1.5"))
+WATCH_POLL_CONCURRENCY = int(os.getenv("WATCH_POLL_CONCURRENCY", "32"))
+WATCH_WEBHOOK_HOST = os.getenv("WATCH_WEBHOOK_HOST", "127.0.0.1")
+WATCH_WEBHOOK_PORT = int(os.getenv("WATCH_WEBHOOK_PORT", "0"))
+WATCH_WEBHOOK_SECRET = os.getenv("WATCH_WEBHOOK_SECRET", "")
+
+WEBHOOK_ACTIONS = {"opened", "reopened", "synchronize", "ready_for_review"}
+
+
+class Watch:
+    def __init__(self, id_repository, interval):
+        self.id_repository = id_repository
+        self.full_name = None
+        self.subscribers = {}
+        self.etag = None
+        self.heads = None
+        self.interval = interval
+        self.due = None
+
+
+class PullRequestWatcher:
+    """Watches the open pull requests of many repositories from one task.
+
+    Repositories wait in a heap ordered by their next poll time, so idle
+    watches cost nothing between polls. Polls are conditional requests, and
+    the interval of a repository grows while its pull requests stay
+    unchanged. Pull requests that are opened or receive new commits are
+    handed to every subscriber of their repository, whether they were seen
+    by a poll or delivered by the optional webhook receiver.
+    """
+
+    def __init__(
+        self,
+        min_interval,
+        max_interval,
+        backoff_factor,
+        poll_concurrency,
+        webhook_host,
+        webhook_port,
+        webhook_secret,
+    ):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff_factor = backoff_factor
+        self.poll_concurrency = poll_concurrency
+        self.webhook_host = webhook_host
+        self.webhook_port = webhook_port
+        self.webhook_secret = webhook_secret
+        self.watches = {}
+        self.schedule = []
+        self.sequence = itertools.count()
+        self.wakeup = None
+        self.scheduler = None
+        self.polls = set()
+        self.webhook_runner = None
+
+    async def start(self, webhook=True):
+        self._ensure_scheduler()
+        if not (webhook and self.webhook_port):
+            return
+        if not self.webhook_secret:
+            logging.error(
+                "Pull request webhook receiver disabled: WATCH_WEBHOOK_SECRET is not set"
+            )
+            return
+        app = web.Application()
+        app.router.add_post("/webhook", self.handle_webhook)
+        self.webhook_runner = web.AppRunner(app)
+        await self.webhook_runner.setup()
+        site = web.TCPSite(self.webhook_runner, self.webhook_host, self.webhook_port)
+        await site.start()
+        logging.info(
+            f"pull request webhook receiver listening at "
+            f"http://{self.webhook_host}:{self.webhook_port}/webhook"
+        )
+
+    async def stop(self):
+        tasks = list(self.polls)
+        if self.scheduler:
+            tasks.append(self.scheduler)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.scheduler = None
+        if self.webhook_runner:
+            await self.webhook_runner.cleanup()
+            self.webhook_runner = None
+
+    async def events(self, id_repository, github_token):
+        """Yields the pull requests of a repository as they open or change.
+
+        The token must be able to read the repository, which is checked
+        before subscribing. It is used to poll the repository for as long as
+        this subscriber is the first one still watching it. A subscriber
+        whose token stops working gets the error and is dropped, and the
+        next one's token is used.
+        """
+        async with GitHubClient(github_token) as github_client:
+            repo = await github_client.get_repository(id_repository)
+
+        queue = asyncio.Queue()
+        watch = self.watches.get(id_repository)
+        if watch is None:
+            watch = Watch(id_repository, self.min_interval)
+            watch.full_name = repo["full_name"]
+            self.watches[id_repository] = watch
+            self._schedule(watch, 0)
+        watch.subscribers[queue] = github_token
+        self._ensure_scheduler()
+        try:
+            while True:
+                event = await queue.get()
+                if isinstance(event, Exception):
+                    raise event
+                yield event
+        finally:
+            watch.subscribers.pop(queue, None)
+            if not watch.subscribers and self.watches.get(id_repository) is watch:
+                del self.watches[id_repository]
+
+    async def handle_webhook(self, request):
+        body = await request.read()
+        expected = (
+            "sha256="
+            + hmac.new(self.webhook_secret.encode(), body, hashlib.sha256).hexdigest()
+        )
+        if not hmac.compare_digest(
+            request.headers.get("X-Hub-Signature-256", ""), expected
+        ):
+            return web.Response(status=401)
+        if request.headers.get("X-GitHub-Event") != "pull_request":
+            return web.Response(status=204)
+
+        try:
+            payload = json.loads(body)
+            action = payload.get("action")
+            id_repository = str(payload["repository"]["id"])
+            pull_request = payload["pull_request"]
+            number = pull_request["number"]
+            head_sha = pull_request["head"]["sha"]
+        except (ValueError, KeyError, TypeError, AttributeError):
+            # Redelivering a malformed event would not fix it.
+            return web.Response(status=400)
+        if action not in WEBHOOK_ACTIONS:
+            return web.Response(status=204)
+        watch = self.watches.get(id_repository)
+        if watch is None:
+            return web.Response(status=204)
+
+        if watch.heads is not None:
+            if watch.heads.get(number) == head_sha:
+                return web.Response(status=202)
+            watch.heads[number] = head_sha
+        self._dispatch(watch, pull_request)
+        # Deliveries are arriving, so polling only needs to catch missed ones.
+        watch.interval = self.max_interval
+        return web.Response(status=202)
+
+    def _ensure_scheduler(self):
+        if self.scheduler is None or self.scheduler.done():
+            self.wakeup = asyncio.Event()
+            self.scheduler = asyncio.create_task(self._run_scheduler())
+
+    def _schedule(self, watch, delay):
+        if self.watches.get(watch.id_repository) is not watch:
+            return
+        watch.due = time.monotonic() + delay
+        heapq.heappush(self.schedule, (watch.due, next(self.sequence), watch))
+        if self.wakeup:
+            self.wakeup.set()
+
+    async def _run_scheduler(self):
+        semaphore = asyncio.Semaphore(self.poll_concurrency)
+        while True:
+            self.wakeup.clear()
+            while self.schedule and self.schedule[0][0] <= time.monotonic():
+                due, _, watch = heapq.heappop(self.schedule)
+                if (
+                    watch.due != due
+                    or self.watches.get(watch.id_repository) is not watch
+                ):
+                    continue
+                watch.due = None
+                await semaphore.acquire()
+                task = asyncio.create_task(self._poll(watch))
+                self.polls.add(task)
+                task.add_done_callback(self.polls.discard)
+                task.add_done_callback(lambda _: semaphore.release())
+
+            timeout = self.schedule[0][0] - time.monotonic() if self.schedule else None
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _poll(self, watch):
+        subscriber, github_token = next(iter(watch.subscribers.items()), (None, None))
+        if subscriber is None:
+            return
+        try:
+            async with GitHubClient(github_token) as github_client:
+                if watch.full_name is None:
+                    repo = await github_client.get_repository(watch.id_repository)
+                    watch.full_name = repo["full_name"]
+                pulls, etag, poll_interval = await github_client.list_pull_requests(
+                    watch.full_name, watch.etag
+                )
+        except (GitHubAuthenticationError, GitHubNotFoundError) as e:
+            # Only this subscriber's token failed, the others may still work.
+            logging.warning(
+                f"Dropping a subscriber of repository {watch.id_repository}: {str(e)}"
+            )
+            if watch.subscribers.pop(subscriber, None) is not None:
+                subscriber.put_nowait(e)
+            if watch.subscribers:
+                self._schedule(watch, 0)
+            elif self.watches.get(watch.id_repository) is watch:
+                del self.watches[watch.id_repository]
+            return
+        except GitHubError as e:
+            logging.warning(f"Error polling repository {watch.id_repository}: {str(e)}")
+            watch.interval = min(watch.interval * 2, self.max_interval)
+            self._schedule(watch, watch.interval)
+            return
+        except Exception as e:
+            logging.error(
+                f"Unexpected error polling repository {watch.id_repository}: {str(e)}",
+                exc_info=True,
+            )
+            watch.interval = self.max_interval
+            self._schedule(watch, watch.interval)
+            return
+
+        changed = []
+        if pulls is not None:
+            watch.etag = etag
+            changed = self._update_heads(watch, pulls)
+        if changed:
+            watch.interval = self.min_interval
+            for pull_request in changed:
+                self._dispatch(watch, pull_request)
+        else:
+            watch.interval = min(
+                watch.interval * self.backoff_factor, self.max_interval
+            )
+        self._schedule(watch, max(watch.interval, poll_interval))
+
+    @staticmethod
+    def _update_heads(watch, pulls):
+        heads = {
+            pull_request["number"]: pull_request["head"]["sha"]
+            for pull_request in pulls
+        }
+        # The first listing is the baseline, only later changes are events.
+        changed = (
+            []
+            if watch.heads is None
+            else [
+                pull_request
+                for pull_request in pulls
+                if watch.heads.get(pull_request["number"])
+                != pull_request["head"]["sha"]
+            ]
+        )
+        watch.heads = heads
+        return changed
+
+    @staticmethod
+    def _dispatch(watch, pull_request):
+        for queue in watch.subscribers:
+            queue.put_nowait(pull_request)
+
+
+pull_request_watcher = PullRequestWatcher(
+    WATCH_MIN_INTERVAL,
+    WATCH_MAX_INTERVAL,
+    WATCH_BACKOFF_FACTOR,
+    WATCH_POLL_CONCURRENCY,
+    WATCH_WEBHOOK_HOST,
+    WATCH_WEBHOOK_PORT,
+    WATCH_WEBHOOK_SECRET,
+)
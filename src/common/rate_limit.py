@@ -0,0 +1,167 @@
+import asyncio
+import hashlib
+import os
+import random
+import time
+from dotenv import load_dotenv
+from . import metrics
+from .exceptions import GitHubRateLimitError
+from .jobs import current_rpc, time_remaining
+
+load_dotenv()
+
+GITHUB_REQUESTS_PER_SECOND = float(os.getenv("GITHUB_REQUESTS_PER_SECOND", "10"))
+GITHUB_REQUEST_BURST = int(os.getenv("GITHUB_REQUEST_BURST", "50"))
+GITHUB_RATE_LIMIT_RESERVE = int(os.getenv("GITHUB_RATE_LIMIT_RESERVE", "20"))
+GITHUB_RATE_LIMIT_MAX_WAIT = float(os.getenv("GITHUB_RATE_LIMIT_MAX_WAIT", "900"))
+GITHUB_RATE_LIMIT_RETRIES = int(os.getenv("GITHUB_RATE_LIMIT_RETRIES", "5"))
+GITHUB_SECONDARY_BACKOFF = float(os.getenv("GITHUB_SECONDARY_BACKOFF", "60"))
+
+RATE_LIMIT_REMAINING = metrics.registry.gauge(
+    "hypnos_github_rate_limit_remaining",
+    "Last X-RateLimit-Remaining reported by GitHub.",
+)
+RATE_LIMIT_WAIT = metrics.registry.counter(
+    "hypnos_github_rate_limit_wait_seconds_total",
+    "Time requests waited for the rate limit governor.",
+    ["rpc"],
+)
+RATE_LIMITED = metrics.registry.counter(
+    "hypnos_github_rate_limited_total",
+    "Requests rejected by GitHub rate limits.",
+    ["rpc"],
+)
+
+
+class TokenQuota:
+    def __init__(self, burst):
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.remaining = None
+        self.reset_at = None
+        self.blocked_until = 0.0
+        self.strikes = 0
+        self.lock = asyncio.Lock()
+
+
+class RateLimitGovernor:
+    """Paces GitHub API requests per token across the whole process.
+
+    Each token gets a token bucket of ``burst`` requests refilled at
+    ``requests_per_second``. The quota reported by X-RateLimit-Remaining and
+    X-RateLimit-Reset is tracked, and once only ``reserve`` requests are
+    left, requests wait for the reset instead of being rejected. Rate limit
+    rejections block the token for Retry-After, until the reset, or for a
+    jittered exponential backoff on secondary limits.
+    """
+
+    def __init__(
+        self,
+        requests_per_second,
+        burst,
+        reserve,
+        max_wait,
+        secondary_backoff,
+    ):
+        self.requests_per_second = requests_per_second
+        self.burst = burst
+        self.reserve = reserve
+        self.max_wait = max_wait
+        self.secondary_backoff = secondary_backoff
+        self.quotas = {}
+
+    async def acquire(self, token):
+        """Waits until a request may be sent with ``token``.
+
+        Raises GitHubRateLimitError when that would take longer than
+        ``max_wait`` or than the time left before the job's deadline.
+        """
+        quota = self._quota(token)
+        async with quota.lock:
+            while True:
+                delay = self._delay(quota)
+                if delay <= 0:
+                    break
+                remaining = time_remaining()
+                if delay > self.max_wait or (
+                    remaining is not None and delay > remaining
+                ):
+                    raise GitHubRateLimitError(
+                        f"GitHub API rate limit exceeded, retry in {int(delay)}s"
+                    )
+                RATE_LIMIT_WAIT.inc(delay, rpc=current_rpc())
+                await asyncio.sleep(delay)
+            quota.tokens -= 1
+            if quota.remaining is not None:
+                quota.remaining -= 1
+
+    def observe(self, token, status, headers, body=""):
+        """Records the rate limit headers of a response to ``token``.
+
+        Returns how long to wait before retrying if the response is a rate
+        limit rejection, None otherwise.
+        """
+        quota = self._quota(token)
+        try:
+            remaining = headers.get("X-RateLimit-Remaining")
+            reset = headers.get("X-RateLimit-Reset")
+            if remaining is not None and reset is not None:
+                quota.remaining = int(remaining)
+                quota.reset_at = float(reset)
+                RATE_LIMIT_REMAINING.set(quota.remaining)
+        except ValueError:
+            pass
+
+        if status not in (403, 429):
+            quota.strikes = 0
+            return None
+
+        retry_after = headers.get("Retry-After", "")
+        if retry_after.isdigit():
+            delay = float(retry_after)
+        elif quota.remaining == 0 and quota.reset_at:
+            delay = max(quota.reset_at - time.time(), 0) + 1
+        elif status == 429 or "rate limit" in body.lower():
+            delay = self.secondary_backoff * 2 ** min(quota.strikes, 6)
+        else:
+            return None
+        quota.strikes += 1
+        RATE_LIMITED.inc(rpc=current_rpc())
+        delay += random.uniform(0, min(delay, self.secondary_backoff) / 4)
+        quota.blocked_until = max(quota.blocked_until, time.monotonic() + delay)
+        return delay
+
+    def _quota(self, token):
+        key = hashlib.sha256((token or "").encode()).hexdigest()
+        quota = self.quotas.get(key)
+        if quota is None:
+            quota = self.quotas[key] = TokenQuota(self.burst)
+        return quota
+
+    def _delay(self, quota):
+        now = time.monotonic()
+        quota.tokens = min(
+            self.burst,
+            quota.tokens + (now - quota.updated) * self.requests_per_second,
+        )
+        quota.updated = now
+
+        delay = quota.blocked_until - now
+        if quota.remaining is not None and quota.remaining <= self.reserve:
+            until_reset = (quota.reset_at or 0) - time.time()
+            if until_reset > 0:
+                delay = max(delay, until_reset + 1)
+            else:
+                quota.remaining = None
+        if quota.tokens < 1:
+            delay = max(delay, (1 - quota.tokens) / self.requests_per_second)
+        return delay
+
+
+rate_limit_governor = RateLimitGovernor(
+    GITHUB_REQUESTS_PER_SECOND,
+    GITHUB_REQUEST_BURST,
+    GITHUB_RATE_LIMIT_RESERVE,
+    GITHUB_RATE_LIMIT_MAX_WAIT,
+    GITHUB_SECONDARY_BACKOFF,
+)
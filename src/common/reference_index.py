@@ -0,0 +1,120 @@
+import os
+import re
+from collections import defaultdict
+from .dump_format import FILE_SEPARATOR, format_file
+
+MODULE_PATTERNS = [
+    re.compile(r"^[ \t]*from[ \t]+([\w.]+)[ \t]+import\b", re.MULTILINE),
+    re.compile(r"^[ \t]*import[ \t]+(?:static[ \t]+)?([\w.]+)", re.MULTILINE),
+    re.compile(r"^[ \t]*(?:pub[ \t]+)?(?:use|mod)[ \t]+([\w:\\]+)", re.MULTILINE),
+]
+PATH_PATTERNS = [
+    re.compile(
+        r"""(?:\bfrom|\brequire_relative|\brequire|\bimport|#[ \t]*include)"""
+        r"""[ \t]*\(?[ \t]*['"<]([^'"<>\n]+)['">]"""
+    ),
+]
+RELATIVE_IMPORT_PATTERN = re.compile(
+    r"^[ \t]*from[ \t]+\.+[\w.]*[ \t]+import[ \t]+\(?([\w, \t]+)", re.MULTILINE
+)
+PACKAGE_STEMS = {"__init__", "index", "mod"}
+
+
+def extract_references(text):
+    """Returns the module names a source file imports, requires or includes.
+
+    Names are reduced to their last component, which is what gets matched
+    against the file names in the dump.
+    """
+    names = set()
+    for pattern in MODULE_PATTERNS:
+        for reference in pattern.findall(text):
+            names.add(re.split(r"[.:\\]+", reference.strip(".:\\"))[-1])
+    for pattern in PATH_PATTERNS:
+        for reference in pattern.findall(text):
+            names.add(os.path.splitext(os.path.basename(reference.rstrip("/")))[0])
+    for imported in RELATIVE_IMPORT_PATTERN.findall(text):
+        names.update(name.strip() for name in imported.split(","))
+    names.discard("")
+    return names
+
+
+def module_name(path):
+    directory, filename = os.path.split(path)
+    stem = os.path.splitext(filename)[0]
+    if stem in PACKAGE_STEMS and directory:
+        return os.path.basename(directory)
+    return stem
+
+
+class ReferenceIndex:
+    """Links the files of a dump to the files they reference and back.
+
+    References are resolved by module name. When several files share a
+    name, the ones closest to the referencing file in the tree win.
+    """
+
+    def __init__(self, files):
+        self.texts = dict(files)
+        self.references = defaultdict(set)
+        self.referenced_by = defaultdict(set)
+
+        modules = defaultdict(list)
+        for path in self.texts:
+            modules[module_name(path)].append(path)
+
+        for path, text in self.texts.items():
+            for name in extract_references(text):
+                for target in self._closest(path, modules.get(name, ())):
+                    if target != path:
+                        self.references[path].add(target)
+                        self.referenced_by[target].add(path)
+
+    def related_files(self, paths, max_files, max_chars):
+        """Returns ``(path, text)`` pairs for ``paths`` and their neighbours.
+
+        The files themselves come first, then the files they reference,
+        then the files referencing them, each ranked by how many of
+        ``paths`` they are linked to. Files are taken while they fit in
+        ``max_files`` and ``max_chars``.
+        """
+        changed = [path for path in paths if path in self.texts]
+        scores = defaultdict(int)
+        for path in changed:
+            for target in self.references[path]:
+                scores[target] += 2
+            for source in self.referenced_by[path]:
+                scores[source] += 1
+        neighbours = sorted(
+            (path for path in scores if path not in set(changed)),
+            key=lambda path: (-scores[path], path),
+        )
+
+        selected = []
+        remaining = max_chars
+        for path in changed + neighbours:
+            if len(selected) >= max_files:
+                break
+            size = len(format_file(path, self.texts[path])) + len(FILE_SEPARATOR)
+            if size <= remaining:
+                selected.append((path, self.texts[path]))
+                remaining -= size
+        return selected
+
+    @staticmethod
+    def _closest(path, candidates):
+        if len(candidates) <= 1:
+            return candidates
+        directory = os.path.dirname(path).split("/")
+
+        def shared_depth(candidate):
+            shared = 0
+            for a, b in zip(directory, os.path.dirname(candidate).split("/")):
+                if a != b:
+                    break
+                shared += 1
+            return shared
+
+        depths = {candidate: shared_depth(candidate) for candidate in candidates}
+        best = max(depths.values())
+        return [candidate for candidate in candidates if depths[candidate] == best]
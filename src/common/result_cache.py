@@ -0,0 +1,155 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from dotenv import load_dotenv
+from . import metrics
+from .disk_tier import DiskTier, remove
+
+load_dotenv()
+
+ANALYSIS_CACHE_DIR = os.getenv(
+    "ANALYSIS_CACHE_DIR", os.path.join(tempfile.gettempdir(), "hypnos", "analyses")
+)
+ANALYSIS_CACHE_MEMORY_ENTRIES = int(os.getenv("ANALYSIS_CACHE_MEMORY_ENTRIES", "256"))
+ANALYSIS_CACHE_DISK_BYTES = int(
+    os.getenv("ANALYSIS_CACHE_DISK_BYTES", str(256 * 1024 * 1024))
+)
+ANALYSIS_CACHE_TTL = float(os.getenv("ANALYSIS_CACHE_TTL", str(7 * 86400)))
+SUMMARY_CACHE_DIR = os.getenv(
+    "SUMMARY_CACHE_DIR", os.path.join(tempfile.gettempdir(), "hypnos", "summaries")
+)
+SUMMARY_CACHE_MEMORY_ENTRIES = int(os.getenv("SUMMARY_CACHE_MEMORY_ENTRIES", "4096"))
+SUMMARY_CACHE_DISK_BYTES = int(
+    os.getenv("SUMMARY_CACHE_DISK_BYTES", str(1024 * 1024 * 1024))
+)
+SUMMARY_CACHE_TTL = float(os.getenv("SUMMARY_CACHE_TTL", str(30 * 86400)))
+
+CACHE_LOOKUPS = metrics.registry.counter(
+    "hypnos_result_cache_lookups_total",
+    "Result cache lookups by cache, analysis or summary, and result: hit or miss.",
+    ["cache", "result"],
+)
+CACHE_TIME_SAVED = metrics.registry.counter(
+    "hypnos_result_cache_time_saved_seconds_total",
+    "Model time saved by result cache hits, by cache.",
+    ["cache"],
+)
+
+
+class ResultCache:
+    """Model outputs keyed by input content hash, prompt version and model.
+
+    The most recently used entries are kept in memory and every entry is
+    also written to disk as JSON. The disk tier is bounded by size and
+    entries older than ``ttl`` seconds are treated as missing. Lookups run
+    in worker threads, so the memory tier and the statistics sit behind a
+    lock. ``name`` labels the cache in metrics.
+    """
+
+    def __init__(self, name, directory, memory_entries, disk_bytes, ttl):
+        self.name = name
+        self.memory_entries = memory_entries
+        self.ttl = ttl
+        self.disk = DiskTier(directory, ".json", disk_bytes, ttl)
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.time_saved = 0.0
+
+    @staticmethod
+    def make_key(content, prompt_version, model_params):
+        content_hash = hashlib.sha256(
+            content.encode("utf-8", errors="surrogatepass")
+        ).hexdigest()
+        return hashlib.sha256(
+            f"{content_hash}:{prompt_version}:{model_params}".encode()
+        ).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and time.time() - entry["stored_at"] >= self.ttl:
+                del self._memory[key]
+                entry = None
+            if entry is not None:
+                self._memory.move_to_end(key)
+        if entry is None:
+            entry = self._read(key)
+
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                CACHE_LOOKUPS.inc(cache=self.name, result="miss")
+                return None
+            self._remember(key, entry)
+            self.hits += 1
+            self.time_saved += entry["duration"]
+            CACHE_LOOKUPS.inc(cache=self.name, result="hit")
+            CACHE_TIME_SAVED.inc(entry["duration"], cache=self.name)
+        return entry
+
+    def put(self, key, result, duration):
+        entry = {"result": result, "duration": duration, "stored_at": time.time()}
+        with self._lock:
+            self._remember(key, entry)
+        try:
+            fd, temp_path = self.disk.create_temp()
+            with os.fdopen(fd, "w", encoding="utf-8") as file:
+                json.dump(entry, file)
+            self.disk.install(temp_path, key)
+        except OSError as e:
+            logging.warning(f"Failed to write analysis cache entry {key}: {str(e)}")
+
+    def stats(self):
+        with self._lock:
+            hits, misses, time_saved = self.hits, self.misses, self.time_saved
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": hits / lookups if lookups else 0.0,
+            "time_saved": time_saved,
+        }
+
+    def _read(self, key):
+        path = self.disk.path(key)
+        try:
+            with open(path, encoding="utf-8") as file:
+                entry = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if time.time() - entry["stored_at"] >= self.ttl:
+            remove(path)
+            return None
+        self.disk.touch(path, entry["stored_at"])
+        return entry
+
+    def _remember(self, key, entry):
+        """Called with the lock held."""
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+
+result_cache = ResultCache(
+    "analysis",
+    ANALYSIS_CACHE_DIR,
+    ANALYSIS_CACHE_MEMORY_ENTRIES,
+    ANALYSIS_CACHE_DISK_BYTES,
+    ANALYSIS_CACHE_TTL,
+)
+
+summary_cache = ResultCache(
+    "summary",
+    SUMMARY_CACHE_DIR,
+    SUMMARY_CACHE_MEMORY_ENTRIES,
+    SUMMARY_CACHE_DISK_BYTES,
+    SUMMARY_CACHE_TTL,
+)
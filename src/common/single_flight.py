@@ -0,0 +1,97 @@
+import asyncio
+import logging
+from .jobs import JobContext, current_job
+
+
+class Flight:
+    def __init__(self, job):
+        self.job = job
+        self.messages = []
+        self.subscribers = 0
+        self.done = False
+        self.error = None
+        self.updated = asyncio.Event()
+        self.task = None
+
+    def publish(self, message):
+        self.messages.append(message)
+        self.notify()
+
+    def notify(self):
+        self.updated.set()
+        self.updated = asyncio.Event()
+
+
+class SingleFlight:
+    """Runs identical concurrent jobs once and shares their messages.
+
+    The first caller for a key starts the job in its own task. Callers
+    joining while it runs first get the messages published so far, then
+    follow the job live. The job is cancelled only once every caller has
+    left before it finished.
+    """
+
+    def __init__(self):
+        self.flights = {}
+
+    async def join(self, key, start, **fields):
+        """Yields the messages of the job for ``key`` with ``fields`` set.
+
+        ``start`` is called to create the job's async generator of messages
+        when no job for ``key`` is running. Exceptions raised by the job
+        are re-raised to every caller.
+        """
+        caller = current_job.get()
+        deadline = caller.deadline if caller is not None else None
+        flight = self.flights.get(key)
+        if flight is None:
+            job = JobContext(None, caller.rpc if caller is not None else "none")
+            job.deadline = deadline
+            if caller is not None:
+                # The stages of the shared job show in the caller that started it.
+                job.stages = caller.stages
+            flight = self.flights[key] = Flight(job)
+            flight.task = asyncio.create_task(self._run(key, flight, start()))
+        else:
+            logging.info(f"Joined in-flight job with {flight.subscribers} callers")
+            flight.job.extend_deadline(deadline)
+
+        flight.subscribers += 1
+        try:
+            index = 0
+            while True:
+                updated = flight.updated
+                while index < len(flight.messages):
+                    yield {**flight.messages[index], **fields}
+                    index += 1
+                if flight.done:
+                    break
+                await updated.wait()
+            if flight.error is not None:
+                raise flight.error
+        finally:
+            flight.subscribers -= 1
+            if not flight.subscribers and not flight.done:
+                flight.task.cancel()
+                if self.flights.get(key) is flight:
+                    del self.flights[key]
+
+    async def _run(self, key, flight, messages):
+        # The flight outlives the caller that started it, so it runs under
+        # its own job: no interrupt, and the latest deadline of its callers.
+        current_job.set(flight.job)
+        try:
+            async for message in messages:
+                flight.publish(message)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            flight.error = e
+        finally:
+            flight.done = True
+            flight.notify()
+            if self.flights.get(key) is flight:
+                del self.flights[key]
+
+
+single_flight = SingleFlight()
@@ -0,0 +1,150 @@
+import zlib
+
+BLOCK_SIZE = 512
+
+REGULAR_FILE_TYPES = (b"0", b"\0", b"7")
+PAX_HEADER_TYPE = b"x"
+PAX_GLOBAL_HEADER_TYPE = b"g"
+GNU_LONG_NAME_TYPE = b"L"
+
+
+class TarStreamReader:
+    """Incrementally decodes a gzip-compressed tar stream.
+
+    Chunks are passed to ``feed`` as they arrive from the network and
+    completed regular-file members are returned as ``(path, content)``
+    tuples. Only the member currently being read is held in memory, and
+    members rejected by ``accept`` or larger than ``max_size`` bytes are
+    skipped without being buffered.
+    """
+
+    def __init__(self, accept=None, strip_components=0, max_size=0):
+        self.accept = accept
+        self.max_size = max_size
+        self.strip_components = strip_components
+        self._decompressor = zlib.decompressobj(wbits=zlib.MAX_WBITS | 16)
+        self._buffer = bytearray()
+        self._member = None
+        self._pax_path = None
+        self._long_name = None
+        self.finished = False
+
+    def feed(self, chunk):
+        if self.finished:
+            return []
+        self._buffer += self._decompressor.decompress(chunk)
+        return self._drain()
+
+    def _drain(self):
+        members = []
+        while not self.finished:
+            if self._member is None:
+                if len(self._buffer) < BLOCK_SIZE:
+                    break
+                header = bytes(self._buffer[:BLOCK_SIZE])
+                del self._buffer[:BLOCK_SIZE]
+                self._start_member(header)
+                continue
+
+            member = self._member
+            if member["remaining"] > 0:
+                if not self._buffer:
+                    break
+                available = min(len(self._buffer), member["remaining"])
+                unread = member["size"] - member["read"]
+                if member["parts"] is not None and unread > 0:
+                    member["parts"].append(
+                        bytes(self._buffer[: min(available, unread)])
+                    )
+                del self._buffer[:available]
+                member["remaining"] -= available
+                member["read"] += min(available, unread)
+            if member["remaining"] == 0:
+                self._member = None
+                result = self._finish_member(member)
+                if result is not None:
+                    members.append(result)
+        return members
+
+    def _start_member(self, header):
+        if header == b"\0" * BLOCK_SIZE:
+            self.finished = True
+            return
+
+        name = _read_string(header[0:100])
+        size = _read_number(header[124:136])
+        type_flag = header[156:157]
+        if header[257:262] == b"ustar":
+            prefix = _read_string(header[345:500])
+            if prefix:
+                name = f"{prefix}/{name}"
+
+        if type_flag in (PAX_HEADER_TYPE, PAX_GLOBAL_HEADER_TYPE, GNU_LONG_NAME_TYPE):
+            keep = True
+        elif type_flag in REGULAR_FILE_TYPES:
+            if self._long_name is not None:
+                name = self._long_name
+            if self._pax_path is not None:
+                name = self._pax_path
+            self._long_name = None
+            self._pax_path = None
+            name = self._strip(name)
+            keep = (
+                bool(name)
+                and not (self.max_size and size > self.max_size)
+                and (self.accept is None or self.accept(name))
+            )
+        else:
+            self._long_name = None
+            self._pax_path = None
+            keep = False
+
+        self._member = {
+            "name": name,
+            "type": type_flag,
+            "size": size,
+            "read": 0,
+            "remaining": -(-size // BLOCK_SIZE) * BLOCK_SIZE,
+            "parts": [] if keep else None,
+        }
+
+    def _finish_member(self, member):
+        if member["parts"] is None:
+            return None
+        content = b"".join(member["parts"])
+        if member["type"] == PAX_HEADER_TYPE:
+            self._pax_path = _parse_pax_records(content).get("path")
+            return None
+        if member["type"] == PAX_GLOBAL_HEADER_TYPE:
+            return None
+        if member["type"] == GNU_LONG_NAME_TYPE:
+            self._long_name = _read_string(content)
+            return None
+        return member["name"], content
+
+    def _strip(self, name):
+        parts = name.split("/")
+        return "/".join(parts[self.strip_components :])
+
+
+def _read_string(field):
+    return field.split(b"\0", 1)[0].decode("utf-8", errors="replace")
+
+
+def _read_number(field):
+    if field[0] & 0x80:
+        return int.from_bytes(field[1:], "big")
+    return int(field.split(b"\0", 1)[0].strip() or b"0", 8)
+
+
+def _parse_pax_records(content):
+    records = {}
+    position = 0
+    while position < len(content):
+        space = content.index(b" ", position)
+        length = int(content[position:space])
+        record = content[space + 1 : position + length - 1]
+        key, _, value = record.partition(b"=")
+        records[key.decode("utf-8")] = value.decode("utf-8", errors="replace")
+        position += length
+    return records
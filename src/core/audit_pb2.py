@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+# Generated by the protocol buffer compiler.  DO NOT EDIT!
+# NO CHECKED-IN PROTOBUF GENCODE
+# source: audit.proto
+# Protobuf Python Version: 7.35.1
+"""Generated protocol buffer code."""
+from google.protobuf import descriptor as _descriptor
+from google.protobuf import descriptor_pool as _descriptor_pool
+from google.protobuf import runtime_version as _runtime_version
+from google.protobuf import symbol_database as _symbol_database
+from google.protobuf.internal import builder as _builder
+
+_runtime_version.ValidateProtobufRuntimeVersion(
+    _runtime_version.Domain.PUBLIC, 7, 35, 1, "", "audit.proto"
+)
+# @@protoc_insertion_point(imports)
+
+_sym_db = _symbol_database.Default()
+
+
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(
+    b'\n\x0b\x61udit.proto\x12\x05\x61udit"\xac\x03\n\x15\x44umpSourceCodeRequest\x12\x0f\n\x07id_work\x18\x01 \x01(\t\x12\x15\n\rid_repository\x18\x02 \x01(\t\x12\x14\n\x0cgithub_token\x18\x03 \x01(\t\x12\x18\n\x0b\x62\x61se_commit\x18\x04 \x01(\tH\x00\x88\x01\x01\x12\x19\n\x0c\x62\x61se_dump_id\x18\x05 \x01(\tH\x01\x88\x01\x01\x12\x1a\n\rstream_chunks\x18\x06 \x01(\x08H\x02\x88\x01\x01\x12\x17\n\nstore_only\x18\x07 \x01(\x08H\x03\x88\x01\x01\x12&\n\x08priority\x18\x08 \x01(\x0e\x32\x0f.audit.PriorityH\x04\x88\x01\x01\x12\x19\n\x0ctoken_budget\x18\t \x01(\x03H\x05\x88\x01\x01\x12\x12\n\npath_rules\x18\n \x03(\t\x12\x1e\n\x11use_gitattributes\x18\x0b \x01(\x08H\x06\x88\x01\x01\x42\x0e\n\x0c_base_commitB\x0f\n\r_base_dump_idB\x10\n\x0e_stream_chunksB\r\n\x0b_store_onlyB\x0b\n\t_priorityB\x0f\n\r_token_budgetB\x14\n\x12_use_gitattributes"\xae\x04\n\x16\x44umpSourceCodeResponse\x12\x0f\n\x07id_work\x18\x01 \x01(\t\x12\x15\n\rid_repository\x18\x02 \x01(\t\x12\x16\n\x0eprocess_status\x18\x03 \x01(\t\x12\x16\n\tcode_dump\x18\x04 \x01(\tH\x00\x88\x01\x01\x12\x1a\n\rerror_message\x18\x05 \x01(\tH\x01\x88\x01\x01\x12\x17\n\ncommit_sha\x18\x06 \x01(\tH\x02\x88\x01\x01\x12\x14\n\x07\x64ump_id\x18\x07 \x01(\tH\x03\x88\x01\x01\x12\x12\n\x05\x63hunk\x18\x08 \x01(\tH\x04\x88\x01\x01\x12\x15\n\x08sequence\x18\t \x01(\x03H\x05\x88\x01\x01\x12*\n\x08manifest\x18\n \x01(\x0b\x32\x13.audit.DumpManifestH\x06\x88\x01\x01\x12\x16\n\tdump_size\x18\x0b \x01(\x03H\x07\x88\x01\x01\x12\x18\n\x0b\x64ump_sha256\x18\x0c \x01(\tH\x08\x88\x01\x01\x12\x1b\n\x0equeue_position\x18\r \x01(\x03H\t\x88\x01\x01\x12\x16\n\ttruncated\x18\x0e \x01(\x08H\n\x88\x01\x01\x12\x15\n\romitted_files\x18\x0f \x03(\tB\x0c\n\n_code_dumpB\x10\n\x0e_error_messageB\r\n\x0b_commit_shaB\n\n\x08_dump_idB\x08\n\x06_chunkB\x0b\n\t_sequenceB\x0b\n\t_manifestB\x0c\n\n_dump_sizeB\x0e\n\x0c_dump_sha256B\x11\n\x0f_queue_positionB\x0c\n\n_truncated"W\n\x0c\x44umpManifest\x12\r\n\x05\x66iles\x18\x01 \x03(\t\x12\x13\n\x0btotal_bytes\x18\x02 \x01(\x03\x12\x13\n\x0b\x63hunk_count\x18\x03 \x01(\x03\x12\x0e\n\x06sha256\x18\x04 \x01(\t"\xda\x01\n\x18\x41nalyzeSourceCodeRequest\x12\x0f\n\x07id_work\x18\x01 \x01(\t\x12\x15\n\rid_repository\x18\x02 \x01(\t\x12\x11\n\tcode_dump\x18\x03 \x01(\t\x12\x14\n\x07\x64ump_id\x18\x04 \x01(\tH\x00\x88\x01\x01\x12\x1a\n\ranalysis_mode\x18\x05 \x01(\tH\x01\x88\x01\x01\x12&\n\x08priority\x18\x06 \x01(\x0e\x32\x0f.audit.PriorityH\x02\x88\x01\x01\x42\n\n\x08_dump_idB\x10\n\x0e_analysis_modeB\x0b\n\t_priority"\xff\x01\n\x19\x41nalyzeSourceCodeResponse\x12\x0f\n\x07id_work\x18\x01 \x01(\t\x12\x15\n\rid_repository\x18\x02 \x01(\t\x12\x16\n\x0eprocess_status\x18\x03 \x01(\t\x12\x13\n\x06result\x18\x04 \x01(\tH\x00\x88\x01\x01\x12\x1a\n\rerror_message\x18\x05 \x01(\tH\x01\x88\x01\x01\x12\x1b\n\x0equeue_position\x18\x06 \x01(\x03H\x02\x88\x01\x01\x12\x16\n\ttruncated\x18\x07 \x01(\x08H\x03\x88\x01\x01\x42\t\n\x07_resultB\x10\n\x0e_error_messageB\x11\n\x0f_queue_positionB\x0c\n\n_truncated"\xf2\x01\n\x19\x41nalyzePullRequestRequest\x12\x0f\n\x07id_work\x18\x01 \x01(\t\x12\x15\n\rid_repository\x18\x02 \x01(\t\x12\x17\n\x0fid_pull_request\x18\x03 \x01(\t\x12\x11\n\tcode_dump\x18\x04 \x01(\t\x12\x14\n\x07\x64ump_id\x18\x05 \x01(\tH\x00\x88\x01\x01\x12\x19\n\x0cgithub_token\x18\x06 \x01(\tH\x01\x88\x01\x01\x12&\n\x08priority\x18\x07 \x01(\x0e\x32\x0f.audit.PriorityH\x02\x88\x01\x01\x42\n\n\x08_dump_idB\x0f\n\r_github_tokenB\x0b\n\t_priority"\x99\x02\n\x1a\x41nalyzePullRequestResponse\x12\x0f\n\x07id_work\x18\x01 \x01(\t\x12\x15\n\rid_repository\x18\x02 \x01(\t\x12\x17\n\x0fid_pull_request\x18\x03 \x01(\t\x12\x16\n\x0eprocess_status\x18\x04 \x01(\t\x12\x13\n\x06result\x18\x05 \x01(\tH\x00\x88\x01\x01\x12\x1a\n\rerror_message\x18\x06 \x01(\tH\x01\x88\x01\x01\x12\x1b\n\x0equeue_position\x18\x07 \x01(\x03H\x02\x88\x01\x01\x12\x16\n\ttruncated\x18\x08 \x01(\x08H\x03\x88\x01\x01\x42\t\n\x07_resultB\x10\n\x0e_error_messageB\x11\n\x0f_queue_positionB\x0c\n\n_truncated"\xc2\x01\n\x18WatchPullRequestsRequest\x12\x0f\n\x07id_work\x18\x01 \x01(\t\x12\x15\n\rid_repository\x18\x02 \x01(\t\x12\x11\n\tcode_dump\x18\x03 \x01(\t\x12\x14\n\x0cgithub_token\x18\x04 \x01(\t\x12\x14\n\x07\x64ump_id\x18\x05 \x01(\tH\x00\x88\x01\x01\x12&\n\x08priority\x18\x06 \x01(\x0e\x32\x0f.audit.PriorityH\x01\x88\x01\x01\x42\n\n\x08_dump_idB\x0b\n\t_priority"\xaf\x02\n\x19WatchPullRequestsResponse\x12\x0f\n\x07id_work\x18\x01 \x01(\t\x12\x15\n\rid_repository\x18\x02 \x01(\t\x12\x16\n\x0eprocess_status\x18\x03 \x01(\t\x12\x13\n\x06result\x18\x04 \x01(\tH\x00\x88\x01\x01\x12\x1a\n\rerror_message\x18\x05 \x01(\tH\x01\x88\x01\x01\x12\x1c\n\x0fid_pull_request\x18\x06 \x01(\tH\x02\x88\x01\x01\x12\x15\n\x08head_sha\x18\x07 \x01(\tH\x03\x88\x01\x01\x12\x1b\n\x0equeue_position\x18\x08 \x01(\x03H\x04\x88\x01\x01\x42\t\n\x07_resultB\x10\n\x0e_error_messageB\x12\n\x10_id_pull_requestB\x0b\n\t_head_shaB\x11\n\x0f_queue_position"*\n\x17InterruptProcessRequest\x12\x0f\n\x07id_work\x18\x01 \x01(\t"j\n\x18InterruptProcessResponse\x12\x0f\n\x07id_work\x18\x01 \x01(\t\x12\x0f\n\x07success\x18\x02 \x01(\x08\x12\x1a\n\rerror_message\x18\x03 \x01(\tH\x00\x88\x01\x01\x42\x10\n\x0e_error_message*&\n\x08Priority\x12\x0f\n\x0bINTERACTIVE\x10\x00\x12\t\n\x05\x42\x41TCH\x10\x01\x32\xcf\x03\n\x0c\x41uditService\x12Q\n\x0e\x44umpSourceCode\x12\x1c.audit.DumpSourceCodeRequest\x1a\x1d.audit.DumpSourceCodeResponse"\x00\x30\x01\x12Z\n\x11\x41nalyzeSourceCode\x12\x1f.audit.AnalyzeSourceCodeRequest\x1a .audit.AnalyzeSourceCodeResponse"\x00\x30\x01\x12]\n\x12\x41nalyzePullRequest\x12 .audit.AnalyzePullRequestRequest\x1a!.audit.AnalyzePullRequestResponse"\x00\x30\x01\x12Z\n\x11WatchPullRequests\x12\x1f.audit.WatchPullRequestsRequest\x1a .audit.WatchPullRequestsResponse"\x00\x30\x01\x12U\n\x10InterruptProcess\x12\x1e.audit.InterruptProcessRequest\x1a\x1f.audit.InterruptProcessResponse"\x00\x62\x06proto3'
+)
+
+_globals = globals()
+_builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
+_builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, "audit_pb2", _globals)
+if not _descriptor._USE_C_DESCRIPTORS:
+    DESCRIPTOR._loaded_options = None
+    _globals["_PRIORITY"]._serialized_start = 2766
+    _globals["_PRIORITY"]._serialized_end = 2804
+    _globals["_DUMPSOURCECODEREQUEST"]._serialized_start = 23
+    _globals["_DUMPSOURCECODEREQUEST"]._serialized_end = 451
+    _globals["_DUMPSOURCECODERESPONSE"]._serialized_start = 454
+    _globals["_DUMPSOURCECODERESPONSE"]._serialized_end = 1012
+    _globals["_DUMPMANIFEST"]._serialized_start = 1014
+    _globals["_DUMPMANIFEST"]._serialized_end = 1101
+    _globals["_ANALYZESOURCECODEREQUEST"]._serialized_start = 1104
+    _globals["_ANALYZESOURCECODEREQUEST"]._serialized_end = 1322
+    _globals["_ANALYZESOURCECODERESPONSE"]._serialized_start = 1325
+    _globals["_ANALYZESOURCECODERESPONSE"]._serialized_end = 1580
+    _globals["_ANALYZEPULLREQUESTREQUEST"]._serialized_start = 1583
+    _globals["_ANALYZEPULLREQUESTREQUEST"]._serialized_end = 1825
+    _globals["_ANALYZEPULLREQUESTRESPONSE"]._serialized_start = 1828
+    _globals["_ANALYZEPULLREQUESTRESPONSE"]._serialized_end = 2109
+    _globals["_WATCHPULLREQUESTSREQUEST"]._serialized_start = 2112
+    _globals["_WATCHPULLREQUESTSREQUEST"]._serialized_end = 2306
+    _globals["_WATCHPULLREQUESTSRESPONSE"]._serialized_start = 2309
+    _globals["_WATCHPULLREQUESTSRESPONSE"]._serialized_end = 2612
+    _globals["_INTERRUPTPROCESSREQUEST"]._serialized_start = 2614
+    _globals["_INTERRUPTPROCESSREQUEST"]._serialized_end = 2656
+    _globals["_INTERRUPTPROCESSRESPONSE"]._serialized_start = 2658
+    _globals["_INTERRUPTPROCESSRESPONSE"]._serialized_end = 2764
+    _globals["_AUDITSERVICE"]._serialized_start = 2807
+    _globals["_AUDITSERVICE"]._serialized_end = 3270
+# @@protoc_insertion_point(module_scope)
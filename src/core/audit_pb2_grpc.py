@@ -0,0 +1,293 @@
+# Generated by the gRPC Python protocol compiler plugin. DO NOT EDIT!
+"""Client and server classes corresponding to protobuf-defined services."""
+import grpc
+import warnings
+
+import audit_pb2 as audit__pb2
+
+GRPC_GENERATED_VERSION = "1.84.0"
+GRPC_VERSION = grpc.__version__
+_version_not_supported = False
+
+try:
+    from grpc._utilities import first_version_is_lower
+
+    _version_not_supported = first_version_is_lower(
+        GRPC_VERSION, GRPC_GENERATED_VERSION
+    )
+except ImportError:
+    _version_not_supported = True
+
+if _version_not_supported:
+    raise RuntimeError(
+        f"The grpc package installed is at version {GRPC_VERSION},"
+        + " but the generated code in audit_pb2_grpc.py depends on"
+        + f" grpcio>={GRPC_GENERATED_VERSION}."
+        + f" Please upgrade your grpc module to grpcio>={GRPC_GENERATED_VERSION}"
+        + f" or downgrade your generated code using grpcio-tools<={GRPC_VERSION}."
+    )
+
+
+class AuditServiceStub:
+    """Missing associated documentation comment in .proto file."""
+
+    def __init__(self, channel):
+        """Constructor.
+
+        Args:
+            channel: A grpc.Channel.
+        """
+        self.DumpSourceCode = channel.unary_stream(
+            "/audit.AuditService/DumpSourceCode",
+            request_serializer=audit__pb2.DumpSourceCodeRequest.SerializeToString,
+            response_deserializer=audit__pb2.DumpSourceCodeResponse.FromString,
+            _registered_method=True,
+        )
+        self.AnalyzeSourceCode = channel.unary_stream(
+            "/audit.AuditService/AnalyzeSourceCode",
+            request_serializer=audit__pb2.AnalyzeSourceCodeRequest.SerializeToString,
+            response_deserializer=audit__pb2.AnalyzeSourceCodeResponse.FromString,
+            _registered_method=True,
+        )
+        self.AnalyzePullRequest = channel.unary_stream(
+            "/audit.AuditService/AnalyzePullRequest",
+            request_serializer=audit__pb2.AnalyzePullRequestRequest.SerializeToString,
+            response_deserializer=audit__pb2.AnalyzePullRequestResponse.FromString,
+            _registered_method=True,
+        )
+        self.WatchPullRequests = channel.unary_stream(
+            "/audit.AuditService/WatchPullRequests",
+            request_serializer=audit__pb2.WatchPullRequestsRequest.SerializeToString,
+            response_deserializer=audit__pb2.WatchPullRequestsResponse.FromString,
+            _registered_method=True,
+        )
+        self.InterruptProcess = channel.unary_unary(
+            "/audit.AuditService/InterruptProcess",
+            request_serializer=audit__pb2.InterruptProcessRequest.SerializeToString,
+            response_deserializer=audit__pb2.InterruptProcessResponse.FromString,
+            _registered_method=True,
+        )
+
+
+class AuditServiceServicer:
+    """Missing associated documentation comment in .proto file."""
+
+    def DumpSourceCode(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details("Method not implemented!")
+        raise NotImplementedError("Method not implemented!")
+
+    def AnalyzeSourceCode(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details("Method not implemented!")
+        raise NotImplementedError("Method not implemented!")
+
+    def AnalyzePullRequest(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details("Method not implemented!")
+        raise NotImplementedError("Method not implemented!")
+
+    def WatchPullRequests(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details("Method not implemented!")
+        raise NotImplementedError("Method not implemented!")
+
+    def InterruptProcess(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details("Method not implemented!")
+        raise NotImplementedError("Method not implemented!")
+
+
+def add_AuditServiceServicer_to_server(servicer, server):
+    rpc_method_handlers = {
+        "DumpSourceCode": grpc.unary_stream_rpc_method_handler(
+            servicer.DumpSourceCode,
+            request_deserializer=audit__pb2.DumpSourceCodeRequest.FromString,
+            response_serializer=audit__pb2.DumpSourceCodeResponse.SerializeToString,
+        ),
+        "AnalyzeSourceCode": grpc.unary_stream_rpc_method_handler(
+            servicer.AnalyzeSourceCode,
+            request_deserializer=audit__pb2.AnalyzeSourceCodeRequest.FromString,
+            response_serializer=audit__pb2.AnalyzeSourceCodeResponse.SerializeToString,
+        ),
+        "AnalyzePullRequest": grpc.unary_stream_rpc_method_handler(
+            servicer.AnalyzePullRequest,
+            request_deserializer=audit__pb2.AnalyzePullRequestRequest.FromString,
+            response_serializer=audit__pb2.AnalyzePullRequestResponse.SerializeToString,
+        ),
+        "WatchPullRequests": grpc.unary_stream_rpc_method_handler(
+            servicer.WatchPullRequests,
+            request_deserializer=audit__pb2.WatchPullRequestsRequest.FromString,
+            response_serializer=audit__pb2.WatchPullRequestsResponse.SerializeToString,
+        ),
+        "InterruptProcess": grpc.unary_unary_rpc_method_handler(
+            servicer.InterruptProcess,
+            request_deserializer=audit__pb2.InterruptProcessRequest.FromString,
+            response_serializer=audit__pb2.InterruptProcessResponse.SerializeToString,
+        ),
+    }
+    generic_handler = grpc.method_handlers_generic_handler(
+        "audit.AuditService", rpc_method_handlers
+    )
+    server.add_generic_rpc_handlers((generic_handler,))
+    server.add_registered_method_handlers("audit.AuditService", rpc_method_handlers)
+
+
+# This class is part of an EXPERIMENTAL API.
+class AuditService:
+    """Missing associated documentation comment in .proto file."""
+
+    @staticmethod
+    def DumpSourceCode(
+        request,
+        target,
+        options=(),
+        channel_credentials=None,
+        call_credentials=None,
+        insecure=False,
+        compression=None,
+        wait_for_ready=None,
+        timeout=None,
+        metadata=None,
+    ):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            "/audit.AuditService/DumpSourceCode",
+            audit__pb2.DumpSourceCodeRequest.SerializeToString,
+            audit__pb2.DumpSourceCodeResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True,
+        )
+
+    @staticmethod
+    def AnalyzeSourceCode(
+        request,
+        target,
+        options=(),
+        channel_credentials=None,
+        call_credentials=None,
+        insecure=False,
+        compression=None,
+        wait_for_ready=None,
+        timeout=None,
+        metadata=None,
+    ):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            "/audit.AuditService/AnalyzeSourceCode",
+            audit__pb2.AnalyzeSourceCodeRequest.SerializeToString,
+            audit__pb2.AnalyzeSourceCodeResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True,
+        )
+
+    @staticmethod
+    def AnalyzePullRequest(
+        request,
+        target,
+        options=(),
+        channel_credentials=None,
+        call_credentials=None,
+        insecure=False,
+        compression=None,
+        wait_for_ready=None,
+        timeout=None,
+        metadata=None,
+    ):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            "/audit.AuditService/AnalyzePullRequest",
+            audit__pb2.AnalyzePullRequestRequest.SerializeToString,
+            audit__pb2.AnalyzePullRequestResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True,
+        )
+
+    @staticmethod
+    def WatchPullRequests(
+        request,
+        target,
+        options=(),
+        channel_credentials=None,
+        call_credentials=None,
+        insecure=False,
+        compression=None,
+        wait_for_ready=None,
+        timeout=None,
+        metadata=None,
+    ):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            "/audit.AuditService/WatchPullRequests",
+            audit__pb2.WatchPullRequestsRequest.SerializeToString,
+            audit__pb2.WatchPullRequestsResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True,
+        )
+
+    @staticmethod
+    def InterruptProcess(
+        request,
+        target,
+        options=(),
+        channel_credentials=None,
+        call_credentials=None,
+        insecure=False,
+        compression=None,
+        wait_for_ready=None,
+        timeout=None,
+        metadata=None,
+    ):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            "/audit.AuditService/InterruptProcess",
+            audit__pb2.InterruptProcessRequest.SerializeToString,
+            audit__pb2.InterruptProcessResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True,
+        )
@@ -1,4 +1,6 @@
 import grpc
+import logging
+import time
 from concurrent import futures
 from . import audit_pb2, audit_pb2_grpc
 from services import (
@@ -7,6 +9,11 @@ from services import (
     WatchPullRequestsService,
     AnalyzePullRequestService,
 )
+from common.admission import admission_controller
+from common.dump_store import dump_store
+from common.exceptions import AdmissionRejectedError, DumpNotFoundError
+from common.interrupt_router import interrupt_router
+from common.jobs import STAGE_DURATION, job_registry
 import os
 from dotenv import load_dotenv
 
@@ -24,71 +31,180 @@ class AuditServicer(audit_pb2_grpc.AuditServiceServicer):
         self.analyze_source_pull_request_service = AnalyzePullRequestService(
             api_key=LLM_API_KEY
         )
-        self.watch_service = WatchPullRequestsService()
-        self.active_processes = {}
+        self.watch_service = WatchPullRequestsService(api_key=LLM_API_KEY)
 
     async def DumpSourceCode(self, request, context):
-        self.active_processes[request.id_work] = self.dump_service
-        try:
-            async for response in self.dump_service.process(
-                request.id_work, request.id_repository, request.github_token
-            ):
-                yield audit_pb2.DumpSourceCodeResponse(**response)
-        finally:
-            del self.active_processes[request.id_work]
+        async for response in self.run_job(
+            context,
+            "DumpSourceCode",
+            request,
+            self.dump_service.process(
+                request.id_work,
+                request.id_repository,
+                request.github_token,
+                request.base_commit,
+                request.base_dump_id,
+                request.stream_chunks,
+                request.store_only,
+                request.token_budget,
+                request.path_rules,
+                request.use_gitattributes,
+            ),
+        ):
+            yield self.to_message(
+                "DumpSourceCode", audit_pb2.DumpSourceCodeResponse, response
+            )
 
     async def AnalyzeSourceCode(self, request, context):
-        self.active_processes[request.id_work] = self.analyze_source_code_service
         try:
-            async for response in self.analyze_source_code_service.process(
-                request.id_work, request.id_repository, request.code_dump
+            async for response in self.run_job(
+                context,
+                "AnalyzeSourceCode",
+                request,
+                self.analyze_source_code(request),
             ):
-                yield audit_pb2.AnalyzeSourceCodeResponse(**response)
-        finally:
-            del self.active_processes[request.id_work]
+                yield self.to_message(
+                    "AnalyzeSourceCode", audit_pb2.AnalyzeSourceCodeResponse, response
+                )
+        except DumpNotFoundError as e:
+            yield audit_pb2.AnalyzeSourceCodeResponse(
+                id_work=request.id_work,
+                id_repository=request.id_repository,
+                process_status="error",
+                error_message=str(e),
+            )
 
     async def AnalyzePullRequest(self, request, context):
-        self.active_processes[request.id_work] = (
-            self.analyze_source_pull_request_service
+        try:
+            async for response in self.run_job(
+                context,
+                "AnalyzePullRequest",
+                request,
+                self.analyze_pull_request(request),
+                id_pull_request=request.id_pull_request,
+            ):
+                yield self.to_message(
+                    "AnalyzePullRequest", audit_pb2.AnalyzePullRequestResponse, response
+                )
+        except DumpNotFoundError as e:
+            yield audit_pb2.AnalyzePullRequestResponse(
+                id_work=request.id_work,
+                id_repository=request.id_repository,
+                id_pull_request=request.id_pull_request,
+                process_status="error",
+                error_message=str(e),
+            )
+
+    async def WatchPullRequests(self, request, context):
+        try:
+            async for response in self.run_job(
+                context,
+                "WatchPullRequests",
+                request,
+                self.watch_pull_requests(request),
+            ):
+                yield self.to_message(
+                    "WatchPullRequests", audit_pb2.WatchPullRequestsResponse, response
+                )
+        except DumpNotFoundError as e:
+            yield audit_pb2.WatchPullRequestsResponse(
+                id_work=request.id_work,
+                id_repository=request.id_repository,
+                process_status="error",
+                error_message=str(e),
+            )
+
+    async def InterruptProcess(self, request, context):
+        job = job_registry.get(request.id_work)
+        if job is not None:
+            job.interrupt()
+            success = True
+        else:
+            # In the multi-process mode the job may run in another worker.
+            success = await interrupt_router.interrupt(request.id_work)
+        return audit_pb2.InterruptProcessResponse(
+            id_work=request.id_work, success=success
         )
+
+    @staticmethod
+    def to_message(rpc, message_type, response):
+        """Builds a response message, timed as the "serialize" stage."""
+        started = time.monotonic()
+        message = message_type(**response)
+        STAGE_DURATION.observe(time.monotonic() - started, rpc=rpc, stage="serialize")
+        return message
+
+    async def run_job(self, context, rpc, request, messages, **fields):
+        """Admits a job and streams its messages.
+
+        Jobs over the queue limit of their RPC are aborted with
+        RESOURCE_EXHAUSTED. The deadline of the RPC becomes the deadline of
+        the job.
+        """
         try:
+            ticket = admission_controller.enqueue(rpc, request.priority)
+        except AdmissionRejectedError as e:
+            logging.warning(f"Rejected {rpc} job {request.id_work}: {str(e)}")
+            await context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, str(e))
+
+        async for response in job_registry.run(
+            request.id_work,
+            rpc,
+            messages,
+            {
+                "id_work": request.id_work,
+                "id_repository": request.id_repository,
+                **fields,
+            },
+            ticket,
+            context.time_remaining(),
+        ):
+            yield response
+
+    async def analyze_source_code(self, request):
+        async with dump_store.resolve(request.dump_id, request.code_dump) as code_dump:
+            async for response in self.analyze_source_code_service.process(
+                request.id_work,
+                request.id_repository,
+                code_dump,
+                request.analysis_mode,
+            ):
+                yield response
+
+    async def analyze_pull_request(self, request):
+        async with dump_store.resolve(request.dump_id, request.code_dump) as code_dump:
             async for response in self.analyze_source_pull_request_service.process(
                 request.id_work,
                 request.id_repository,
                 request.id_pull_request,
-                request.code_dump,
+                code_dump,
+                request.github_token,
             ):
-                yield audit_pb2.AnalyzePullRequestResponse(**response)
-        finally:
-            del self.active_processes[request.id_work]
+                yield response
 
-    async def WatchPullRequests(self, request, context):
-        self.active_processes[request.id_work] = self.watch_service
-        try:
+    async def watch_pull_requests(self, request):
+        async with dump_store.resolve(request.dump_id, request.code_dump) as code_dump:
             async for response in self.watch_service.process(
                 request.id_work,
                 request.id_repository,
-                request.code_dump,
+                code_dump,
                 request.github_token,
             ):
-                yield audit_pb2.WatchPullRequestsResponse(**response)
-        finally:
-            del self.active_processes[request.id_work]
-
-    async def InterruptProcess(self, request, context):
-        if request.id_work in self.active_processes:
-            self.active_processes[request.id_work].interrupt()
-            return audit_pb2.InterruptProcessResponse(
-                id_work=request.id_work, success=True
-            )
-        return audit_pb2.InterruptProcessResponse(
-            id_work=request.id_work, success=False
-        )
+                yield response
 
 
-async def serve(host, port):
-    server = grpc.aio.server(futures.ThreadPoolExecutor(max_workers=10))
-    audit_pb2_grpc.add_AuditServiceServicer_to_server(AuditServicer(), server)
+async def serve(host, port, servicer=None, reuse_port=False):
+    # SO_REUSEPORT lets every worker process of the multi-process mode bind
+    # the same port, with the kernel spreading connections between them.
+    # gRPC sets it by default, so a single server turns it off to fail on a
+    # port that is already taken.
+    server = grpc.aio.server(
+        futures.ThreadPoolExecutor(max_workers=10),
+        options=[("grpc.so_reuseport", 1 if reuse_port else 0)],
+    )
+    audit_pb2_grpc.add_AuditServiceServicer_to_server(
+        servicer or AuditServicer(), server
+    )
     server_address = f"{host}:{port}"
     server.add_insecure_port(server_address)
     await server.start()
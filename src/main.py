@@ -1,7 +1,14 @@
 import asyncio
 import logging
+import multiprocessing
+import os
 import signal
+import threading
 from core.server import serve
+from common.http_pool import close_session
+from common.interrupt_router import interrupt_router
+from common.metrics import metrics_server
+from common.pull_request_watcher import pull_request_watcher
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -9,21 +16,36 @@ load_dotenv()
 SERVICE_NAME = "service-dashboard-hypnos"
 GRPC_SERVER_HOST = "[::1]"
 GRPC_SERVER_PORT = 50051
+GRPC_WORKERS = int(os.getenv("GRPC_WORKERS", "1"))
+WORKER_SHUTDOWN_TIMEOUT = float(os.getenv("WORKER_SHUTDOWN_TIMEOUT", "15"))
+WORKER_RESTART_DELAY = 1
 
 
-async def shutdown(server, loop):
+async def shutdown(server):
     logging.info("application stopped.")
     await server.stop(5)
+    await pull_request_watcher.stop()
+    await metrics_server.stop()
+    await interrupt_router.stop()
+    await close_session()
     tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
     [task.cancel() for task in tasks]
     await asyncio.gather(*tasks, return_exceptions=True)
-    loop.stop()
 
 
-async def main():
+async def main(worker_index=0, inboxes=None):
     loop = asyncio.get_running_loop()
 
-    server = await serve(GRPC_SERVER_HOST, GRPC_SERVER_PORT)
+    server = await serve(
+        GRPC_SERVER_HOST, GRPC_SERVER_PORT, reuse_port=inboxes is not None
+    )
+    if inboxes is not None:
+        interrupt_router.start(worker_index, inboxes)
+    # A webhook delivery can only reach one process, so only the first
+    # worker receives them. The other workers rely on polling.
+    await pull_request_watcher.start(webhook=worker_index == 0)
+    # Each worker keeps its own metrics, served on its own port.
+    await metrics_server.start(port_offset=worker_index)
 
     logging.info(f"{SERVICE_NAME}")
     logging.info(f"server listening at http://[::1]:{GRPC_SERVER_PORT}")
@@ -44,9 +66,72 @@ async def main():
     try:
         await shutdown_event.wait()
     finally:
-        await shutdown(server, loop)
+        await shutdown(server)
+
+
+def run_worker(worker_index, inboxes):
+    logging.basicConfig(
+        level=logging.INFO, format="%(levelname)s:%(processName)s:%(message)s"
+    )
+    asyncio.run(main(worker_index, inboxes))
+
+
+def supervise(workers):
+    """Runs ``workers`` server processes sharing the gRPC port.
+
+    Every worker binds the port with SO_REUSEPORT and keeps its own
+    in-memory caches, jobs, admission limits and shared flights, while the
+    disk caches are shared. Interrupts reach the worker running the job
+    through the inboxes of the interrupt router. Workers that exit
+    unexpectedly are restarted. On SIGINT or SIGTERM the workers get
+    SIGTERM, which runs their own graceful shutdown, and are killed if
+    they are still running after WORKER_SHUTDOWN_TIMEOUT.
+    """
+    context = multiprocessing.get_context("spawn")
+    stopping = threading.Event()
+    # Created here so a restarted worker reads the inbox of the one it replaces.
+    inboxes = [context.Queue() for _ in range(workers)]
+
+    def start_worker(worker_index):
+        process = context.Process(
+            target=run_worker,
+            args=(worker_index, inboxes),
+            name=f"worker-{worker_index}",
+        )
+        process.start()
+        return process
+
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda s, f: stopping.set())
+
+    processes = [start_worker(worker_index) for worker_index in range(workers)]
+    logging.info(f"{SERVICE_NAME} supervising {workers} workers")
+
+    while not stopping.wait(WORKER_RESTART_DELAY):
+        for worker_index, process in enumerate(processes):
+            if not process.is_alive():
+                logging.error(
+                    f"worker-{worker_index} exited with code {process.exitcode}, "
+                    "restarting"
+                )
+                processes[worker_index] = start_worker(worker_index)
+
+    logging.info("stopping workers.")
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+    for process in processes:
+        process.join(WORKER_SHUTDOWN_TIMEOUT)
+        if process.is_alive():
+            logging.warning(f"{process.name} did not stop in time, killing it")
+            process.kill()
+            process.join()
+    logging.info("application stopped.")
 
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO)
-    asyncio.run(main())
+    if GRPC_WORKERS > 1:
+        supervise(GRPC_WORKERS)
+    else:
+        asyncio.run(main())
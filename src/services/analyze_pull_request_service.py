@@ -1,10 +1,10 @@
-import asyncio
 import logging
+from common.analysis import stream_analysis, stream_pull_request_analysis
+from common.exceptions import DeadlineReachedError
+from common.github_client import GitHubClient
 from common.interruptible import Interruptible
+from common.jobs import stage
 from langchain_anthropic import ChatAnthropic
-from langchain.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnablePassthrough
 from typing import Mapping, Any
 
 
@@ -18,7 +18,9 @@ class AnalyzePullRequestService(Interruptible):
             # max_tokens_to_sample=4000
         )
 
-    async def process(self, id_work, id_repository, id_pull_request, code_dump):
+    async def process(
+        self, id_work, id_repository, id_pull_request, code_dump, github_token=None
+    ):
         try:
             yield {
                 "id_work": id_work,
@@ -36,69 +38,46 @@ class AnalyzePullRequestService(Interruptible):
                 "process_status": "in_progress",
             }
 
-            prompt = ChatPromptTemplate.from_template(
-                """
-            You are an expert software engineer and code analyst. Your task is to provide a comprehensive and in-depth analysis of the following source code and the author. Be thorough, detailed, and insightful in your analysis.
-
-            Source Code:
-            {code}
-
-            Please provide a detailed analysis covering the following aspects:
-
-            1. Overall Architecture and Structure:
-               - Describe the high-level architecture of the codebase.
-               - Identify design patterns used and evaluate their appropriateness.
-               - Assess the modularity and organization of the code.
-
-            2. Main Components and Modules:
-               - List and describe the primary components or modules.
-               - Explain the responsibilities and interactions of each component.
-               - Evaluate the separation of concerns and cohesion within the codebase.
-
-            3. Key Functionalities:
-               - Identify and explain the main features or functionalities implemented.
-               - Analyze the implementation approach for each key functionality.
-               - Assess the efficiency and effectiveness of the implementations.
-
-            4. Code Quality and Best Practices:
-               - Evaluate adherence to coding standards and best practices.
-               - Identify areas where SOLID principles are followed or violated.
-               - Assess the readability, maintainability, and scalability of the code.
-
-            5. Security Analysis:
-               - Identify potential security vulnerabilities or risks.
-               - Suggest security best practices that should be implemented.
-               - Evaluate handling of sensitive data, if applicable.
-
-            6. Programmer Profile Analysis:
-                - Guess the programmer's potential background or specialization areas.
-                - Guess the programmer favorite IDE.
-                - Guess the programmer favorite linux or unix distro.
-                - Guess the programmer favorite clothe's colors and sci-fi movie.
-
-            Please provide your analysis in a clear, structured format.
-
-                """
-            )
-
-            chain = (
-                {"code": RunnablePassthrough()}
-                | prompt
-                | self.chat_model
-                | StrOutputParser()
-            )
-
-            analysis_result = await asyncio.to_thread(chain.invoke, code_dump)
+            if github_token:
+                with stage("pull_request"):
+                    analysis = await self.get_pull_request_analysis(
+                        id_repository, id_pull_request, code_dump, github_token
+                    )
+            else:
+                analysis = stream_analysis(self.chat_model, code_dump)
+
+            parts = []
+            truncated = False
+            try:
+                with stage("analyze"):
+                    async for delta in self.iterate_until_deadline(
+                        self.iterate_interruptible(analysis)
+                    ):
+                        parts.append(delta)
+                        yield {
+                            "id_work": id_work,
+                            "id_repository": id_repository,
+                            "id_pull_request": id_pull_request,
+                            "process_status": "in_progress",
+                            "result": delta,
+                        }
+            except DeadlineReachedError:
+                logging.warning(f"Deadline reached, truncating analysis {id_work}")
+                truncated = True
+            analysis_result = "".join(parts)
 
             await self.check_interruption()
 
-            yield {
+            response = {
                 "id_work": id_work,
                 "id_repository": id_repository,
                 "id_pull_request": id_pull_request,
                 "process_status": "completed",
                 "result": analysis_result,
             }
+            if truncated:
+                response["truncated"] = True
+            yield response
 
         except InterruptedError:
             yield {
@@ -116,3 +95,21 @@ class AnalyzePullRequestService(Interruptible):
                 "process_status": "error",
                 "error_message": str(e),
             }
+
+    async def get_pull_request_analysis(
+        self, id_repository, id_pull_request, code_dump, github_token
+    ):
+        async with GitHubClient(github_token) as github_client:
+            repo = await github_client.get_repository(id_repository)
+            await self.check_interruption()
+            pull_request = await github_client.get_pull_request(
+                repo["full_name"], id_pull_request
+            )
+            await self.check_interruption()
+            files = await github_client.get_pull_request_files(
+                repo["full_name"], id_pull_request
+            )
+        await self.check_interruption()
+        return stream_pull_request_analysis(
+            self.chat_model, pull_request, files, code_dump
+        )
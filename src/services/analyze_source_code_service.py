@@ -1,10 +1,13 @@
 import asyncio
+import hashlib
 import logging
+from common.analysis import stream_cached_analysis
+from common.exceptions import DeadlineReachedError
 from common.interruptible import Interruptible
+from common.jobs import stage
+from common.result_cache import result_cache
+from common.single_flight import single_flight
 from langchain_anthropic import ChatAnthropic
-from langchain.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnablePassthrough
 from typing import Mapping, Any
 
 
@@ -18,7 +21,7 @@ class AnalyzeSourceCodeService(Interruptible):
             # max_tokens_to_sample=4000
         )
 
-    async def process(self, id_work, id_repository, code_dump):
+    async def process(self, id_work, id_repository, code_dump, analysis_mode=""):
         try:
             yield {
                 "id_work": id_work,
@@ -34,68 +37,38 @@ class AnalyzeSourceCodeService(Interruptible):
                 "process_status": "in_progress",
             }
 
-            prompt = ChatPromptTemplate.from_template(
-                """
-            You are an expert software engineer and code analyst. Your task is to provide a comprehensive and in-depth analysis of the following source code and the author. Be thorough, detailed, and insightful in your analysis.
-
-            Source Code:
-            {code}
-
-            Please provide a detailed analysis covering the following aspects:
-
-            1. Overall Architecture and Structure:
-               - Describe the high-level architecture of the codebase.
-               - Identify design patterns used and evaluate their appropriateness.
-               - Assess the modularity and organization of the code.
-
-            2. Main Components and Modules:
-               - List and describe the primary components or modules.
-               - Explain the responsibilities and interactions of each component.
-               - Evaluate the separation of concerns and cohesion within the codebase.
-
-            3. Key Functionalities:
-               - Identify and explain the main features or functionalities implemented.
-               - Analyze the implementation approach for each key functionality.
-               - Assess the efficiency and effectiveness of the implementations.
-
-            4. Code Quality and Best Practices:
-               - Evaluate adherence to coding standards and best practices.
-               - Identify areas where SOLID principles are followed or violated.
-               - Assess the readability, maintainability, and scalability of the code.
-
-            5. Security Analysis:
-               - Identify potential security vulnerabilities or risks.
-               - Suggest security best practices that should be implemented.
-               - Evaluate handling of sensitive data, if applicable.
-
-            6. Programmer Profile Analysis:
-                - Guess the programmer's potential background or specialization areas.
-                - Guess the programmer favorite IDE.
-                - Guess the programmer favorite linux or unix distro.
-                - Guess the programmer favorite clothe's colors and sci-fi movie.
-
-            Please provide your analysis in a clear, structured format.
-
-                """
+            dump_hash = await asyncio.to_thread(
+                lambda: hashlib.sha256(
+                    code_dump.encode("utf-8", errors="surrogatepass")
+                ).hexdigest()
             )
-
-            chain = (
-                {"code": RunnablePassthrough()}
-                | prompt
-                | self.chat_model
-                | StrOutputParser()
-            )
-
-            analysis_result = await asyncio.to_thread(chain.invoke, code_dump)
-
-            await self.check_interruption()
-
-            yield {
-                "id_work": id_work,
-                "id_repository": id_repository,
-                "process_status": "completed",
-                "result": analysis_result,
-            }
+            # Identical analyses requested while one runs share its messages.
+            parts = []
+            try:
+                async for response in self.iterate_until_deadline(
+                    self.iterate_interruptible(
+                        single_flight.join(
+                            ("analysis", dump_hash, analysis_mode),
+                            lambda: self.run_analysis(
+                                id_work, id_repository, code_dump, analysis_mode
+                            ),
+                            id_work=id_work,
+                            id_repository=id_repository,
+                        )
+                    )
+                ):
+                    if response["process_status"] == "in_progress":
+                        parts.append(response["result"])
+                    yield response
+            except DeadlineReachedError:
+                logging.warning(f"Deadline reached, truncating analysis {id_work}")
+                yield {
+                    "id_work": id_work,
+                    "id_repository": id_repository,
+                    "process_status": "completed",
+                    "result": "".join(parts),
+                    "truncated": True,
+                }
 
         except InterruptedError:
             yield {
@@ -111,3 +84,27 @@ class AnalyzeSourceCodeService(Interruptible):
                 "process_status": "error",
                 "error_message": str(e),
             }
+
+    async def run_analysis(self, id_work, id_repository, code_dump, analysis_mode):
+        parts = []
+        with stage("analyze"):
+            async for delta in stream_cached_analysis(
+                self.chat_model, code_dump, result_cache, analysis_mode
+            ):
+                parts.append(delta)
+                yield {
+                    "id_work": id_work,
+                    "id_repository": id_repository,
+                    "process_status": "in_progress",
+                    "result": delta,
+                }
+        analysis_result = "".join(parts)
+
+        await self.check_interruption()
+
+        yield {
+            "id_work": id_work,
+            "id_repository": id_repository,
+            "process_status": "completed",
+            "result": analysis_result,
+        }
@@ -1,18 +1,225 @@
 import asyncio
-import aiohttp
+import contextvars
+import functools
+import hashlib
 import logging
+import os
+import time
+from collections import OrderedDict, deque
+from common import metrics
 from common.github_client import GitHubClient
 from common.interruptible import Interruptible
+from common.jobs import stage
+from common.blob_store import blob_store
+from common.content_sniff import SNIFF_BYTES, SNIFF_VERSION, sniff
+from common.download_scheduler import download_scheduler
+from common.dump_cache import dump_cache
+from common.dump_shaping import shape_dump, shaping_hash
+from common.exceptions import ContentRejectedError, DeadlineReachedError
+from common.dump_format import (
+    DumpChunker,
+    FILE_SEPARATOR,
+    describe_dump,
+    encoded_size,
+    format_file,
+    parse_dump,
+)
 from common.fetch_raw_code import fetch_raw_code
+from common.path_filter import PathFilter
+from common.single_flight import single_flight
+from common.tar_stream import TarStreamReader
+from dotenv import load_dotenv
+
+load_dotenv()
+
+ARCHIVE_MODE_MIN_FILES = int(os.getenv("DUMP_ARCHIVE_MIN_FILES", "300"))
+ARCHIVE_MODE_MIN_BYTES = int(os.getenv("DUMP_ARCHIVE_MIN_BYTES", str(16 * 1024 * 1024)))
+COMPARE_MAX_FILES = 300
+DUMP_STREAM_CHUNK_SIZE = int(os.getenv("DUMP_STREAM_CHUNK_SIZE", str(512 * 1024)))
+DUMP_TOKEN_BUDGET = int(os.getenv("DUMP_TOKEN_BUDGET", "0"))
+DUMP_MAX_FILE_BYTES = int(os.getenv("DUMP_MAX_FILE_BYTES", str(1024 * 1024)))
+DUMP_MAX_TOTAL_BYTES = int(os.getenv("DUMP_MAX_TOTAL_BYTES", str(256 * 1024 * 1024)))
+REPOSITORY_METADATA_TTL = float(os.getenv("REPOSITORY_METADATA_TTL", "300"))
+REPOSITORY_METADATA_ENTRIES = int(os.getenv("REPOSITORY_METADATA_ENTRIES", "1024"))
+
+github_client_var = contextvars.ContextVar("github_client")
+path_filter_var = contextvars.ContextVar("path_filter")
+
+DUMP_FILES = metrics.registry.counter(
+    "hypnos_dump_files_total",
+    "Files added to dumps, by source: download, archive or blob_store.",
+    ["source"],
+)
+DUMP_BYTES = metrics.registry.counter(
+    "hypnos_dump_bytes_total",
+    "Bytes of the files added to dumps, by source.",
+    ["source"],
+)
+DUMP_SKIPPED = metrics.registry.counter(
+    "hypnos_dump_skipped_files_total",
+    "Files left out of dumps, by reason: too_large, total_cap, binary, "
+    "generated or minified.",
+    ["reason"],
+)
+
+CODE_EXTENSIONS = {
+    ".js",
+    ".ts",
+    ".jsx",
+    ".tsx",
+    ".html",
+    ".css",
+    ".scss",
+    ".sass",
+    ".less",
+    ".py",
+    ".pyx",
+    ".pyi",
+    ".pyw",
+    ".java",
+    ".kt",
+    ".kts",
+    ".groovy",
+    ".scala",
+    ".c",
+    ".cpp",
+    ".cxx",
+    ".h",
+    ".hpp",
+    ".hxx",
+    ".cs",
+    ".rb",
+    ".erb",
+    ".rake",
+    ".php",
+    ".phtml",
+    ".go",
+    ".rs",
+    ".swift",
+    ".m",
+    ".mm",
+    ".ex",
+    ".exs",
+    ".sh",
+    ".bash",
+    ".zsh",
+    ".lua",
+    ".pl",
+    ".pm",
+    ".hs",
+    ".lhs",
+    ".r",
+    ".R",
+    ".dart",
+    ".kt",
+    ".kts",
+    ".ts",
+    ".tsx",
+    ".vb",
+    ".fs",
+    ".fsx",
+    ".clj",
+    ".cljs",
+    ".cljc",
+    ".md",
+    ".markdown",
+}
+
+SKIP_DIRECTORIES = {
+    "__pycache__",
+    "node_modules",
+    ".git",
+    ".svn",
+    ".hg",
+    ".idea",
+    ".vscode",
+    "build",
+    "dist",
+    "target",
+    "bin",
+    "obj",
+    "vendor",
+    "venv",
+    "env",
+    ".env",
+    ".venv",
+    "out",
+    "output",
+    "tmp",
+    "temp",
+    "cache",
+    ".cache",
+    "logs",
+    "log",
+    "coverage",
+    "public",
+    "assets",
+    "images",
+    "img",
+    "fonts",
+    "docs",
+}
+
+
+def filter_hash(path_filter):
+    """Identifies what a dump selects, for its cache key."""
+    return hashlib.sha256(
+        repr(
+            (
+                path_filter.key,
+                DUMP_MAX_FILE_BYTES,
+                DUMP_MAX_TOTAL_BYTES,
+                SNIFF_VERSION,
+            )
+        ).encode()
+    ).hexdigest()
+
+
+def capped_key(dump_id):
+    """Cache key of the list of files ``DUMP_MAX_TOTAL_BYTES`` cut from the
+    dump ``dump_id``, stored next to every cached dump."""
+    return dump_cache.make_key(
+        dump_cache.commit_of(dump_id),
+        hashlib.sha256(f"{dump_id}:capped".encode()).hexdigest(),
+    )
 
 
 class DumpSourceCodeService(Interruptible):
     def __init__(self):
         super().__init__()
-        self.github_client = None
+        self.repositories = OrderedDict()
+
+    @property
+    def github_client(self):
+        """The GitHub client of the job being run, set by ``process``."""
+        return github_client_var.get()
+
+    @property
+    def path_filter(self):
+        """The PathFilter of the job being run, set by ``process``."""
+        return path_filter_var.get()
 
-    async def process(self, id_work, id_repository, github_token):
-        async with GitHubClient(github_token) as self.github_client:
+    async def process(
+        self,
+        id_work,
+        id_repository,
+        github_token,
+        base_commit=None,
+        base_dump_id=None,
+        stream_chunks=False,
+        store_only=False,
+        token_budget=None,
+        path_rules=(),
+        use_gitattributes=False,
+    ):
+        token_budget = token_budget or DUMP_TOKEN_BUDGET
+        path_filter = PathFilter(
+            CODE_EXTENSIONS, SKIP_DIRECTORIES, path_rules, use_gitattributes
+        )
+        path_filter_var.set(path_filter)
+        dump_filter_hash = filter_hash(path_filter)
+        async with GitHubClient(github_token) as github_client:
+            github_client_var.set(github_client)
             try:
                 yield {
                     "id_work": id_work,
@@ -28,30 +235,56 @@ class DumpSourceCodeService(Interruptible):
                     "process_status": "in_progress",
                 }
 
-                repo = await self.github_client.get_repository(id_repository)
-                await self.check_interruption()
+                with stage("resolve"):
+                    repo = await self.get_repository(id_repository)
+                    await self.check_interruption()
 
-                contents = await self.github_client.get_repository_contents(
-                    repo["full_name"]
-                )
+                    commit_sha = await self.resolve_head_commit(repo)
+                    await self.check_interruption()
 
-                await self.check_interruption()
+                dump_id = dump_cache.make_key(commit_sha, dump_filter_hash)
+                if base_commit and not base_dump_id:
+                    base_dump_id = dump_cache.make_key(base_commit, dump_filter_hash)
+                elif base_dump_id and dump_cache.is_valid_key(base_dump_id):
+                    # Shaped dump ids name their commit too, but incremental
+                    # dumps build on the full dump of that commit.
+                    base_dump_id = dump_cache.make_key(
+                        dump_cache.commit_of(base_dump_id), dump_filter_hash
+                    )
 
-                download_list = await self.get_download_list(
-                    repo["full_name"], contents
+                start = functools.partial(
+                    self.run_dump,
+                    id_work,
+                    id_repository,
+                    repo["full_name"],
+                    commit_sha,
+                    dump_id,
+                    base_dump_id,
+                    stream_chunks,
+                    store_only,
+                    token_budget,
                 )
-
-                await self.check_interruption()
-
-                code_dump = await self.fetch_and_process_files(download_list)
-                await self.check_interruption()
-
-                yield {
-                    "id_work": id_work,
-                    "id_repository": id_repository,
-                    "process_status": "completed",
-                    "code_dump": code_dump,
-                }
+                if stream_chunks:
+                    # Streamed dumps are not shared: late joiners would need
+                    # every chunk kept for replay, the whole dump in memory.
+                    messages = start()
+                else:
+                    # Identical dumps requested while one runs share its
+                    # messages.
+                    messages = single_flight.join(
+                        (
+                            "dump",
+                            id_repository,
+                            dump_id,
+                            base_dump_id,
+                            store_only,
+                            token_budget,
+                        ),
+                        start,
+                        id_work=id_work,
+                    )
+                async for response in self.iterate_interruptible(messages):
+                    yield response
             except InterruptedError:
                 yield {
                     "id_work": id_work,
@@ -67,22 +300,644 @@ class DumpSourceCodeService(Interruptible):
                     "error_message": str(e),
                 }
 
-    async def get_download_list(self, repo_full_name, contents):
+    async def run_dump(
+        self,
+        id_work,
+        id_repository,
+        repo_full_name,
+        commit_sha,
+        dump_id,
+        base_dump_id,
+        stream_chunks,
+        store_only,
+        token_budget=0,
+    ):
+        if token_budget:
+            async for response in self.run_shaped_dump(
+                id_work,
+                id_repository,
+                repo_full_name,
+                commit_sha,
+                dump_id,
+                base_dump_id,
+                stream_chunks,
+                store_only,
+                token_budget,
+            ):
+                yield response
+            return
+
+        if stream_chunks:
+            chunker = DumpChunker(DUMP_STREAM_CHUNK_SIZE)
+            outcome = {"stored": False, "capped": []}
+            chunks = self.stream_dump(
+                id_work,
+                repo_full_name,
+                commit_sha,
+                dump_id,
+                base_dump_id,
+                chunker,
+                outcome,
+            )
+            truncated = False
+            try:
+                async for sequence, chunk in self.iterate_until_deadline(chunks):
+                    yield {
+                        "id_work": id_work,
+                        "id_repository": id_repository,
+                        "process_status": "in_progress",
+                        "chunk": chunk,
+                        "sequence": sequence,
+                    }
+            except DeadlineReachedError:
+                logging.warning(f"Deadline reached, truncating dump {dump_id}")
+                truncated = True
+                for sequence, chunk in chunker.flush():
+                    yield {
+                        "id_work": id_work,
+                        "id_repository": id_repository,
+                        "process_status": "in_progress",
+                        "chunk": chunk,
+                        "sequence": sequence,
+                    }
+            await self.check_interruption()
+
+            response = {
+                "id_work": id_work,
+                "id_repository": id_repository,
+                "process_status": "completed",
+                "commit_sha": commit_sha,
+                "manifest": chunker.manifest(),
+            }
+            if truncated or outcome["capped"]:
+                response["truncated"] = True
+            if outcome["capped"]:
+                response["omitted_files"] = outcome["capped"]
+            if outcome["stored"]:
+                response["dump_id"] = dump_id
+            yield response
+            return
+
+        with stage("cache"):
+            code_dump, capped = await self.get_cached_dump(dump_id)
+        stored = code_dump is not None
+        truncated = False
+        if not stored:
+            code_dump, stored, truncated, capped = await self.build_dump(
+                id_work, repo_full_name, commit_sha, dump_id, base_dump_id
+            )
+        await self.check_interruption()
+
+        yield await self.completed_response(
+            id_work,
+            id_repository,
+            commit_sha,
+            dump_id,
+            code_dump,
+            stored,
+            truncated or bool(capped),
+            store_only,
+            capped,
+        )
+
+    async def run_shaped_dump(
+        self,
+        id_work,
+        id_repository,
+        repo_full_name,
+        commit_sha,
+        dump_id,
+        base_dump_id,
+        stream_chunks,
+        store_only,
+        token_budget,
+    ):
+        """Responds with the dump fitted to ``token_budget`` tokens.
+
+        Shaped dumps and the list of the files they leave out are cached
+        under their own keys, next to the full dump they are cut from. The
+        files the total cap cut from that dump are reported with them.
+        """
+        shaped_id = dump_cache.make_key(commit_sha, shaping_hash(dump_id, token_budget))
+        omitted_id = dump_cache.make_key(
+            commit_sha, shaping_hash(dump_id, token_budget, "omitted")
+        )
+        with stage("cache"):
+            shaped_dump, capped = await self.get_cached_dump(shaped_id)
+            omitted = None
+            if shaped_dump is not None:
+                omitted = await asyncio.to_thread(dump_cache.get, omitted_id)
+        stored = omitted is not None
+        truncated = False
+        if stored:
+            omitted_files = omitted.split("\n") if omitted else []
+        else:
+            with stage("cache"):
+                code_dump, capped = await self.get_cached_dump(dump_id)
+            stored = code_dump is not None
+            if not stored:
+                code_dump, stored, truncated, capped = await self.build_dump(
+                    id_work, repo_full_name, commit_sha, dump_id, base_dump_id
+                )
+            await self.check_interruption()
+
+            with stage("shape"):
+                shaped_dump, omitted_files = await asyncio.to_thread(
+                    shape_dump, code_dump, token_budget
+                )
+            if stored:
+                with stage("store"):
+                    await asyncio.to_thread(
+                        dump_cache.put, omitted_id, "\n".join(omitted_files)
+                    )
+                    await self.store_dump(shaped_id, shaped_dump, capped)
+        logging.info(
+            f"Shaped dump {shaped_id} to {token_budget} tokens, "
+            f"omitting {len(omitted_files)} files"
+        )
+
+        if not stream_chunks:
+            response = await self.completed_response(
+                id_work,
+                id_repository,
+                commit_sha,
+                shaped_id,
+                shaped_dump,
+                stored,
+                truncated or bool(capped),
+                store_only,
+                omitted_files + capped,
+            )
+            yield response
+            return
+
+        chunker = DumpChunker(DUMP_STREAM_CHUNK_SIZE)
+        async for path, section in self.iter_cached_sections(shaped_dump):
+            for sequence, chunk in chunker.add(path, section):
+                yield {
+                    "id_work": id_work,
+                    "id_repository": id_repository,
+                    "process_status": "in_progress",
+                    "chunk": chunk,
+                    "sequence": sequence,
+                }
+        for sequence, chunk in chunker.flush():
+            yield {
+                "id_work": id_work,
+                "id_repository": id_repository,
+                "process_status": "in_progress",
+                "chunk": chunk,
+                "sequence": sequence,
+            }
+        await self.check_interruption()
+
+        response = {
+            "id_work": id_work,
+            "id_repository": id_repository,
+            "process_status": "completed",
+            "commit_sha": commit_sha,
+            "manifest": chunker.manifest(),
+            "omitted_files": omitted_files + capped,
+        }
+        if truncated or capped:
+            response["truncated"] = True
+        if stored:
+            response["dump_id"] = shaped_id
+        yield response
+
+    async def completed_response(
+        self,
+        id_work,
+        id_repository,
+        commit_sha,
+        dump_id,
+        code_dump,
+        stored,
+        truncated,
+        store_only,
+        omitted_files=(),
+    ):
+        response = {
+            "id_work": id_work,
+            "id_repository": id_repository,
+            "process_status": "completed",
+            "commit_sha": commit_sha,
+        }
+        with stage("describe"):
+            response.update(await asyncio.to_thread(describe_dump, code_dump))
+        if truncated:
+            response["truncated"] = True
+        if omitted_files:
+            response["omitted_files"] = list(omitted_files)
+        if stored:
+            response["dump_id"] = dump_id
+        if not (store_only and stored):
+            response["code_dump"] = code_dump
+        return response
+
+    async def get_repository(self, id_repository):
+        """Repository metadata, reused only by the token that fetched it.
+
+        Entries are kept in fetch order, so expired ones are purged from the
+        front, and at most REPOSITORY_METADATA_ENTRIES are kept.
+        """
+        token_hash = hashlib.sha256(
+            (self.github_client.token or "").encode()
+        ).hexdigest()
+        key = (token_hash, id_repository)
+        cached = self.repositories.get(key)
+        if cached and time.monotonic() - cached[1] < REPOSITORY_METADATA_TTL:
+            return cached[0]
+        repo = await self.github_client.get_repository(id_repository)
+
+        now = time.monotonic()
+        self.repositories.pop(key, None)
+        self.repositories[key] = (repo, now)
+        while self.repositories:
+            _, (_, fetched_at) = next(iter(self.repositories.items()))
+            if (
+                now - fetched_at < REPOSITORY_METADATA_TTL
+                and len(self.repositories) <= REPOSITORY_METADATA_ENTRIES
+            ):
+                break
+            self.repositories.popitem(last=False)
+        return repo
+
+    async def resolve_head_commit(self, repo):
+        branch = await self.github_client.get_branch(
+            repo["full_name"], repo["default_branch"]
+        )
+        return branch["commit"]["sha"]
+
+    async def get_cached_dump(self, dump_id):
+        """Returns a cached dump and the files the total cap cut from it, or
+        ``(None, None)`` unless both are cached."""
+        capped = await asyncio.to_thread(dump_cache.get, capped_key(dump_id))
+        if capped is None:
+            return None, None
+        code_dump = await asyncio.to_thread(dump_cache.get, dump_id)
+        if code_dump is None:
+            return None, None
+        return code_dump, capped.split("\n") if capped else []
+
+    async def store_dump(self, dump_id, code_dump, capped):
+        await asyncio.to_thread(dump_cache.put, capped_key(dump_id), "\n".join(capped))
+        await asyncio.to_thread(dump_cache.put, dump_id, code_dump)
+
+    async def build_dump(
+        self, id_work, repo_full_name, commit_sha, dump_id, base_dump_id=None
+    ):
+        """Returns ``(code_dump, stored, truncated, capped)``.
+
+        When the deadline of the job comes first, the files collected so
+        far make up a truncated dump, which is not stored. ``capped`` lists
+        the files ``DUMP_MAX_TOTAL_BYTES`` left out, which does not prevent
+        storing the dump.
+        """
+        sections = []
+        capped = []
+        missing = 0
+        truncated = False
+        try:
+            async for _, section in self.iterate_until_deadline(
+                self.iter_sections(
+                    id_work, repo_full_name, commit_sha, base_dump_id, capped
+                )
+            ):
+                if section is None:
+                    missing += 1
+                elif section:
+                    sections.append(section)
+        except DeadlineReachedError:
+            logging.warning(
+                f"Deadline reached, truncating dump {dump_id} "
+                f"after {len(sections)} files"
+            )
+            truncated = True
+        code_dump = FILE_SEPARATOR.join(sections)
+
+        if missing:
+            logging.warning(f"{missing} files could not be downloaded")
+        if missing or truncated:
+            return code_dump, False, truncated, capped
+        with stage("store"):
+            await self.store_dump(dump_id, code_dump, capped)
+        return code_dump, True, False, capped
+
+    async def stream_dump(
+        self,
+        id_work,
+        repo_full_name,
+        commit_sha,
+        dump_id,
+        base_dump_id,
+        chunker,
+        outcome,
+    ):
+        """Yields the chunks of a dump, from the cache or built and cached as
+        it streams. ``outcome["stored"]`` tells whether the dump is cached
+        once the chunks are exhausted, and ``outcome["capped"]`` lists the
+        files the total cap left out."""
+        code_dump, capped = await self.get_cached_dump(dump_id)
+        if code_dump is not None:
+            sections = self.iter_cached_sections(code_dump)
+            writer = None
+            outcome["stored"] = True
+            outcome["capped"] = capped
+        else:
+            sections = self.iter_sections(
+                id_work, repo_full_name, commit_sha, base_dump_id, outcome["capped"]
+            )
+            writer = await asyncio.to_thread(dump_cache.open_writer, dump_id)
+
+        missing = 0
+        finished = False
+        try:
+            async for path, section in sections:
+                if section is None:
+                    missing += 1
+                    continue
+                if not section:
+                    continue
+                for sequence, chunk in chunker.add(path, section):
+                    if writer:
+                        await asyncio.to_thread(writer.write, chunk)
+                    yield sequence, chunk
+            for sequence, chunk in chunker.flush():
+                if writer:
+                    await asyncio.to_thread(writer.write, chunk)
+                yield sequence, chunk
+            finished = True
+        finally:
+            if writer and finished and not missing:
+                await asyncio.to_thread(
+                    dump_cache.put, capped_key(dump_id), "\n".join(outcome["capped"])
+                )
+                outcome["stored"] = await asyncio.to_thread(writer.commit)
+            elif writer:
+                writer.abort()
+
+        if missing:
+            logging.warning(f"{missing} files could not be downloaded")
+
+    async def iter_cached_sections(self, code_dump):
+        for path, text in parse_dump(code_dump):
+            yield path, format_file(path, text)
+
+    async def iter_sections(
+        self, id_work, repo_full_name, commit_sha, base_dump_id, capped
+    ):
+        """Yields the ``(path, section)`` pairs of a dump, stopping, and so
+        cancelling the downloads in flight, once the UTF-8 size of the
+        sections reaches ``DUMP_MAX_TOTAL_BYTES``. The files the cap leaves
+        out are added to ``capped``."""
+        listed = []
+        seen = set()
+        total = 0
+        async for path, section in self.iter_uncapped_sections(
+            id_work, repo_full_name, commit_sha, base_dump_id, listed, capped
+        ):
+            if section:
+                total += encoded_size(section)
+                if DUMP_MAX_TOTAL_BYTES and total > DUMP_MAX_TOTAL_BYTES:
+                    cut = [other for other in listed if other not in seen]
+                    DUMP_SKIPPED.inc(len(cut), reason="total_cap")
+                    logging.warning(
+                        f"Dump of {repo_full_name} reached {DUMP_MAX_TOTAL_BYTES} "
+                        f"bytes, leaving out {path} and {len(cut) - 1} files after it"
+                    )
+                    capped[:0] = cut
+                    return
+            seen.add(path)
+            yield path, section
+
+    async def iter_uncapped_sections(
+        self, id_work, repo_full_name, commit_sha, base_dump_id, listed, capped
+    ):
+        """Yields the ``(path, section)`` pairs of a dump. The paths it may
+        yield are added to ``listed`` before the first section, and those
+        left out of the listing for the total cap to ``capped``."""
+        if self.path_filter.use_gitattributes:
+            await self.load_gitattributes(repo_full_name, commit_sha)
+
+        if base_dump_id:
+            base_dump, base_capped = await self.get_cached_dump(base_dump_id)
+            changed_files = None
+            if base_dump is None:
+                logging.info(f"Base dump {base_dump_id} is not cached, dumping in full")
+            elif base_capped:
+                logging.info(f"Base dump {base_dump_id} was capped, dumping in full")
+            else:
+                with stage("compare"):
+                    changed_files = await self.get_changed_files(
+                        repo_full_name, commit_sha, base_dump_id
+                    )
+            if changed_files is not None:
+                with stage("download"):
+                    async for path, section in self.iter_incremental_sections(
+                        id_work,
+                        repo_full_name,
+                        commit_sha,
+                        base_dump,
+                        changed_files,
+                        listed,
+                    ):
+                        yield path, section
+                return
+
+        with stage("list"):
+            download_list, cut = await self.get_download_list(
+                repo_full_name, commit_sha
+            )
+        capped.extend(cut)
+        listed.extend(item["path"] for item in download_list)
+        await self.check_interruption()
+
+        uncached = [item for item in download_list if item["sha"] not in blob_store]
+        if self.should_use_archive(uncached):
+            name = "archive"
+            sections = self.iter_archive_sections(
+                repo_full_name, commit_sha, {item["path"] for item in download_list}
+            )
+        else:
+            name = "download"
+            sections = self.iter_file_sections(id_work, download_list)
+        # Stage durations of streamed sections include the time the consumer
+        # spends between sections.
+        with stage(name):
+            async for path, section in sections:
+                yield path, section
+        logging.info(f"Blob store after dump of {repo_full_name}: {blob_store.stats()}")
+
+    async def load_gitattributes(self, repo_full_name, commit_sha):
+        try:
+            content = await fetch_raw_code(
+                self.github_client.session,
+                self.github_client.get_raw_url(
+                    repo_full_name, commit_sha, ".gitattributes"
+                ),
+                self.github_client.get_raw_headers(),
+                missing_ok=True,
+            )
+        except ContentRejectedError as e:
+            logging.warning(f"Ignoring .gitattributes of {repo_full_name}: {str(e)}")
+            return
+        if content:
+            self.path_filter.load_gitattributes(
+                content.decode("utf-8", errors="replace")
+            )
+
+    async def get_changed_files(self, repo_full_name, commit_sha, base_dump_id):
+        comparison = await self.github_client.compare_commits(
+            repo_full_name, dump_cache.commit_of(base_dump_id), commit_sha
+        )
+        changed_files = comparison.get("files", [])
+        if (
+            comparison["status"] not in ("ahead", "identical")
+            or len(changed_files) >= COMPARE_MAX_FILES
+        ):
+            logging.info(
+                f"Cannot diff {base_dump_id} against {commit_sha} "
+                f"(status {comparison['status']}, {len(changed_files)} files), "
+                "dumping in full"
+            )
+            return None
+        if self.path_filter.use_gitattributes and any(
+            changed["filename"] == ".gitattributes" for changed in changed_files
+        ):
+            logging.info(
+                f".gitattributes changed since {base_dump_id}, dumping in full"
+            )
+            return None
+        return changed_files
+
+    async def iter_incremental_sections(
+        self, id_work, repo_full_name, commit_sha, base_dump, changed_files, listed
+    ):
+        sections = {
+            path: format_file(path, text) for path, text in parse_dump(base_dump)
+        }
+        download_list = []
+        for changed in changed_files:
+            if changed["status"] == "renamed":
+                sections.pop(changed["previous_filename"], None)
+            if changed["status"] == "removed":
+                sections.pop(changed["filename"], None)
+            elif changed["status"] != "unchanged":
+                if not self.path_filter.include_file(changed["filename"]):
+                    sections.pop(changed["filename"], None)
+                    continue
+                sections[changed["filename"]] = None
+                download_list.append(
+                    {
+                        "path": changed["filename"],
+                        "sha": changed["sha"],
+                        "size": None,
+                        "download_url": self.github_client.get_raw_url(
+                            repo_full_name, commit_sha, changed["filename"]
+                        ),
+                    }
+                )
+        # Sections follow the path order of the new tree, as in a full dump,
+        # so that both dumps of a commit are the same.
+        paths = sorted(sections)
+        listed.extend(paths)
+        download_list.sort(key=lambda item: item["path"])
+
+        downloads = self.iter_file_sections(id_work, download_list)
+        try:
+            for path in paths:
+                section = sections[path]
+                if section is None:
+                    _, section = await downloads.__anext__()
+                yield path, section
+        finally:
+            await downloads.aclose()
+
+    async def get_download_list(self, repo_full_name, commit_sha):
+        tree = await self.github_client.get_tree(
+            repo_full_name, commit_sha, recursive=True
+        )
+        if not tree.get("truncated"):
+            return self.cap_download_list(
+                self.filter_tree_entries(repo_full_name, commit_sha, tree["tree"])
+            )
+
+        logging.warning(
+            f"Tree listing for {repo_full_name} is truncated, walking contents instead"
+        )
+        contents = await self.github_client.get_repository_contents(
+            repo_full_name, ref=commit_sha
+        )
         download_list = []
-        async for item in self.traverse_contents(repo_full_name, contents):
+        async for item in self.traverse_contents(repo_full_name, commit_sha, contents):
             if (
                 item["type"] == "file"
-                and "download_url" in item
-                and self.is_likely_text_file(item["path"])
+                and item.get("download_url")
+                and self.path_filter.include_file(item["path"])
             ):
                 download_list.append(
-                    {"path": item["path"], "download_url": item["download_url"]}
+                    {
+                        "path": item["path"],
+                        "sha": item["sha"],
+                        "size": item["size"],
+                        "download_url": item["download_url"],
+                    }
+                )
+        # Listed in the order of the tree listing, which is by path.
+        download_list.sort(key=lambda item: item["path"])
+        return self.cap_download_list(download_list)
+
+    @staticmethod
+    def cap_download_list(download_list):
+        """Drops the files over ``DUMP_MAX_FILE_BYTES`` and those past
+        ``DUMP_MAX_TOTAL_BYTES``, by their listed sizes, before any is
+        downloaded. Returns ``(kept, cut)``, ``cut`` being the paths of the
+        files past the total cap.
+
+        Sections are counted with their headers, as ``iter_sections`` counts
+        them, so its cap is not reached again by the files kept here.
+        """
+        kept = []
+        total = 0
+        for index, item in enumerate(download_list):
+            size = item["size"] or 0
+            if DUMP_MAX_FILE_BYTES and size > DUMP_MAX_FILE_BYTES:
+                DUMP_SKIPPED.inc(reason="too_large")
+                continue
+            total += size + encoded_size(format_file(item["path"], ""))
+            if DUMP_MAX_TOTAL_BYTES and total > DUMP_MAX_TOTAL_BYTES:
+                DUMP_SKIPPED.inc(len(download_list) - index, reason="total_cap")
+                logging.warning(
+                    f"Listed files exceed {DUMP_MAX_TOTAL_BYTES} bytes, "
+                    f"dumping the first {len(kept)}"
                 )
+                return kept, [item["path"] for item in download_list[index:]]
+            kept.append(item)
+        return kept, []
+
+    def filter_tree_entries(self, repo_full_name, commit_sha, entries):
+        download_list = []
+        for entry in entries:
+            if entry["type"] != "blob" or entry["mode"] == "120000":
+                continue
+            if not self.path_filter.include_file(entry["path"]):
+                continue
+            download_list.append(
+                {
+                    "path": entry["path"],
+                    "sha": entry["sha"],
+                    "size": entry.get("size", 0),
+                    "download_url": self.github_client.get_raw_url(
+                        repo_full_name, commit_sha, entry["path"]
+                    ),
+                }
+            )
         return download_list
 
-    async def traverse_contents(self, repo_full_name, contents):
+    async def traverse_contents(self, repo_full_name, commit_sha, contents):
         for item in contents:
-            if item["type"] == "dir" and self.should_skip_directory(item["path"]):
+            if item["type"] == "dir" and self.path_filter.skip_directory(item["path"]):
 
                 continue
 
@@ -90,10 +945,10 @@ class DumpSourceCodeService(Interruptible):
             if item["type"] == "dir":
                 try:
                     sub_contents = await self.github_client.get_repository_contents(
-                        repo_full_name, path=item["path"]
+                        repo_full_name, path=item["path"], ref=commit_sha
                     )
                     async for sub_item in self.traverse_contents(
-                        repo_full_name, sub_contents
+                        repo_full_name, commit_sha, sub_contents
                     ):
                         yield sub_item
                 except Exception as e:
@@ -101,126 +956,93 @@ class DumpSourceCodeService(Interruptible):
                         f"Error traversing directory {item['path']}: {str(e)}"
                     )
 
-    async def fetch_and_process_files(self, download_list):
-        async with aiohttp.ClientSession() as session:
-            tasks = [
-                self.fetch_and_format_file(session, item) for item in download_list
-            ]
-            results = await asyncio.gather(*tasks, return_exceptions=True)
-        return "\n\n".join(
-            filter(None, [r for r in results if not isinstance(r, Exception)])
+    @staticmethod
+    def should_use_archive(download_list):
+        total_size = sum(item["size"] for item in download_list)
+        return (
+            len(download_list) >= ARCHIVE_MODE_MIN_FILES
+            or total_size >= ARCHIVE_MODE_MIN_BYTES
         )
 
-    async def fetch_and_format_file(self, session, item):
-        try:
-            content = await fetch_raw_code(session, item["download_url"])
-            if content:
-                decoded_content = content.decode("utf-8", errors="replace")
-                return f"[FILE: {item['path']}]\n\n{decoded_content}\n\n[END OF FILE: {item['path']}]"
-        except Exception as e:
-            logging.warning(f"Error processing file {item['path']}: {str(e)}")
-        return None
+    async def iter_archive_sections(self, repo_full_name, commit_sha, paths):
+        reader = TarStreamReader(
+            accept=paths.__contains__,
+            strip_components=1,
+            max_size=DUMP_MAX_FILE_BYTES,
+        )
+        async for chunk in self.github_client.stream_repository_tarball(
+            repo_full_name, commit_sha
+        ):
+            for path, content in reader.feed(chunk):
+                # Skipped files are yielded empty, so they are not mistaken
+                # for files the total cap cut.
+                reason = sniff(content[:SNIFF_BYTES])
+                if reason:
+                    DUMP_SKIPPED.inc(reason=reason)
+                    blob_store.put(blob_store.blob_sha(content), "")
+                    yield path, ""
+                    continue
+                DUMP_FILES.inc(source="archive")
+                DUMP_BYTES.inc(len(content), source="archive")
+                text = content.decode("utf-8", errors="replace")
+                blob_store.put(blob_store.blob_sha(content), text)
+                yield path, format_file(path, text) if text else ""
+            await self.check_interruption()
 
-    @staticmethod
-    def is_likely_text_file(filename):
-        code_extensions = {
-            ".js",
-            ".ts",
-            ".jsx",
-            ".tsx",
-            ".html",
-            ".css",
-            ".scss",
-            ".sass",
-            ".less",
-            ".py",
-            ".pyx",
-            ".pyi",
-            ".pyw",
-            ".java",
-            ".kt",
-            ".kts",
-            ".groovy",
-            ".scala",
-            ".c",
-            ".cpp",
-            ".cxx",
-            ".h",
-            ".hpp",
-            ".hxx",
-            ".cs",
-            ".rb",
-            ".erb",
-            ".rake",
-            ".php",
-            ".phtml",
-            ".go",
-            ".rs",
-            ".swift",
-            ".m",
-            ".mm",
-            ".ex",
-            ".exs",
-            ".sh",
-            ".bash",
-            ".zsh",
-            ".lua",
-            ".pl",
-            ".pm",
-            ".hs",
-            ".lhs",
-            ".r",
-            ".R",
-            ".dart",
-            ".kt",
-            ".kts",
-            ".ts",
-            ".tsx",
-            ".vb",
-            ".fs",
-            ".fsx",
-            ".clj",
-            ".cljs",
-            ".cljc",
-            ".md",
-            ".markdown",
-        }
-        return any(filename.lower().endswith(ext) for ext in code_extensions)
+    async def iter_file_sections(self, id_work, download_list):
+        session = self.github_client.session
+        items = iter(download_list)
+        in_flight = deque()
 
-    @staticmethod
-    def should_skip_directory(directory_path):
-        skip_directories = {
-            "__pycache__",
-            "node_modules",
-            ".git",
-            ".svn",
-            ".hg",
-            ".idea",
-            ".vscode",
-            "build",
-            "dist",
-            "target",
-            "bin",
-            "obj",
-            "vendor",
-            "venv",
-            "env",
-            ".env",
-            ".venv",
-            "out",
-            "output",
-            "tmp",
-            "temp",
-            "cache",
-            ".cache",
-            "logs",
-            "log",
-            "coverage",
-            "public",
-            "assets",
-            "images",
-            "img",
-            "fonts",
-            "docs",
-        }
-        return any(part in skip_directories for part in directory_path.split("/"))
+        async def fetch(item):
+            async with download_scheduler.slot(id_work):
+                return await self.fetch_and_format_file(session, item)
+
+        def schedule_next():
+            item = next(items, None)
+            if item is not None:
+                in_flight.append((item, asyncio.create_task(fetch(item))))
+
+        for _ in range(download_scheduler.max_concurrency_per_job):
+            schedule_next()
+        try:
+            while in_flight:
+                item, task = in_flight.popleft()
+                section = await task
+                schedule_next()
+                yield item["path"], section
+        finally:
+            for _, task in in_flight:
+                task.cancel()
+
+    async def fetch_and_format_file(self, session, item):
+        text = blob_store.get(item["sha"])
+        if text is not None:
+            DUMP_FILES.inc(source="blob_store")
+            DUMP_BYTES.inc(len(text), source="blob_store")
+        else:
+            try:
+                content = await fetch_raw_code(
+                    session,
+                    item["download_url"],
+                    self.github_client.get_raw_headers(),
+                    max_bytes=DUMP_MAX_FILE_BYTES,
+                )
+            except ContentRejectedError as e:
+                # Rejected blobs are remembered as empty, as they are skipped.
+                DUMP_SKIPPED.inc(reason=str(e))
+                logging.info(f"Skipping {item['path']}: {str(e)}")
+                blob_store.put(item["sha"], "")
+                return ""
+            except Exception as e:
+                logging.warning(f"Error processing file {item['path']}: {str(e)}")
+                return None
+            if content is None:
+                return None
+            DUMP_FILES.inc(source="download")
+            DUMP_BYTES.inc(len(content), source="download")
+            text = content.decode("utf-8", errors="replace")
+            blob_store.put(item["sha"], text)
+        if text:
+            return format_file(item["path"], text)
+        return ""
@@ -1,58 +1,95 @@
 import asyncio
 import logging
+from common.analysis import stream_pull_request_analysis
 from common.github_client import GitHubClient
 from common.interruptible import Interruptible
+from common.pull_request_watcher import pull_request_watcher
+from langchain_anthropic import ChatAnthropic
 
 
 class WatchPullRequestsService(Interruptible):
-    def __init__(self):
+    def __init__(self, api_key):
         super().__init__()
+        self.chat_model = ChatAnthropic(
+            model_name="claude-2.1",
+            anthropic_api_key=api_key,
+        )
 
     async def process(self, id_work, id_repository, code_dump, github_token):
-        async with GitHubClient(github_token) as github_client:
-            try:
-                # Simulating immediate response
-                yield {
-                    "id_work": id_work,
-                    "id_repository": id_repository,
-                    "process_status": "started",
-                }
-
-                # Simulating work
-                await asyncio.sleep(5)
-                await self.check_interruption()
-
-                # Simulating intermediate status
-                yield {
-                    "id_work": id_work,
-                    "id_repository": id_repository,
-                    "process_status": "in_progress",
-                }
-
-                # Simulating webhook wait and LLM processing
-                analysis_result = f"Analyzed pull requests for repository {id_repository} with {len(code_dump)} characters of context."
-
-                await asyncio.sleep(5)
-                await self.check_interruption()
-
-                # Final response
-                yield {
-                    "id_work": id_work,
-                    "id_repository": id_repository,
-                    "process_status": "completed",
-                    "result": analysis_result,
-                }
-            except InterruptedError:
-                yield {
-                    "id_work": id_work,
-                    "id_repository": id_repository,
-                    "process_status": "interrupted",
-                }
-            except Exception as e:
-                logging.error(f"Error in WatchPullRequests: {str(e)}")
-                yield {
-                    "id_work": id_work,
-                    "id_repository": id_repository,
-                    "process_status": "error",
-                    "error_message": str(e),
-                }
+        try:
+            yield {
+                "id_work": id_work,
+                "id_repository": id_repository,
+                "process_status": "started",
+            }
+
+            async for pull_request in self.iterate_interruptible(
+                pull_request_watcher.events(id_repository, github_token)
+            ):
+                async for response in self.analyze_pull_request(
+                    id_work, id_repository, pull_request, code_dump, github_token
+                ):
+                    yield response
+
+        except InterruptedError:
+            yield {
+                "id_work": id_work,
+                "id_repository": id_repository,
+                "process_status": "interrupted",
+            }
+        except Exception as e:
+            logging.error(f"Error in WatchPullRequests: {str(e)}")
+            yield {
+                "id_work": id_work,
+                "id_repository": id_repository,
+                "process_status": "error",
+                "error_message": str(e),
+            }
+
+    async def analyze_pull_request(
+        self, id_work, id_repository, pull_request, code_dump, github_token
+    ):
+        """Streams the review of one pull request reported by the watcher.
+
+        A failure is reported for that pull request only, the watch goes on.
+        """
+        status = {
+            "id_work": id_work,
+            "id_repository": id_repository,
+            "id_pull_request": str(pull_request["number"]),
+            "head_sha": pull_request["head"]["sha"],
+        }
+        yield {**status, "process_status": "in_progress"}
+
+        parts = []
+        try:
+            async with GitHubClient(github_token) as github_client:
+                files = await github_client.get_pull_request_files(
+                    pull_request["base"]["repo"]["full_name"], pull_request["number"]
+                )
+
+            async for delta in self.iterate_interruptible(
+                stream_pull_request_analysis(
+                    self.chat_model, pull_request, files, code_dump
+                )
+            ):
+                parts.append(delta)
+                yield {**status, "process_status": "in_progress", "result": delta}
+        except (InterruptedError, asyncio.CancelledError):
+            raise
+        except Exception as e:
+            logging.error(
+                f"Error analyzing pull request {status['id_pull_request']}: {str(e)}"
+            )
+            yield {
+                **status,
+                "process_status": "pull_request_error",
+                "error_message": str(e),
+            }
+            return
+
+        yield {
+            **status,
+            "process_status": "pull_request_analyzed",
+            "result": "".join(parts),
+        }